@@ -2,7 +2,7 @@
 API routes for document management
 """
 
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, HTTPException, Query, Path, Request
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from pathlib import Path as FilePath
@@ -15,6 +15,13 @@ from .persona_classifier import classify_user_intent, get_persona_job_suggestion
 
 router = APIRouter(prefix="/api", tags=["documents"])
 
+
+async def _forget_in_search_index(request: Request, document_ids: List[str]):
+    """Drop deleted documents from the in-memory recommendation index (registered by main)"""
+    forget = getattr(request.app.state, 'forget_documents', None)
+    if forget is not None and document_ids:
+        await forget(document_ids)
+
 @router.get("/documents", response_model=Dict[str, Any])
 async def get_all_documents(
     limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of documents to return"),
@@ -99,6 +106,7 @@ async def get_document(
 
 @router.delete("/documents/{document_id}")
 async def delete_document(
+    request: Request,
     document_id: str = Path(..., description="Document ID"),
     permanent: bool = Query(False, description="Permanently delete (default: soft delete)"),
     client_id: Optional[str] = Query(None, description="Client ID owning the document")
@@ -119,6 +127,7 @@ async def delete_document(
         success = db.delete_document(document_id, soft_delete=not permanent, client_id=client_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete document from database")
+        await _forget_in_search_index(request, [document_id])
         
         # Delete physical file if permanent deletion
         if permanent:
@@ -390,6 +399,7 @@ async def get_documents_sorted(
 
 @router.delete("/documents")
 async def delete_all_documents(
+    request: Request,
     permanent: bool = Query(False, description="Permanently delete all documents (default: soft delete)"),
     client_id: Optional[str] = Query(None, description="Delete only documents for specific client")
 ):
@@ -413,6 +423,7 @@ async def delete_all_documents(
         
         deleted_count = 0
         failed_deletes = []
+        deleted_ids = []
         
         for document in documents:
             try:
@@ -420,6 +431,7 @@ async def delete_all_documents(
                 success = db.delete_document(document.id, soft_delete=not permanent, client_id=client_id)
                 if success:
                     deleted_count += 1
+                    deleted_ids.append(document.id)
                     
                     # Delete physical file if permanent deletion
                     if permanent:
@@ -434,6 +446,8 @@ async def delete_all_documents(
                 print(f"❌ Error deleting document {document.id}: {e}")
                 failed_deletes.append(document.id)
         
+        await _forget_in_search_index(request, deleted_ids)
+        
         # Clean up empty directories if permanent delete
         if permanent and deleted_count > 0:
             try:
@@ -527,6 +541,7 @@ async def rename_document(
 
 @router.delete("/documents/{document_id}/force")
 async def force_delete_document(
+    request: Request,
     document_id: str = Path(..., description="Document ID"),
     remove_file: bool = Query(True, description="Also remove physical file"),
     client_id: Optional[str] = Query(None, description="Client ID owning the document")
@@ -556,6 +571,7 @@ async def force_delete_document(
         success = db.delete_document(document_id, soft_delete=False, client_id=client_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete document from database")
+        await _forget_in_search_index(request, [document_id])
         
         print(f"🗑️ Force deleted document: {document_id} ({document.original_name})")
         
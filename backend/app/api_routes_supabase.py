@@ -2,7 +2,7 @@
 API routes for document management with Supabase authentication
 """
 
-from fastapi import APIRouter, HTTPException, Query, Path, Depends
+from fastapi import APIRouter, HTTPException, Query, Path, Depends, Request
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from pathlib import Path as FilePath
@@ -19,6 +19,13 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["documents"])
 
 
+async def _forget_in_search_index(request: Request, document_ids: List[str]):
+    """Drop deleted documents from the in-memory recommendation index (registered by main)"""
+    forget = getattr(request.app.state, 'forget_documents', None)
+    if forget is not None and document_ids:
+        await forget(document_ids)
+
+
 @router.get("/documents", response_model=Dict[str, Any])
 async def get_all_documents(
     limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of documents to return"),
@@ -100,6 +107,7 @@ async def get_document(
 
 @router.delete("/documents/{document_id}")
 async def delete_document(
+    request: Request,
     document_id: str = Path(..., description="Document ID"),
     permanent: bool = Query(False, description="Permanently delete (default: soft delete)"),
     current_user: dict = Depends(get_current_user)
@@ -121,6 +129,7 @@ async def delete_document(
         
         if not success:
             raise HTTPException(status_code=404, detail="Document not found")
+        await _forget_in_search_index(request, [document_id])
         
         # If permanent delete, also remove the file
         if permanent:
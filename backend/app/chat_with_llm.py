@@ -1,4 +1,19 @@
 import os
+import functools
+import threading
+
+# httpx is optional - provides one pooled keep-alive client shared by all OpenAI-compatible calls
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 on the shared client
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 # Try to import langchain components, fallback if not available
 try:
@@ -69,115 +84,223 @@ Usage:
         {"role": "user", "content": "What is the capital of France?"}
     ]
     response = get_llm_response(messages)
-"""
 
-def get_llm_response(messages):
-    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
-
-    # Use messages in current format directly
-
-    if provider == "gemini":
-        # Use direct google-generativeai library instead of langchain
-        try:
-            import google.generativeai as genai
-        except ImportError:
-            raise RuntimeError("google-generativeai not available. Please install it: pip install google-generativeai")
-
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable must be set for Gemini")
+    # Or consume the reply incrementally as the provider streams it
+    for chunk in stream_llm_response(messages):
+        print(chunk, end="")
+"""
 
-        print("🔑 Using GOOGLE_API_KEY for Gemini authentication")
-        
-        # Configure the API
-        genai.configure(api_key=api_key)
-        
-        # Use gemini-2.0-flash model (fast and widely available)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        # Convert messages to Gemini format
-        # Gemini expects a simple prompt string or conversation history
-        if isinstance(messages, list):
-            # Extract the last user message as the prompt
-            user_messages = [msg for msg in messages if msg.get("role") == "user"]
-            if user_messages:
-                prompt = user_messages[-1].get("content", "")
-            else:
-                prompt = str(messages)
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def _get_http_client():
+    """Shared keep-alive HTTP client so calls reuse pooled TCP/TLS connections"""
+    global _http_client
+    if _http_client is None and HTTPX_AVAILABLE:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    http2=HTTP2_AVAILABLE,
+                    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                    timeout=httpx.Timeout(60.0, connect=10.0)
+                )
+    return _http_client
+
+GEMINI_QUOTA_MESSAGE = "I apologize, but the AI service is currently at capacity. Please try again later or contact support for assistance."
+
+@functools.lru_cache(maxsize=4)
+def _gemini_model(api_key):
+    """Configure Gemini once per key and reuse the model (and its open channel) across calls"""
+    # Use direct google-generativeai library instead of langchain
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        raise RuntimeError("google-generativeai not available. Please install it: pip install google-generativeai")
+
+    print("🔑 Using GOOGLE_API_KEY for Gemini authentication")
+    
+    # Configure the API
+    genai.configure(api_key=api_key)
+    
+    # Use gemini-2.0-flash model (fast and widely available)
+    return genai.GenerativeModel('gemini-2.0-flash')
+
+def _gemini_model_and_prompt(messages):
+    """Get the Gemini model and convert chat messages to a prompt"""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY environment variable must be set for Gemini")
+
+    model = _gemini_model(api_key)
+    
+    # Convert messages to Gemini format
+    # Gemini expects a simple prompt string or conversation history
+    if isinstance(messages, list):
+        # Extract the last user message as the prompt
+        user_messages = [msg for msg in messages if msg.get("role") == "user"]
+        if user_messages:
+            prompt = user_messages[-1].get("content", "")
         else:
             prompt = str(messages)
-        
-        try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            # Check for quota exceeded errors
-            error_str = str(e).lower()
-            if "quota" in error_str or "429" in error_str or "resourceexhausted" in error_str:
-                print("⚠️ Gemini API quota exceeded - using fallback response")
-                return "I apologize, but the AI service is currently at capacity. Please try again later or contact support for assistance."
-            print(f"❌ Gemini API error: {e}")
-            raise RuntimeError(f"Gemini call failed: {e}")
+    else:
+        prompt = str(messages)
+
+    return model, prompt
 
-    elif provider == "azure":
+def _is_gemini_quota_error(e):
+    """Check for quota exceeded errors"""
+    error_str = str(e).lower()
+    return "quota" in error_str or "429" in error_str or "resourceexhausted" in error_str
+
+def _langchain_llm(provider):
+    """LangChain chat model for the azure/openai providers (cached per configuration)"""
+    if provider == "azure":
+        config = (os.getenv("AZURE_OPENAI_KEY"), os.getenv("AZURE_OPENAI_BASE"),
+                  os.getenv("AZURE_API_VERSION"), os.getenv("AZURE_DEPLOYMENT_NAME", "gpt-4o"))
+    else:
+        config = (os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
+                  None, os.getenv("OPENAI_MODEL", "gpt-4o"))
+    return _build_langchain_llm(provider, *config)
+
+@functools.lru_cache(maxsize=8)
+def _build_langchain_llm(provider, api_key, api_base, api_version, model_name):
+    """Build the LangChain chat model on top of the shared HTTP client"""
+    client_kwargs = {}
+    if _get_http_client() is not None:
+        client_kwargs["http_client"] = _get_http_client()
+
+    if provider == "azure":
         if not LANGCHAIN_OPENAI_AVAILABLE:
             raise RuntimeError("langchain-openai not available. Please install it to use Azure OpenAI.")
 
-        api_key = os.getenv("AZURE_OPENAI_KEY")
-        api_base = os.getenv("AZURE_OPENAI_BASE")
-        api_version = os.getenv("AZURE_API_VERSION")
-        deployment_name = os.getenv("AZURE_DEPLOYMENT_NAME", "gpt-4o")
+        deployment_name = model_name
 
         if not all([api_key, api_base, api_version]):
             raise ValueError("Missing one of AZURE_OPENAI_KEY, AZURE_OPENAI_BASE, or AZURE_API_VERSION.")
 
-        llm = AzureChatOpenAI(
+        return AzureChatOpenAI(
             azure_deployment=deployment_name,
             openai_api_version=api_version,
             azure_endpoint=api_base,
             api_key=api_key,
-            temperature=0.7
+            temperature=0.7,
+            **client_kwargs
         )
 
+    if not LANGCHAIN_OPENAI_AVAILABLE:
+        raise RuntimeError("langchain-openai not available. Please install it to use OpenAI.")
+
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY is not set.")
+
+    return ChatOpenAI(
+        model=model_name,
+        api_key=api_key,
+        base_url=api_base,
+        temperature=0.7,
+        **client_kwargs
+    )
+
+def _check_provider(provider):
+    """Raise for providers that cannot be used"""
+    if provider == "ollama":
+        if not LANGCHAIN_COMMUNITY_AVAILABLE:
+            raise RuntimeError("langchain-community not available. Please install it to use Ollama.")
+
+        # Ollama functionality disabled for now due to missing langchain-community
+        raise RuntimeError("Ollama provider is temporarily disabled. Please use 'gemini', 'azure', or 'openai' instead.")
+
+    if provider not in ("gemini", "azure", "openai"):
+        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+
+def warm_llm_client():
+    """Build the provider client ahead of the first request and open a pooled connection"""
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+    try:
+        _check_provider(provider)
+        if provider == "gemini":
+            if os.getenv("GOOGLE_API_KEY"):
+                _gemini_model(os.getenv("GOOGLE_API_KEY"))
+            return
+
+        _langchain_llm(provider)
+        client = _get_http_client()
+        base = os.getenv("AZURE_OPENAI_BASE") if provider == "azure" else os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+        if client is not None and base:
+            # Cheap probe: the TLS handshake is what we want to pay up front, not the status
+            client.head(base)
+    except Exception as e:
+        print(f"⚠️ LLM client warm-up skipped: {e}")
+
+def get_llm_response(messages, json_mode=None):
+    """
+    json_mode: "object" or "array" asks the provider for bare JSON of that shape where it
+    supports a JSON output mode (Gemini: both, OpenAI/Azure: objects only)
+    """
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+    _check_provider(provider)
+
+    # Use messages in current format directly
+
+    if provider == "gemini":
+        model, prompt = _gemini_model_and_prompt(messages)
+        
         try:
-            response = llm.invoke(messages)
-            return response.content
+            if json_mode:
+                response = model.generate_content(
+                    prompt, generation_config={"response_mime_type": "application/json"}
+                )
+            else:
+                response = model.generate_content(prompt)
+            return response.text
         except Exception as e:
-            raise RuntimeError(f"Azure OpenAI call failed: {e}")
+            if _is_gemini_quota_error(e):
+                print("⚠️ Gemini API quota exceeded - using fallback response")
+                return GEMINI_QUOTA_MESSAGE
+            print(f"❌ Gemini API error: {e}")
+            raise RuntimeError(f"Gemini call failed: {e}")
 
-    elif provider == "openai":
-        if not LANGCHAIN_OPENAI_AVAILABLE:
-            raise RuntimeError("langchain-openai not available. Please install it to use OpenAI.")
+    label = "Azure OpenAI" if provider == "azure" else "OpenAI"
+    llm = _langchain_llm(provider)
+    if json_mode == "object":
+        llm = llm.bind(response_format={"type": "json_object"})
 
-        api_key = os.getenv("OPENAI_API_KEY")
-        api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-        model_name = os.getenv("OPENAI_MODEL", "gpt-4o")
+    try:
+        response = llm.invoke(messages)
+        return response.content
+    except Exception as e:
+        raise RuntimeError(f"{label} call failed: {e}")
 
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY is not set.")
+def stream_llm_response(messages):
+    """Yield the LLM reply in text chunks as the provider streams it"""
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+    _check_provider(provider)
 
-        llm = ChatOpenAI(
-            model=model_name,
-            api_key=api_key,
-            base_url=api_base,
-            temperature=0.7
-        )
+    if provider == "gemini":
+        model, prompt = _gemini_model_and_prompt(messages)
 
         try:
-            response = llm.invoke(messages)
-            return response.content
+            for chunk in model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
         except Exception as e:
-            raise RuntimeError(f"OpenAI call failed: {e}")
-
-    elif provider == "ollama":
-        if not LANGCHAIN_COMMUNITY_AVAILABLE:
-            raise RuntimeError("langchain-community not available. Please install it to use Ollama.")
+            if _is_gemini_quota_error(e):
+                print("⚠️ Gemini API quota exceeded - using fallback response")
+                yield GEMINI_QUOTA_MESSAGE
+                return
+            print(f"❌ Gemini API error: {e}")
+            raise RuntimeError(f"Gemini call failed: {e}")
+        return
 
-        # Ollama functionality disabled for now due to missing langchain-community
-        raise RuntimeError("Ollama provider is temporarily disabled. Please use 'gemini', 'azure', or 'openai' instead.")
+    label = "Azure OpenAI" if provider == "azure" else "OpenAI"
+    llm = _langchain_llm(provider)
 
-    else:
-        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+    try:
+        for chunk in llm.stream(messages):
+            if chunk.content:
+                yield chunk.content
+    except Exception as e:
+        raise RuntimeError(f"{label} call failed: {e}")
 
 if __name__ == "__main__":
     messages = [
@@ -6,7 +6,7 @@ import sqlite3
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Set
 from dataclasses import dataclass, asdict
 import json
 
@@ -31,6 +31,7 @@ class Document:
     last_accessed: Optional[datetime] = None  # General access (for backward compatibility)
     tags: Optional[List[str]] = None
     file_hash: Optional[str] = None           # For duplicate detection
+    quickhash: Optional[str] = None           # Cheap pre-filter fingerprint for duplicate detection
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert document to dictionary for JSON serialization"""
@@ -114,7 +115,8 @@ class DocumentDatabase:
             new_columns = [
                 ("last_uploaded", "TIMESTAMP"),
                 ("last_opened", "TIMESTAMP"),
-                ("file_hash", "TEXT")
+                ("file_hash", "TEXT"),
+                ("quickhash", "TEXT")
             ]
 
             for col_name, col_type in new_columns:
@@ -142,6 +144,8 @@ class DocumentDatabase:
                 indexes.append(("idx_last_opened", "last_opened"))
             if "file_hash" in current_columns:
                 indexes.append(("idx_file_hash", "file_hash"))
+            if "quickhash" in current_columns:
+                indexes.append(("idx_quickhash", "quickhash"))
 
             for index_name, column_name in indexes:
                 try:
@@ -196,7 +200,8 @@ class DocumentDatabase:
                        job_role: Optional[str] = None,
                        validation_result: Optional[Dict[str, Any]] = None,
                        metadata: Optional[Dict[str, Any]] = None,
-                       file_hash: Optional[str] = None) -> Document:
+                       file_hash: Optional[str] = None,
+                       quickhash: Optional[str] = None) -> Document:
         """Create a new document record"""
         
         now = datetime.now()
@@ -214,7 +219,8 @@ class DocumentDatabase:
             metadata=metadata,
             last_uploaded=now,  # Set upload time
             last_opened=None,   # Not opened yet
-            file_hash=file_hash
+            file_hash=file_hash,
+            quickhash=quickhash
         )
         
         with sqlite3.connect(self.db_path) as conn:
@@ -251,6 +257,9 @@ class DocumentDatabase:
             if 'file_hash' in existing_columns:
                 base_columns.append('file_hash')
                 base_values.append(document.file_hash)
+            if 'quickhash' in existing_columns:
+                base_columns.append('quickhash')
+                base_values.append(document.quickhash)
 
             # Build and execute query
             columns_str = ', '.join(base_columns)
@@ -326,6 +335,66 @@ class DocumentDatabase:
             
             return documents
     
+    def iter_documents(self, client_id: Optional[str] = None) -> Iterator[Document]:
+        """Stream non-deleted documents straight from the cursor without materializing all rows"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+
+            params: List[Any] = []
+            query = "SELECT * FROM documents WHERE status != 'deleted'"
+
+            if client_id:
+                query += " AND client_id = ?"
+                params.append(client_id)
+
+            for row in conn.execute(query, params):
+                doc_data = dict(row)
+
+                # Parse JSON fields
+                if doc_data['validation_result']:
+                    doc_data['validation_result'] = json.loads(doc_data['validation_result'])
+                if doc_data['metadata']:
+                    doc_data['metadata'] = json.loads(doc_data['metadata'])
+                if doc_data['tags']:
+                    doc_data['tags'] = json.loads(doc_data['tags'])
+
+                # Convert timestamp strings to datetime objects
+                doc_data['upload_date'] = datetime.fromisoformat(doc_data['upload_date'])
+                if doc_data['last_uploaded']:
+                    doc_data['last_uploaded'] = datetime.fromisoformat(doc_data['last_uploaded'])
+                if doc_data['last_opened']:
+                    doc_data['last_opened'] = datetime.fromisoformat(doc_data['last_opened'])
+                if doc_data['last_accessed']:
+                    doc_data['last_accessed'] = datetime.fromisoformat(doc_data['last_accessed'])
+
+                # Remove extra fields not in Document model
+                doc_data.pop('created_at', None)
+                doc_data.pop('updated_at', None)
+
+                yield Document(**doc_data)
+
+    def active_document_ids(self) -> Set[str]:
+        """Ids of every non-deleted document, across all clients"""
+        with sqlite3.connect(self.db_path) as conn:
+            return {row[0] for row in conn.execute("SELECT id FROM documents WHERE status != 'deleted'")}
+
+    def active_document_paths(self) -> Set[str]:
+        """Stored file paths of every non-deleted document, across all clients"""
+        with sqlite3.connect(self.db_path) as conn:
+            return {row[0] for row in conn.execute("SELECT file_path FROM documents WHERE status != 'deleted'")}
+
+    def count_documents(self, client_id: Optional[str] = None) -> int:
+        """Count non-deleted documents with optional tenant filtering"""
+        with sqlite3.connect(self.db_path) as conn:
+            query = "SELECT COUNT(*) FROM documents WHERE status != 'deleted'"
+            params: List[Any] = []
+
+            if client_id:
+                query += " AND client_id = ?"
+                params.append(client_id)
+
+            return conn.execute(query, params).fetchone()[0]
+
     def get_document_by_id(self, document_id: str, client_id: Optional[str] = None) -> Optional[Document]:
         """Get a specific document by ID with optional tenant filtering"""
         with sqlite3.connect(self.db_path) as conn:
@@ -472,6 +541,51 @@ class DocumentDatabase:
             conn.commit()
             return cursor.rowcount > 0
 
+    def delete_documents(
+        self,
+        document_ids: List[str],
+        soft_delete: bool = True,
+        client_id: Optional[str] = None
+    ) -> List[str]:
+        """Delete many documents in a single transaction; returns the ids that were actually deleted"""
+        if not document_ids:
+            return []
+
+        # Stay well under SQLite's bound-parameter limit per statement
+        batch_size = 900
+        now = datetime.now()
+        deleted: List[str] = []
+
+        with sqlite3.connect(self.db_path) as conn:
+            for start in range(0, len(document_ids), batch_size):
+                batch = list(document_ids[start:start + batch_size])
+                placeholders = ', '.join(['?'] * len(batch))
+
+                # Resolve which of the ids match first, so the caller learns exactly which rows went
+                select = f"SELECT id FROM documents WHERE id IN ({placeholders})"
+                select_params: List[Any] = list(batch)
+                if client_id:
+                    select += " AND client_id = ?"
+                    select_params.append(client_id)
+                matched = [row[0] for row in conn.execute(select, select_params)]
+                if not matched:
+                    continue
+                placeholders = ', '.join(['?'] * len(matched))
+
+                params: List[Any]
+                if soft_delete:
+                    query = f"UPDATE documents SET status = 'deleted', updated_at = ? WHERE id IN ({placeholders})"
+                    params = [now, *matched]
+                else:
+                    query = f"DELETE FROM documents WHERE id IN ({placeholders})"
+                    params = matched
+
+                conn.execute(query, params)
+                deleted.extend(matched)
+
+            conn.commit()
+        return deleted
+
     def update_last_opened(self, document_id: str, client_id: Optional[str] = None) -> bool:
         """Update the last_opened timestamp for a document"""
         return self.update_document(
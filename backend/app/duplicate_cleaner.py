@@ -6,6 +6,10 @@ Removes duplicate PDFs with different IDs based on file content hash
 
 import hashlib
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
 from typing import List, Dict, Set
 import logging
@@ -13,6 +17,21 @@ from .database import DocumentDatabase
 
 logger = logging.getLogger(__name__)
 
+# Hash workers and the number of files allowed in flight while streaming documents
+HASH_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+HASH_QUEUE_DEPTH = HASH_WORKERS * 4
+
+def _to_timestamp(value) -> float:
+    """Convert a datetime or ISO string to a UNIX timestamp (0.0 when missing)"""
+    if not value:
+        return 0.0
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return 0.0
+    return value.timestamp()
+
 class DuplicatePDFCleaner:
     def __init__(self, db: DocumentDatabase, docs_dir: Path):
         self.db = db
@@ -38,70 +57,56 @@ class DuplicatePDFCleaner:
             logger.error(f"Error getting size for {file_path}: {e}")
             return 0
     
+    def _hash_entry(self, doc, file_path: Path):
+        """Hash one resolved file (runs on a worker thread)"""
+        return doc, file_path, self.calculate_file_hash(file_path), self.get_file_size(file_path)
+    
     def find_duplicates(self) -> Dict[str, List[Dict]]:
         """Find duplicate PDFs based on file hash and size"""
         print("🔍 Scanning for duplicate PDFs...")
         
-        # Get all documents from database
-        all_documents = self.db.get_all_documents()
-        
         # Group documents by hash and size
         file_groups = {}
         processed_files = set()
         
-        for doc in all_documents:
+        def add_result(future):
             try:
-                # Construct file path
-                file_path = Path(doc.file_path)
-                if not file_path.is_absolute():
-                    file_path = self.docs_dir.parent / file_path
-                
-                # Skip if file doesn't exist - but don't delete from database yet
-                if not file_path.exists():
-                    print(f"⚠️ File not found: {file_path}")
-                    # Try alternative file path with filename
-                    alt_file_path = self.docs_dir / doc.filename
-                    if alt_file_path.exists():
-                        print(f"✅ Found file at alternative path: {alt_file_path}")
-                        file_path = alt_file_path
-                    else:
-                        print(f"⚠️ File not found at alternative path either: {alt_file_path}")
-                        print(f"🔍 Skipping orphaned entry (not deleting): {doc.original_name}")
-                        continue
-                
-                # Skip if already processed (same physical file)
-                abs_path = str(file_path.absolute())
-                if abs_path in processed_files:
-                    continue
-                processed_files.add(abs_path)
-                
-                # Calculate file hash and size
-                file_hash = self.calculate_file_hash(file_path)
-                file_size = self.get_file_size(file_path)
-                
-                if not file_hash:
-                    continue
-                
-                # Create unique key based on hash and size
-                key = f"{file_hash}_{file_size}"
-                
-                if key not in file_groups:
-                    file_groups[key] = []
-                
-                file_groups[key].append({
-                    'id': doc.id,
-                    'original_name': doc.original_name,
-                    'file_path': str(file_path),
-                    'file_size': file_size,
-                    'hash': file_hash,
-                    'upload_date': doc.upload_date,
-                    'last_opened': doc.last_opened,
-                    'open_count': getattr(doc, 'open_count', 0) or 0
-                })
-                
+                doc, file_path, file_hash, file_size = future.result()
             except Exception as e:
-                logger.error(f"Error processing document {doc.id}: {e}")
-                continue
+                logger.error(f"Error hashing document: {e}")
+                return
+            
+            if not file_hash:
+                return
+            
+            # Create unique key based on hash and size
+            key = f"{file_hash}_{file_size}"
+            
+            if key not in file_groups:
+                file_groups[key] = []
+            
+            file_groups[key].append({
+                'id': doc.id,
+                'original_name': doc.original_name,
+                'file_path': str(file_path),
+                'file_size': file_size,
+                'hash': file_hash,
+                'upload_date': doc.upload_date,
+                'last_opened': doc.last_opened,
+                'open_count': getattr(doc, 'open_count', 0) or 0
+            })
+        
+        # Stream documents from the database while worker threads hash files;
+        # the in-flight window bounds memory to the queue depth
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            for doc in self.db.iter_documents():
+                self._queue_document(doc, processed_files, executor, pending)
+                while len(pending) >= HASH_QUEUE_DEPTH:
+                    add_result(pending.popleft())
+            
+            while pending:
+                add_result(pending.popleft())
         
         # Filter to only groups with duplicates
         duplicates = {k: v for k, v in file_groups.items() if len(v) > 1}
@@ -114,7 +119,41 @@ class DuplicatePDFCleaner:
         
         return duplicates
     
-    def remove_duplicates(self, duplicates: Dict[str, List[Dict]]) -> Dict[str, int]:
+    def _queue_document(self, doc, processed_files: Set[str], executor: ThreadPoolExecutor, pending: deque):
+        """Resolve a document's file path and submit it for hashing"""
+        try:
+            # Construct file path
+            file_path = Path(doc.file_path)
+            if not file_path.is_absolute():
+                file_path = self.docs_dir.parent / file_path
+            
+            # Skip if file doesn't exist - but don't delete from database yet
+            if not file_path.exists():
+                print(f"⚠️ File not found: {file_path}")
+                # Try alternative file path with filename
+                alt_file_path = self.docs_dir / doc.filename
+                if alt_file_path.exists():
+                    print(f"✅ Found file at alternative path: {alt_file_path}")
+                    file_path = alt_file_path
+                else:
+                    print(f"⚠️ File not found at alternative path either: {alt_file_path}")
+                    print(f"🔍 Skipping orphaned entry (not deleting): {doc.original_name}")
+                    return
+            
+            # Skip if already processed (same physical file)
+            abs_path = str(file_path.absolute())
+            if abs_path in processed_files:
+                return
+            processed_files.add(abs_path)
+            
+            # Calculate file hash and size on a worker thread
+            pending.append(executor.submit(self._hash_entry, doc, file_path))
+            
+        except Exception as e:
+            logger.error(f"Error processing document {doc.id}: {e}")
+    
+    def remove_duplicates(self, duplicates: Dict[str, List[Dict]], total_docs: int,
+                          max_fraction: float = 0.5) -> Dict[str, int]:
         """Remove duplicate PDFs, keeping the most recently used one"""
         stats = {
             'groups_processed': 0,
@@ -123,18 +162,31 @@ class DuplicatePDFCleaner:
             'errors': 0
         }
         
+        # Safety check: refuse the whole batch if it would remove too much of the library
+        planned_removals = sum(len(group) - 1 for group in duplicates.values())
+        max_removable = max(1, int(total_docs * max_fraction))
+        if planned_removals > max_removable:
+            print(f"⚠️ Safety check: refusing to remove {planned_removals} of {total_docs} documents "
+                  f"({len(duplicates)} groups); limit is {max_removable} ({max_fraction:.0%})")
+            stats['errors'] += 1
+            return stats
+        
+        # Collected across all groups so the database is updated in one transaction
+        to_delete_ids = []
+        files_to_unlink = {}  # doc id -> physical file, unlinked only once its row is deleted
+        
         for key, group in duplicates.items():
             try:
                 stats['groups_processed'] += 1
                 
                 # Sort by priority: last_opened (desc), open_count (desc), upload_date (desc)
-                def sort_priority(doc):
-                    last_opened = doc['last_opened'] or '1900-01-01'
-                    open_count = doc['open_count'] or 0
-                    upload_date = doc['upload_date'] or '1900-01-01'
-                    return (last_opened, open_count, upload_date)
-                
-                sorted_group = sorted(group, key=sort_priority, reverse=True)
+                # Dates are parsed once into numeric keys so Timsort compares plain tuples
+                keyed = [(
+                    (_to_timestamp(doc['last_opened']), doc['open_count'] or 0, _to_timestamp(doc['upload_date'])),
+                    doc
+                ) for doc in group]
+                keyed.sort(key=itemgetter(0), reverse=True)
+                sorted_group = [doc for _, doc in keyed]
                 
                 # Keep the first one (highest priority)
                 keep_doc = sorted_group[0]
@@ -143,41 +195,16 @@ class DuplicatePDFCleaner:
                 print(f"📁 Processing group {key[:8]}...")
                 print(f"  ✅ Keeping: {keep_doc['original_name']} (ID: {keep_doc['id'][:8]}...)")
                 
-                # Safety check: don't remove more than 50% of documents
-                total_docs = len(all_documents)
-                max_removable = max(1, total_docs // 2)  # At least 1, but no more than 50%
-
-                if len(remove_docs) > max_removable:
-                    print(f"⚠️ Safety check: Would remove {len(remove_docs)} docs, but limiting to {max_removable}")
-                    remove_docs = remove_docs[:max_removable]
-
-                # Remove duplicates
+                # Queue duplicates for removal
+                keep_path = Path(keep_doc['file_path']).absolute()
                 for doc in remove_docs:
-                    try:
-                        print(f"  🗑️ Removing: {doc['original_name']} (ID: {doc['id'][:8]}...)")
-
-                        # Remove from database (soft delete)
-                        success = self.db.delete_document(doc['id'], soft_delete=True)
-                        if success:
-                            stats['files_removed'] += 1
-                            
-                            # Remove physical file if it's different from the kept one
-                            doc_path = Path(doc['file_path'])
-                            keep_path = Path(keep_doc['file_path'])
-                            
-                            if doc_path.absolute() != keep_path.absolute() and doc_path.exists():
-                                try:
-                                    doc_path.unlink()
-                                    print(f"    🗑️ Deleted physical file: {doc_path.name}")
-                                except Exception as e:
-                                    print(f"    ⚠️ Could not delete physical file: {e}")
-                        else:
-                            print(f"    ❌ Failed to remove from database")
-                            stats['errors'] += 1
-                            
-                    except Exception as e:
-                        logger.error(f"Error removing duplicate {doc['id']}: {e}")
-                        stats['errors'] += 1
+                    print(f"  🗑️ Removing: {doc['original_name']} (ID: {doc['id'][:8]}...)")
+                    to_delete_ids.append(doc['id'])
+                    
+                    # Remove physical file if it's different from the kept one
+                    doc_path = Path(doc['file_path'])
+                    if doc_path.absolute() != keep_path:
+                        files_to_unlink[doc['id']] = doc_path
                 
                 stats['files_kept'] += 1
                 
@@ -185,8 +212,39 @@ class DuplicatePDFCleaner:
                 logger.error(f"Error processing group {key}: {e}")
                 stats['errors'] += 1
         
+        if not to_delete_ids:
+            return stats
+        
+        # Remove from database (soft delete) with a single commit
+        try:
+            removed_ids = self.db.delete_documents(to_delete_ids, soft_delete=True)
+        except Exception as e:
+            logger.error(f"Error removing duplicates from database: {e}")
+            stats['errors'] += 1
+            return stats
+        
+        stats['files_removed'] += len(removed_ids)
+        if len(removed_ids) < len(to_delete_ids):
+            print(f"    ❌ Failed to remove {len(to_delete_ids) - len(removed_ids)} duplicates from database")
+            stats['errors'] += len(to_delete_ids) - len(removed_ids)
+        
+        # Only files whose rows are gone; a row still live keeps its file.
+        # Unlinks are independent syscalls, so run them concurrently
+        paths = [files_to_unlink[doc_id] for doc_id in removed_ids if doc_id in files_to_unlink]
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            list(executor.map(self._unlink_file, paths))
+        
         return stats
     
+    def _unlink_file(self, doc_path: Path):
+        """Delete a duplicate's physical file if it still exists"""
+        try:
+            if doc_path.exists():
+                doc_path.unlink()
+                print(f"    🗑️ Deleted physical file: {doc_path.name}")
+        except Exception as e:
+            print(f"    ⚠️ Could not delete physical file: {e}")
+    
     def clean_duplicates(self) -> Dict[str, int]:
         """Main method to find and remove duplicates"""
         print("🧹 Starting duplicate PDF cleanup...")
@@ -204,8 +262,9 @@ class DuplicatePDFCleaner:
                     'errors': 0
                 }
             
-            # Remove duplicates
-            stats = self.remove_duplicates(duplicates)
+            # Remove duplicates (capped against the whole library, not per group)
+            total_docs = self.db.count_documents()
+            stats = self.remove_duplicates(duplicates, total_docs, max_fraction=0.5)
             
             print(f"🎉 Duplicate cleanup completed!")
             print(f"  📊 Groups processed: {stats['groups_processed']}")
@@ -6,15 +6,15 @@ Removes duplicate PDFs while preserving the best copy (earliest upload, latest a
 
 import sqlite3
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional
 from datetime import datetime
 try:
     from .pdf_duplicate_detector import PDFDuplicateDetector
-    from .database import db
 except ImportError:
     from pdf_duplicate_detector import PDFDuplicateDetector
-    from database import db
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +25,16 @@ class DuplicateCleanupSystem:
         self.db_path = db_path
         self.docs_dir = Path(docs_dir)
         self.detector = PDFDuplicateDetector(db_path, docs_dir)
+
+        # Single connection reused across the cleanup pipeline (transactions are explicit).
+        # The journal mode is left as the database layer configured it: WAL would persist in the file.
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+
+    def close(self):
+        """Close the shared database connection"""
+        with self._lock:
+            self._conn.close()
         
     def cleanup_duplicates(self, dry_run: bool = False) -> Dict[str, int]:
         """Clean up duplicate PDFs from database and filesystem"""
@@ -47,41 +57,65 @@ class DuplicateCleanupSystem:
         
         print(f"🔍 Found {len(duplicate_groups)} duplicate groups")
         
-        for group in duplicate_groups:
+        # Rows are deleted in one batch and physical files only once the transaction has committed
+        docs_to_remove = []
+        files_to_remove = []
+        
+        with self._lock:
+            if not dry_run:
+                self._conn.execute('BEGIN')
+            
             try:
-                keep_doc = group['keep']
-                remove_docs = group['remove']
-                
-                print(f"\n📁 Processing group with hash {group['hash'][:8]}...")
-                print(f"  ✅ Keeping: {keep_doc['original_name']} (ID: {keep_doc['id'][:8]}...)")
-                print(f"     Upload: {keep_doc['upload_date']} | Last Opened: {keep_doc['last_opened']}")
-                
-                # Update the kept document to preserve best metadata
-                self._update_kept_document(keep_doc, remove_docs, dry_run)
+                for group in duplicate_groups:
+                    try:
+                        keep_doc = group['keep']
+                        remove_docs = group['remove']
+                        
+                        print(f"\n📁 Processing group with hash {group['hash'][:8]}...")
+                        print(f"  ✅ Keeping: {keep_doc['original_name']} (ID: {keep_doc['id'][:8]}...)")
+                        print(f"     Upload: {keep_doc['upload_date']} | Last Opened: {keep_doc['last_opened']}")
+                        
+                        # Update the kept document to preserve best metadata
+                        self._update_kept_document(keep_doc, remove_docs, dry_run)
+                        
+                        # Remove duplicate documents
+                        for doc in remove_docs:
+                            print(f"  🗑️ Removing: {doc['original_name']} (ID: {doc['id'][:8]}...)")
+                            
+                            if not dry_run:
+                                docs_to_remove.append(doc)
+                            else:
+                                print(f"    [DRY RUN] Would remove document and file")
+                                stats['files_removed'] += 1
+                                stats['space_saved_bytes'] += doc['file_size'] or 0
+                                
+                    except Exception as e:
+                        logger.error(f"Error processing duplicate group: {e}")
+                        stats['errors'] += 1
                 
-                # Remove duplicate documents
-                for doc in remove_docs:
-                    print(f"  🗑️ Removing: {doc['original_name']} (ID: {doc['id'][:8]}...)")
-                    
-                    if not dry_run:
-                        # Remove from database
-                        success = self._remove_document_from_db(doc['id'])
-                        if success:
+                # Remove from database
+                if docs_to_remove:
+                    removed_ids = self._remove_documents_from_db([doc['id'] for doc in docs_to_remove])
+                    for doc in docs_to_remove:
+                        if doc['id'] in removed_ids:
                             stats['files_removed'] += 1
                             stats['space_saved_bytes'] += doc['file_size'] or 0
-                            
-                            # Remove physical file
-                            self._remove_physical_file(doc['file_path'])
+                            files_to_remove.append(doc['file_path'])
                         else:
                             stats['errors'] += 1
-                    else:
-                        print(f"    [DRY RUN] Would remove document and file")
-                        stats['files_removed'] += 1
-                        stats['space_saved_bytes'] += doc['file_size'] or 0
-                        
-            except Exception as e:
-                logger.error(f"Error processing duplicate group: {e}")
-                stats['errors'] += 1
+            except BaseException:
+                # Nothing is deleted, on disk or in the database, unless the whole batch commits
+                if not dry_run:
+                    self._conn.execute('ROLLBACK')
+                raise
+            else:
+                if not dry_run:
+                    self._conn.execute('COMMIT')
+        
+        # Remove physical files (independent syscalls, so run them concurrently)
+        if files_to_remove:
+            with ThreadPoolExecutor(max_workers=min(8, len(files_to_remove))) as executor:
+                list(executor.map(self._remove_physical_file, files_to_remove))
         
         # Print summary
         print(f"\n📊 Cleanup Summary:")
@@ -98,35 +132,31 @@ class DuplicateCleanupSystem:
     def _update_kept_document(self, keep_doc: Dict, remove_docs: List[Dict], dry_run: bool):
         """Update the kept document with best metadata from all duplicates"""
         try:
-            # Find the earliest upload date
-            earliest_upload = keep_doc['upload_date']
-            for doc in remove_docs:
-                if doc['upload_date'] < earliest_upload:
-                    earliest_upload = doc['upload_date']
-            
-            # Find the latest access date
-            latest_access = keep_doc['last_opened']
-            for doc in remove_docs:
-                if doc['last_opened'] and (not latest_access or doc['last_opened'] > latest_access):
-                    latest_access = doc['last_opened']
+            group_docs = (*remove_docs, keep_doc)
+
+            # Find the earliest upload date (skipping missing values)
+            earliest_upload = min(
+                (doc['upload_date'] for doc in group_docs if doc['upload_date']),
+                default=keep_doc['upload_date']
+            )
+
+            # Find the latest access date (skipping missing values)
+            latest_access = max(
+                (doc['last_opened'] for doc in group_docs if doc['last_opened']),
+                default=keep_doc['last_opened']
+            )
             
             # Update the kept document if needed
             if (earliest_upload != keep_doc['upload_date'] or 
                 latest_access != keep_doc['last_opened']):
                 
                 if not dry_run:
-                    conn = sqlite3.connect(self.db_path)
-                    cursor = conn.cursor()
-                    
-                    cursor.execute('''
+                    self._conn.execute('''
                         UPDATE documents 
                         SET upload_date = ?, last_opened = ?, updated_at = ?
                         WHERE id = ?
                     ''', (earliest_upload, latest_access, datetime.now(), keep_doc['id']))
                     
-                    conn.commit()
-                    conn.close()
-                    
                     print(f"    📝 Updated metadata: upload={earliest_upload}, last_opened={latest_access}")
                 else:
                     print(f"    [DRY RUN] Would update metadata")
@@ -134,13 +164,22 @@ class DuplicateCleanupSystem:
         except Exception as e:
             logger.error(f"Error updating kept document {keep_doc['id']}: {e}")
     
-    def _remove_document_from_db(self, document_id: str) -> bool:
-        """Remove document from database"""
-        try:
-            return db.delete_document(document_id, soft_delete=False)  # Hard delete for duplicates
-        except Exception as e:
-            logger.error(f"Error removing document {document_id} from database: {e}")
-            return False
+    def _remove_documents_from_db(self, document_ids: List[str]) -> set:
+        """Remove documents from database, returning the ids that were deleted"""
+        removed = set()
+        # Hard delete for duplicates, on the shared connection so it joins the open transaction
+        for start in range(0, len(document_ids), 900):
+            batch = document_ids[start:start + 900]
+            placeholders = ', '.join(['?'] * len(batch))
+            try:
+                rows = self._conn.execute(
+                    f'SELECT id FROM documents WHERE id IN ({placeholders})', batch
+                ).fetchall()
+                self._conn.execute(f'DELETE FROM documents WHERE id IN ({placeholders})', batch)
+                removed.update(row[0] for row in rows)
+            except Exception as e:
+                logger.error(f"Error removing {len(batch)} documents from database: {e}")
+        return removed
     
     def _remove_physical_file(self, file_path: Path):
         """Remove physical file from filesystem"""
@@ -156,24 +195,23 @@ class DuplicateCleanupSystem:
     def check_for_duplicate_before_upload(self, file_path: Path, original_name: str) -> Optional[Dict]:
         """Check if a file is a duplicate before uploading"""
         try:
-            # Calculate hash of new file
-            new_file_hash = self.detector.calculate_file_hash(file_path)
-            if not new_file_hash:
-                return None
-            
-            # Check database for existing file with same hash
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Cheap fingerprint first; the full SHA-256 is only needed to confirm a collision.
+            # Rows uploaded before quickhash existed have no fingerprint and stay candidates.
+            quickhash = self.detector.calculate_quickhash(file_path)
             
-            cursor.execute('''
-                SELECT id, original_name, filename, upload_date, last_opened
-                FROM documents 
-                WHERE file_hash = ? AND status != "deleted"
-                LIMIT 1
-            ''', (new_file_hash,))
+            with self._lock:
+                candidates = self._conn.execute('''
+                    SELECT id, original_name, filename, upload_date, last_opened, file_hash
+                    FROM documents 
+                    WHERE (quickhash = ? OR quickhash IS NULL)
+                      AND file_hash IS NOT NULL AND status != "deleted"
+                ''', (quickhash,)).fetchall()
             
-            result = cursor.fetchone()
-            conn.close()
+            result = None
+            if candidates:
+                new_file_hash = self.detector.calculate_file_hash(file_path)
+                if new_file_hash:
+                    result = next((row for row in candidates if row[5] == new_file_hash), None)
             
             if result:
                 return {
@@ -188,16 +226,14 @@ class DuplicateCleanupSystem:
             # Also check by normalized filename
             normalized_name = self.detector.normalize_filename(original_name)
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, original_name, filename, upload_date, last_opened, file_hash
-                FROM documents 
-                WHERE status != "deleted"
-            ''')
+            with self._lock:
+                rows = self._conn.execute('''
+                    SELECT id, original_name, filename, upload_date, last_opened, file_hash
+                    FROM documents 
+                    WHERE status != "deleted"
+                ''').fetchall()
             
-            for row in cursor.fetchall():
+            for row in rows:
                 existing_normalized = self.detector.normalize_filename(row[1] or "")
                 if existing_normalized == normalized_name and existing_normalized:
                     # Found potential duplicate by name, verify with file comparison
@@ -205,7 +241,6 @@ class DuplicateCleanupSystem:
                     if existing_file_path.exists():
                         comparison = self.detector.are_pdfs_identical(file_path, existing_file_path)
                         if self.detector.is_duplicate(comparison):
-                            conn.close()
                             return {
                                 'id': row[0],
                                 'original_name': row[1],
@@ -215,7 +250,6 @@ class DuplicateCleanupSystem:
                                 'is_duplicate': True
                             }
             
-            conn.close()
             return None
             
         except Exception as e:
@@ -2,11 +2,36 @@
 Embedding Service for RAG
 Generates vector embeddings for text using SentenceTransformer
 """
+import math
+import threading
 from typing import List, Union
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import torch
 
+# Numba is optional - only used to normalize very large embedding batches
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Batches with at least this many rows use the fused Numba kernel
+NUMBA_NORMALIZE_MIN_ROWS = 100_000
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _normalize_inplace(a):
+        """L2-normalize each row of a 2D array in place (single streaming pass)"""
+        for i in prange(a.shape[0]):
+            s = 0.0
+            for j in range(a.shape[1]):
+                s += a[i, j] * a[i, j]
+            inv = 1.0 / math.sqrt(s) if s > 0 else 0.0
+            if inv > 0:
+                for j in range(a.shape[1]):
+                    a[i, j] *= inv
+
 
 class EmbeddingService:
     """Service for generating text embeddings"""
@@ -20,6 +45,9 @@ class EmbeddingService:
         """
         self.model_name = model_name
         self.embedding_dim = 384  # Dimension for all-MiniLM-L6-v2
+        # One encode at a time: the HF fast tokenizer raises "Already borrowed" when shared across threads.
+        # Reentrant because main wraps model.encode with this same lock.
+        self.encode_lock = threading.RLock()
         
         print(f"🔄 Loading embedding model: {model_name}")
         try:
@@ -49,11 +77,12 @@ class EmbeddingService:
                 return [0.0] * self.embedding_dim
             
             # Generate embedding
-            embedding = self.model.encode(
-                text,
-                convert_to_numpy=True,
-                show_progress_bar=False
-            )
+            with self.encode_lock:
+                embedding = self.model.encode(
+                    text,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
             
             # Normalize for cosine similarity
             norm = np.linalg.norm(embedding)
@@ -101,16 +130,16 @@ class EmbeddingService:
                 return [[0.0] * self.embedding_dim] * len(texts)
             
             # Generate embeddings for non-empty texts
-            embeddings = self.model.encode(
-                non_empty_texts,
-                batch_size=batch_size,
-                convert_to_numpy=True,
-                show_progress_bar=show_progress
-            )
+            with self.encode_lock:
+                embeddings = self.model.encode(
+                    non_empty_texts,
+                    batch_size=batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=show_progress
+                )
             
             # Normalize embeddings
-            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-            embeddings = np.where(norms > 0, embeddings / norms, embeddings)
+            embeddings = self._normalize_rows(embeddings)
             
             # Create result list with zero vectors for empty texts
             result = [[0.0] * self.embedding_dim] * len(texts)
@@ -126,6 +155,21 @@ class EmbeddingService:
             # Return zero vectors on error
             return [[0.0] * self.embedding_dim] * len(texts)
     
+    def _normalize_rows(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        L2-normalize embedding rows, leaving zero vectors untouched
+        
+        Very large batches use a fused Numba kernel that normalizes in place
+        instead of allocating full-size temporaries for the norms and quotient.
+        """
+        if NUMBA_AVAILABLE and embeddings.shape[0] >= NUMBA_NORMALIZE_MIN_ROWS:
+            embeddings = np.ascontiguousarray(embeddings)
+            _normalize_inplace(embeddings)
+            return embeddings
+        
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return np.where(norms > 0, embeddings / norms, embeddings)
+    
     def compute_similarity(
         self,
         embedding1: List[float],
@@ -158,13 +202,16 @@ class EmbeddingService:
 
 # Global instance - will be initialized when imported
 _embedding_service_instance = None
+_embedding_service_lock = threading.Lock()
 
 
 def get_embedding_service() -> EmbeddingService:
-    """Get or create the global embedding service instance"""
+    """Get or create the global embedding service instance (loaded once even if startup tasks race)"""
     global _embedding_service_instance
     if _embedding_service_instance is None:
-        _embedding_service_instance = EmbeddingService()
+        with _embedding_service_lock:
+            if _embedding_service_instance is None:
+                _embedding_service_instance = EmbeddingService()
     return _embedding_service_instance
 
 
@@ -5,37 +5,402 @@ Implements core hackathon features: text selection, cross-document search, snipp
 """
 
 import os
+import re
 import json
 import asyncio
-from typing import Dict, List, Optional, Any
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, AsyncIterator
 import logging
 
 # Try to import the provided scripts, fallback if not available
 try:
-    from .chat_with_llm import get_llm_response
+    from .chat_with_llm import get_llm_response, stream_llm_response, warm_llm_client, GEMINI_QUOTA_MESSAGE
     CHAT_LLM_AVAILABLE = True
 except ImportError:
     CHAT_LLM_AVAILABLE = False
+    GEMINI_QUOTA_MESSAGE = None
     print("⚠️ chat_with_llm.py not available, using fallback")
 
 try:
-    from .generate_audio import generate_audio
+    from .generate_audio import generate_audio, agenerate_audio
     AUDIO_AVAILABLE = True
     print("✅ generate_audio.py loaded successfully")
 except ImportError as e:
     AUDIO_AVAILABLE = False
     generate_audio = None
+    agenerate_audio = None
     print(f"⚠️ generate_audio.py not available: {e}")
     print("📢 Using TTS service instead for audio generation")
 
+# orjson is optional - faster parsing of large LLM replies
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# msgspec is optional - typed decoding of insight and podcast replies in one C pass
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# tiktoken is optional - without it token counts are estimated at ~4 characters per token
+try:
+    import tiktoken
+    _TOKEN_ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _TOKEN_ENCODING = None
+
+# NumPy is optional - used by the embedding, TF-IDF and compiled keyword tiers of related-section matching
+# (scikit-learn and numba depend on it, so they import only where it is installed)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# TF-IDF is optional - used for related-section matching when no LLM is available
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    TFIDF_AVAILABLE = True
+except ImportError:
+    TFIDF_AVAILABLE = False
+    print("⚠️ scikit-learn not available, using keyword overlap for related sections")
+
+# Numba is optional - compiles the keyword-overlap scorer used when scikit-learn is missing
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _score_sections(query_hashes, words, offsets, scores):
+        """Count shared words per section by sorted merge of hashed word arrays"""
+        for s in prange(offsets.shape[0] - 1):
+            i = offsets[s]
+            end = offsets[s + 1]
+            j = 0
+            common = 0
+            while i < end and j < query_hashes.shape[0]:
+                if words[i] == query_hashes[j]:
+                    common += 1
+                    i += 1
+                    j += 1
+                elif words[i] < query_hashes[j]:
+                    i += 1
+                else:
+                    j += 1
+            scores[s] = common
+
+from .llm_cache import SemanticLLMCache, PROMPT_SEMANTIC_MAX_CHARS, PROMPT_SEMANTIC_THRESHOLD
+
 logger = logging.getLogger(__name__)
 
+# Provider is fixed for the life of the process
+_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+
+# Output directories already created by generate_podcast_audio
+_ensured_dirs = set()
+
+# Markdown code fence around an LLM reply (either fence may be missing)
+_FENCE_RE = re.compile(r'^\s*(?:```(?:json)?)?\s*(.*?)\s*(?:```)?\s*$', re.DOTALL)
+
+# Fallback-insight document types, in priority order, matched in one case-insensitive pass
+_DOC_TYPE_KEYWORDS = {
+    "hackathon": "hackathon guide",
+    "resume": "resume",
+    "project": "project document",
+    "payment": "financial document",
+}
+_DOC_TYPE_PRIORITY = {keyword: rank for rank, keyword in enumerate(_DOC_TYPE_KEYWORDS)}
+_DOC_TYPE_LABELS = tuple(_DOC_TYPE_KEYWORDS.values())
+_DOC_TYPE_RE = re.compile("|".join(_DOC_TYPE_KEYWORDS), re.IGNORECASE)
+
+# Replies longer than this are parsed on a worker thread instead of the event loop
+JSON_OFFLOAD_THRESHOLD = 32_000
+
+# Prompt budgets (tokens) for section candidates and insight content
+SECTION_CANDIDATES = 8
+SECTIONS_TOKEN_BUDGET = 1500
+INSIGHT_CONTENT_TOKENS = 250
+
+# Embedding matches at or above this cosine score are returned without asking the LLM
+SECTION_MATCH_THRESHOLD = float(os.getenv("SECTION_MATCH_THRESHOLD", "0.6"))
+
+# Dedicated pool for blocking LLM calls so they never queue behind other default-executor work
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+_LLM_POOL = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="llm")
+
+# Max podcast segments synthesized at once
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "8"))
+
+if MSGSPEC_AVAILABLE:
+    class Insight(msgspec.Struct):
+        """One insights bulb entry"""
+        type: str = "key-takeaway"
+        title: str = ""
+        content: str = ""
+        relevance: float = 0.8
+
+    class Speaker(msgspec.Struct):
+        """Podcast speaker"""
+        name: str = "Speaker"
+        role: str = ""
+        voice: str = "alloy"
+
+    class ScriptSegment(msgspec.Struct):
+        """One line of the podcast script"""
+        speaker: str = "Speaker"
+        text: str = ""
+
+    class PodcastScript(msgspec.Struct):
+        """Two-speaker podcast script"""
+        title: str = "Podcast"
+        duration_estimate: str = ""
+        speakers: List[Speaker] = msgspec.field(default_factory=list)
+        script: List[ScriptSegment] = msgspec.field(default_factory=list)
+
+    INSIGHT_LIST_TYPE = List[Insight]
+    PODCAST_SCRIPT_TYPE = PodcastScript
+else:
+    INSIGHT_LIST_TYPE = None
+    PODCAST_SCRIPT_TYPE = None
+
+def _loads(text: str, schema: Any = None) -> Any:
+    """Parse JSON into plain Python objects
+
+    With msgspec and a schema the reply is decoded and validated in one pass (defaults
+    filled in, unknown keys dropped); replies that don't fit the schema are parsed as
+    plain JSON. Otherwise orjson is used when available (its JSONDecodeError subclasses json's).
+    """
+    if schema is not None and MSGSPEC_AVAILABLE:
+        try:
+            return msgspec.to_builtins(msgspec.json.decode(text, type=schema))
+        except msgspec.ValidationError:
+            pass
+        except msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), text, 0)
+    if ORJSON_AVAILABLE:
+        return orjson.loads(text)
+    return json.loads(text)
+
+async def _parse_llm_json(text: str, schema: Any = None) -> Any:
+    """Parse an LLM reply, offloading large payloads so the event loop stays responsive"""
+    if len(text) > JSON_OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(_loads, text, schema)
+    return _loads(text, schema)
+
+# Opening and closing lines of each method's system prompt (persona and job go in between)
+_SYSTEM_PROMPTS = {
+    "selection": ("You are an AI assistant for Adobe's PDF Intelligence System.",
+                  "Your job is to provide intelligent insights about selected text from PDF documents."),
+    "related_sections": ("You are an AI assistant for Adobe's PDF Intelligence System.",
+                         "Find the most relevant sections that relate to the selected text."),
+    "insights": ("You are an AI assistant for Adobe's PDF Intelligence System.",
+                 "Generate diverse insights that add value beyond basic understanding."),
+    "podcast": ("You are an AI assistant creating engaging podcast scripts.",
+                "Create a natural 2-speaker conversation that's informative and engaging."),
+}
+
+@functools.lru_cache(maxsize=256)
+def _sys_prompt(method: str, persona: Optional[str], job: Optional[str]) -> str:
+    """System prompt for a method, built once per (persona, job)"""
+    opening, instruction = _SYSTEM_PROMPTS[method]
+    return f"""{opening}
+User Profile: {persona or 'General Reader'}
+Task: {job or 'Document Analysis'}
+
+{instruction}"""
+
+def _semantic_cacheable(messages: List[Dict[str, str]]) -> bool:
+    """Only prompts that fit the embedding window may be served by a semantic cache hit"""
+    user_text = "\n".join(m.get('content', '') for m in messages if m.get('role') != 'system')
+    return len(user_text) <= PROMPT_SEMANTIC_MAX_CHARS
+
+@functools.lru_cache(maxsize=4096)
+def _count_tokens(text: str) -> int:
+    """Token count of a prompt fragment (cached, section texts repeat across queries)"""
+    if _TOKEN_ENCODING is not None:
+        return len(_TOKEN_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    if _count_tokens(text) <= max_tokens:
+        return text
+    if _TOKEN_ENCODING is not None:
+        return _TOKEN_ENCODING.decode(_TOKEN_ENCODING.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+def _pack_sections(candidates: List[tuple], budget: int) -> List[str]:
+    """Format (section index, section) candidates into prompt lines that fit a token budget
+
+    Short sections are kept whole; the remaining budget is split evenly across the
+    longer ones, which are the only ones truncated.
+    """
+    headers = [f"Section {idx}: {section.get('title', 'Untitled')} - " for idx, section in candidates]
+    contents = [section.get('content', '') for _, section in candidates]
+    remaining = budget - sum(_count_tokens(header) for header in headers)
+    
+    allowance = [0] * len(candidates)
+    order = sorted(range(len(candidates)), key=lambda i: _count_tokens(contents[i]))
+    for position, i in enumerate(order):
+        share = max(0, remaining) // (len(order) - position)
+        allowance[i] = min(_count_tokens(contents[i]), share)
+        remaining -= allowance[i]
+    
+    return [headers[i] + _truncate_tokens(contents[i], allowance[i]) for i in range(len(candidates))]
+
+# content digest -> document type label; keyed by digest so cached entries do not pin whole documents
+_doc_type_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_doc_type_lock = threading.Lock()
+
+def _classify_doc_type(content: str) -> str:
+    """Document type label for fallback insights, remembered for the last 128 documents"""
+    key = hashlib.blake2b(content.encode('utf-8', 'ignore'), digest_size=16).digest()
+    with _doc_type_lock:
+        label = _doc_type_cache.get(key)
+        if label is not None:
+            _doc_type_cache.move_to_end(key)
+            return label
+    label = _scan_doc_type(content)
+    with _doc_type_lock:
+        _doc_type_cache[key] = label
+        if len(_doc_type_cache) > 128:
+            _doc_type_cache.popitem(last=False)
+    return label
+
+def _scan_doc_type(content: str) -> str:
+    """Highest-priority document type keyword present in the content"""
+    best = None
+    for match in _DOC_TYPE_RE.finditer(content):
+        rank = _DOC_TYPE_PRIORITY[match.group(0).lower()]
+        if best is None or rank < best:
+            best = rank
+            if rank == 0:
+                break
+    if best is None:
+        return "document"
+    return _DOC_TYPE_LABELS[best]
+
+@functools.lru_cache(maxsize=256)
+def _insights_summary(insights: tuple) -> str:
+    """Bullet list of (title, content) insight pairs for the podcast prompt"""
+    return "\n".join([f"- {title}: {content}" for title, content in insights])
+
+class IncrementalJsonArrayParser:
+    """Yields each complete object of a streamed JSON array as soon as its closing brace arrives
+
+    Single O(n) scan over the stream; text before the opening '[' (e.g. a ```json fence
+    or prose) and after the closing ']' is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0          # 0 = outside the array, 1 = inside it, >1 = inside an element
+        self._in_string = False
+        self._escape = False
+        self._obj_start = -1
+        self._done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a chunk of text and return the objects it completed"""
+        if self._done:
+            return []
+
+        buf = self._buffer + chunk
+        objects = []
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if ch == '[':
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                if self._depth == 1 and ch == '{':
+                    self._obj_start = i
+                self._depth += 1
+            elif ch in ']}':
+                self._depth -= 1
+                if self._depth == 1 and ch == '}' and self._obj_start >= 0:
+                    try:
+                        objects.append(_loads(buf[self._obj_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._obj_start = -1
+                elif self._depth == 0:
+                    self._done = True
+                    break
+            i += 1
+
+        # Keep only the unfinished element so the buffer never grows with the reply
+        keep = self._obj_start if self._obj_start >= 0 else i
+        self._buffer = buf[keep:]
+        self._pos = i - keep
+        if self._obj_start >= 0:
+            self._obj_start = 0
+        return objects
+
 class EnhancedLLMService:
     """Enhanced LLM service using provided hackathon scripts"""
     
     def __init__(self):
-        self.provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+        self.provider = _PROVIDER
+        self.response_cache = SemanticLLMCache(
+            distance_threshold=float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", str(PROMPT_SEMANTIC_THRESHOLD)))
+        )
+        # (corpus key, fitted vectorizer, section x term matrix) for the offline matcher
+        self._tfidf_cache = None
+        # (corpus key, candidate indexes) -> packed "Available Sections" prompt block
+        self._sections_prompt_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        # (corpus key, per-section (document_id, document_name, page, title)) merged into LLM matches
+        self._enhancements_cache = None
+        # (corpus key, sorted word hashes of all sections, per-section offsets) for the Numba scorer
+        self._keyword_cache = None
         logger.info(f"✅ Enhanced LLM Service initialized with provider: {self.provider}")
+        
+        # Open the provider connection in the background so the first request skips the handshake
+        if CHAT_LLM_AVAILABLE:
+            threading.Thread(target=warm_llm_client, name="llm-warmup", daemon=True).start()
+    
+    async def _chat(self, messages: List[Dict[str, str]], persona: str = None, job: str = None,
+                    json_mode: str = None) -> str:
+        """Get an LLM response, serving repeat/near-identical prompts from the response cache"""
+        scope = (self.provider, persona or '', job or '')
+        semantic = _semantic_cacheable(messages)
+        
+        # Cache lookup may embed the prompt, so keep it off the event loop
+        cached = await asyncio.to_thread(self.response_cache.get, messages, scope, semantic)
+        if cached is not None:
+            return cached
+        
+        response = await asyncio.get_running_loop().run_in_executor(
+            _LLM_POOL, functools.partial(get_llm_response, messages, json_mode=json_mode)
+        )
+        # The quota apology comes back as an ordinary reply; caching it would outlive the outage
+        if response and response != GEMINI_QUOTA_MESSAGE:
+            await asyncio.to_thread(self.response_cache.put, messages, response, scope, semantic)
+        return response
     
     async def generate_text_selection_insights(self, selected_text: str, context: str, persona: str = None, job: str = None) -> Dict[str, Any]:
         """Generate insights for selected text - core hackathon feature"""
@@ -50,11 +415,7 @@ class EnhancedLLMService:
                 }
 
             messages = [
-                {"role": "system", "content": f"""You are an AI assistant for Adobe's PDF Intelligence System.
-User Profile: {persona or 'General Reader'}
-Task: {job or 'Document Analysis'}
-
-Your job is to provide intelligent insights about selected text from PDF documents."""},
+                {"role": "system", "content": _sys_prompt("selection", persona, job)},
                 {"role": "user", "content": f"""
 Analyze this selected text and provide insights:
 
@@ -71,11 +432,11 @@ Format as valid JSON.
 """}
             ]
 
-            response = await asyncio.to_thread(get_llm_response, messages)
+            response = await self._chat(messages, persona, job, json_mode="object")
 
             # Try to parse as JSON, fallback to structured text
             try:
-                return json.loads(response)
+                return _loads(response)
             except json.JSONDecodeError:
                 return {
                     "explanation": response[:200] + "..." if len(response) > 200 else response,
@@ -96,45 +457,33 @@ Format as valid JSON.
     async def find_related_sections(self, selected_text: str, all_sections: List[Dict], persona: str = None, job: str = None, max_results: int = 5) -> List[Dict[str, Any]]:
         """Find related sections across documents - core hackathon feature"""
         try:
+            # First tier: embedding nearest neighbours; the LLM is only asked when matches are weak
+            scored = await asyncio.to_thread(
+                self._embedding_scores, selected_text, all_sections, max(max_results, SECTION_CANDIDATES)
+            )
+            if scored and (scored[0][1] >= SECTION_MATCH_THRESHOLD or not CHAT_LLM_AVAILABLE):
+                return self._format_section_matches(scored[:max_results], all_sections)
+            
             if not CHAT_LLM_AVAILABLE:
-                # Fallback: simple keyword matching
-                results = []
-                selected_words = set(selected_text.lower().split())
-
-                for i, section in enumerate(all_sections[:max_results]):
-                    section_text = section.get('content', '').lower()
-                    common_words = selected_words.intersection(set(section_text.split()))
-                    if common_words:
-                        relevance = len(common_words) / len(selected_words) if selected_words else 0
-                        results.append({
-                            "section_id": i,
-                            "relevance_score": min(relevance, 0.9),
-                            "snippet": section.get('content', '')[:200] + "...",
-                            "connection_type": "similar",
-                            "document_id": section.get('document_id'),
-                            "document_name": section.get('document_name'),
-                            "page": section.get('page', 1),
-                            "title": section.get('title', 'Untitled Section')
-                        })
-
-                return sorted(results, key=lambda x: x['relevance_score'], reverse=True)[:max_results]
-
-            # Prepare sections for analysis
-            sections_text = []
-            for i, section in enumerate(all_sections[:20]):  # Limit for performance
-                sections_text.append(f"Section {i+1}: {section.get('title', 'Untitled')} - {section.get('content', '')[:200]}")
+                # Fallback: lexical matching without the LLM
+                return self._match_sections_offline(selected_text, all_sections, max_results)
 
-            messages = [
-                {"role": "system", "content": f"""You are an AI assistant for Adobe's PDF Intelligence System.
-User Profile: {persona or 'General Reader'}
-Task: {job or 'Document Analysis'}
+            # Prepare sections for analysis: embedding-ranked candidates (or the first 20),
+            # labelled with their index so section_id maps straight back to all_sections
+            if scored:
+                candidate_ids = tuple(i for i, _ in scored[:SECTION_CANDIDATES])
+            else:
+                candidate_ids = tuple(range(min(20, len(all_sections))))
+            corpus_key = hash(tuple(section.get('content', '') for section in all_sections))
+            sections_text = self._sections_prompt(all_sections, candidate_ids, corpus_key)
 
-Find the most relevant sections that relate to the selected text."""},
+            messages = [
+                {"role": "system", "content": _sys_prompt("related_sections", persona, job)},
                 {"role": "user", "content": f"""
 Selected Text: "{selected_text}"
 
 Available Sections:
-{chr(10).join(sections_text)}
+{sections_text}
 
 Find the top {max_results} most relevant sections and return as JSON array:
 [
@@ -150,23 +499,19 @@ Focus on semantic relevance, not just keyword matching.
 """}
             ]
 
-            response = await asyncio.to_thread(get_llm_response, messages)
+            response = await self._chat(messages, persona, job, json_mode="array")
 
             try:
-                related = json.loads(response)
-                # Enhance with original section data
+                related = _loads(response)
+                # Enhance with original section data, updating the parsed dicts in place
+                enhancements = self._section_enhancements(all_sections, corpus_key)
                 enhanced_results = []
                 for item in related[:max_results]:
                     section_id = item.get('section_id', 0)
-                    if section_id < len(all_sections):
-                        original_section = all_sections[section_id]
-                        enhanced_results.append({
-                            **item,
-                            "document_id": original_section.get('document_id'),
-                            "document_name": original_section.get('document_name'),
-                            "page": original_section.get('page', 1),
-                            "title": original_section.get('title', 'Untitled Section')
-                        })
+                    if isinstance(section_id, int) and 0 <= section_id < len(enhancements):
+                        document_id, document_name, page, title = enhancements[section_id]
+                        item.update(document_id=document_id, document_name=document_name, page=page, title=title)
+                        enhanced_results.append(item)
 
                 return enhanced_results
 
@@ -178,25 +523,171 @@ Focus on semantic relevance, not just keyword matching.
             logger.error(f"Error finding related sections: {e}")
             return []
     
-    async def generate_insights_bulb(self, content: str, related_sections: List[Dict], persona: str = None, job: str = None) -> List[Dict[str, Any]]:
-        """Generate insights bulb content - bonus feature (+5 points)"""
+    def _sections_prompt(self, all_sections: List[Dict], candidate_ids: tuple, corpus_key: int) -> str:
+        """Packed section listing for the LLM prompt, reused while the corpus and candidates repeat"""
+        key = (corpus_key, candidate_ids)
+        cached = self._sections_prompt_cache.get(key)
+        if cached is not None:
+            self._sections_prompt_cache.move_to_end(key)
+            return cached
+        
+        candidates = [(i, all_sections[i]) for i in candidate_ids]
+        text = "\n".join(_pack_sections(candidates, SECTIONS_TOKEN_BUDGET))
+        
+        self._sections_prompt_cache[key] = text
+        if len(self._sections_prompt_cache) > 256:
+            self._sections_prompt_cache.popitem(last=False)
+        return text
+    
+    def _section_enhancements(self, all_sections: List[Dict], corpus_key: int) -> List[tuple]:
+        """Per-section (document_id, document_name, page, title), built once per corpus"""
+        if self._enhancements_cache is None or self._enhancements_cache[0] != corpus_key:
+            enhancements = [
+                (section.get('document_id'), section.get('document_name'),
+                 section.get('page', 1), section.get('title', 'Untitled Section'))
+                for section in all_sections
+            ]
+            self._enhancements_cache = (corpus_key, enhancements)
+        return self._enhancements_cache[1]
+    
+    def _match_sections_offline(self, selected_text: str, all_sections: List[Dict], max_results: int) -> List[Dict[str, Any]]:
+        """Rank sections against the selection without an LLM (TF-IDF cosine, keyword overlap fallback)"""
+        if not all_sections or not selected_text.strip():
+            return []
+        
+        if TFIDF_AVAILABLE:
+            scored = self._tfidf_scores(selected_text, all_sections, max_results)
+        elif NUMBA_AVAILABLE:
+            scored = self._keyword_scores(selected_text, all_sections, max_results)
+        else:
+            scored = []
+            selected_words = set(selected_text.lower().split())
+            for i, section in enumerate(all_sections):
+                common_words = selected_words.intersection(section.get('content', '').lower().split())
+                if common_words:
+                    scored.append((i, len(common_words) / len(selected_words)))
+            scored = sorted(scored, key=lambda x: x[1], reverse=True)[:max_results]
+        
+        return self._format_section_matches(scored, all_sections)
+    
+    def _format_section_matches(self, scored: List[tuple], all_sections: List[Dict]) -> List[Dict[str, Any]]:
+        """Build related-section results from (section index, score) pairs"""
+        results = []
+        for i, score in scored:
+            section = all_sections[i]
+            results.append({
+                "section_id": i,
+                "relevance_score": min(score, 0.9),
+                "snippet": section.get('content', '')[:200] + "...",
+                "connection_type": "similar",
+                "document_id": section.get('document_id'),
+                "document_name": section.get('document_name'),
+                "page": section.get('page', 1),
+                "title": section.get('title', 'Untitled Section')
+            })
+        return results
+    
+    @staticmethod
+    def _word_hashes(text: str):
+        """Sorted unique hashes of the lowercase words in text"""
+        return np.unique(np.fromiter((hash(w) for w in set(text.lower().split())), dtype=np.int64))
+    
+    def _keyword_scores(self, selected_text: str, all_sections: List[Dict], max_results: int) -> List[tuple]:
+        """Top (section index, overlap ratio) pairs from the compiled keyword scorer"""
+        contents = tuple(section.get('content', '') for section in all_sections)
+        corpus_key = hash(contents)
+        
+        if self._keyword_cache is None or self._keyword_cache[0] != corpus_key:
+            # SoA layout: one flat array of per-section sorted hashes plus offsets into it
+            per_section = [self._word_hashes(content) for content in contents]
+            offsets = np.zeros(len(per_section) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(h) for h in per_section])
+            words = np.concatenate(per_section) if per_section else np.zeros(0, dtype=np.int64)
+            self._keyword_cache = (corpus_key, words, offsets)
+        
+        _, words, offsets = self._keyword_cache
+        query_hashes = self._word_hashes(selected_text)
+        if not query_hashes.shape[0]:
+            return []
+        
+        scores = np.zeros(len(contents), dtype=np.int64)
+        _score_sections(query_hashes, words, offsets, scores)
+        
+        k = min(max_results, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), scores[i] / query_hashes.shape[0]) for i in top if scores[i] > 0]
+    
+    def _embedding_scores(self, selected_text: str, all_sections: List[Dict], max_results: int) -> List[tuple]:
+        """
+        Top (section index, cosine score) pairs: the candidates' FAISS scores when present,
+        else one matmul of section embeddings with the query
+        """
+        if not NUMPY_AVAILABLE or not all_sections or not selected_text.strip():
+            return []
+        
         try:
-            # Check for quota exceeded and provide fallback insights
-            if self._is_quota_exceeded():
-                return self._generate_fallback_insights(content, persona, job)
-            # Prepare related content
-            related_content = ""
-            for section in related_sections[:3]:
-                related_content += f"- {section.get('title', 'Section')}: {section.get('snippet', '')}\n"
-            
-            messages = [
-                {"role": "system", "content": f"""You are an AI assistant for Adobe's PDF Intelligence System.
-User Profile: {persona or 'General Reader'}
-Task: {job or 'Document Analysis'}
-
-Generate diverse insights that add value beyond basic understanding."""},
-                {"role": "user", "content": f"""
-Main Content: {content[:1000]}
+            if all('faiss_score' in section for section in all_sections):
+                # Candidates from the FAISS search already carry their cosine similarity to this query
+                scores = np.array([section['faiss_score'] for section in all_sections], dtype='float32')
+            else:
+                from .embedding_service import get_embedding_service
+                embedder = get_embedding_service()
+                
+                # Other callers' sections are a different set every call, so they are scored
+                # exactly instead of building an index over them
+                vectors = np.asarray(embedder.generate_embeddings_batch(
+                    [section.get('content', '') for section in all_sections], show_progress=False
+                ), dtype='float32')
+                query = np.asarray(embedder.generate_embedding(selected_text), dtype='float32')
+                
+                # Both sides are L2-normalized, so the dot product is cosine similarity
+                scores = vectors @ query
+            k = min(max_results, scores.shape[0])
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+        except Exception as e:
+            logger.warning(f"Embedding section matching unavailable: {e}")
+            return []
+    
+    def _tfidf_scores(self, selected_text: str, all_sections: List[Dict], max_results: int) -> List[tuple]:
+        """Top (section index, cosine score) pairs from a TF-IDF matrix cached per corpus"""
+        contents = tuple(section.get('content', '') for section in all_sections)
+        corpus_key = hash(contents)
+        
+        if self._tfidf_cache is None or self._tfidf_cache[0] != corpus_key:
+            vectorizer = TfidfVectorizer(lowercase=True)
+            try:
+                matrix = vectorizer.fit_transform(contents)
+            except ValueError:
+                # Empty vocabulary (e.g. sections with no text)
+                return []
+            self._tfidf_cache = (corpus_key, vectorizer, matrix)
+        
+        _, vectorizer, matrix = self._tfidf_cache
+        
+        # Rows are L2-normalized, so the sparse matmul gives cosine similarity
+        scores = (matrix @ vectorizer.transform([selected_text]).T).toarray().ravel()
+        k = min(max_results, scores.shape[0])
+        if k <= 0:
+            return []
+        
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+    
+    def _insights_bulb_messages(self, content: str, related_sections: List[Dict], persona: str = None, job: str = None) -> List[Dict[str, str]]:
+        """Build the chat messages for the insights bulb prompt"""
+        # Prepare related content
+        related_content = ""
+        for section in related_sections[:3]:
+            related_content += f"- {section.get('title', 'Section')}: {section.get('snippet', '')}\n"
+        
+        messages = [
+            {"role": "system", "content": _sys_prompt("insights", persona, job)},
+            {"role": "user", "content": f"""
+Main Content: {_truncate_tokens(content, INSIGHT_CONTENT_TOKENS)}
 
 Related Sections:
 {related_content}
@@ -237,25 +728,33 @@ Generate exactly 5-6 different types of insights as JSON array:
 
 Make insights specific and actionable for the user's persona and task.
 """}
-            ]
+        ]
+        return messages
+    
+    async def generate_insights_bulb(self, content: str, related_sections: List[Dict], persona: str = None, job: str = None) -> List[Dict[str, Any]]:
+        """Generate insights bulb content - bonus feature (+5 points)"""
+        try:
+            # Check for quota exceeded and provide fallback insights
+            if self._is_quota_exceeded():
+                return self._generate_fallback_insights(content, persona, job)
+            
+            messages = self._insights_bulb_messages(content, related_sections, persona, job)
             
-            response = await asyncio.to_thread(get_llm_response, messages)
+            response = await self._chat(messages, persona, job, json_mode="array")
             
             try:
                 # Debug: Print the raw response
                 print(f"🔍 Raw LLM response for insights: {response[:300]}...")
 
-                # Clean the response - remove markdown code blocks
-                cleaned_response = response.strip()
-                if cleaned_response.startswith('```json'):
-                    cleaned_response = cleaned_response[7:]  # Remove ```json
-                if cleaned_response.endswith('```'):
-                    cleaned_response = cleaned_response[:-3]  # Remove ```
-                cleaned_response = cleaned_response.strip()
+                # Clean the response - remove markdown code blocks (skipped when it is already bare JSON)
+                if response and response[0] in '[{':
+                    cleaned_response = response
+                else:
+                    cleaned_response = _FENCE_RE.match(response).group(1)
 
                 print(f"🧹 Cleaned response: {cleaned_response[:200]}...")
 
-                insights = json.loads(cleaned_response)
+                insights = await _parse_llm_json(cleaned_response, INSIGHT_LIST_TYPE)
                 # Add IDs and ensure proper format
                 for i, insight in enumerate(insights):
                     insight['id'] = str(i + 1)
@@ -289,19 +788,92 @@ Make insights specific and actionable for the user's persona and task.
                 return self._generate_fallback_insights(content, persona, job)
             return []
     
+    async def stream_insights_bulb(self, content: str, related_sections: List[Dict], persona: str = None, job: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield insights bulb entries one by one as the LLM streams them"""
+        if not CHAT_LLM_AVAILABLE or self._is_quota_exceeded():
+            for insight in self._generate_fallback_insights(content, persona, job):
+                yield insight
+            return
+        
+        messages = self._insights_bulb_messages(content, related_sections, persona, job)
+        scope = (self.provider, persona or '', job or '')
+        semantic = _semantic_cacheable(messages)
+        parser = IncrementalJsonArrayParser()
+        count = 0
+        
+        try:
+            cached = await asyncio.to_thread(self.response_cache.get, messages, scope, semantic)
+            if cached is not None:
+                chunks = [cached]
+            else:
+                chunks = stream_llm_response(messages)
+            
+            pieces = []
+            async for chunk in self._as_async(chunks):
+                pieces.append(chunk)
+                for insight in parser.feed(chunk):
+                    if not isinstance(insight, dict) or count >= 6:
+                        continue
+                    count += 1
+                    insight['id'] = str(count)
+                    # Set default relevance for backward compatibility, but don't display it
+                    insight['relevance'] = insight.get('relevance', 0.8)
+                    insight['persona_relevance'] = insight.get('relevance', 0.8)
+                    yield insight
+            
+            reply = "".join(pieces)
+            if cached is None and count and GEMINI_QUOTA_MESSAGE not in reply:
+                await asyncio.to_thread(self.response_cache.put, messages, reply, scope, semantic)
+                
+        except Exception as e:
+            logger.error(f"Error streaming insights bulb: {e}")
+            if "quota" in str(e).lower() or "429" in str(e):
+                logger.warning("🔄 Quota exceeded, using fallback insights")
+        
+        if not count:
+            for insight in self._generate_fallback_insights(content, persona, job):
+                yield insight
+    
+    async def _as_async(self, chunks) -> AsyncIterator[str]:
+        """Drain a blocking iterator on a worker thread without blocking the event loop"""
+        if isinstance(chunks, list):
+            for chunk in chunks:
+                yield chunk
+            return
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        
+        def pump():
+            try:
+                for chunk in chunks:
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+        
+        worker = loop.run_in_executor(_LLM_POOL, pump)
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await worker
+    
     async def generate_podcast_script(self, content: str, related_sections: List[Dict], insights: List[Dict], persona: str = None, job: str = None) -> Dict[str, Any]:
         """Generate 2-speaker podcast script - bonus feature (+5 points)"""
         try:
             # Prepare content summary
             content_summary = content[:800] if content else "No content provided"
-            insights_summary = "\n".join([f"- {insight.get('title', '')}: {insight.get('content', '')}" for insight in insights[:3]])
+            insights_summary = _insights_summary(tuple(
+                (insight.get('title', ''), insight.get('content', '')) for insight in insights[:3]
+            ))
             
             messages = [
-                {"role": "system", "content": f"""You are an AI assistant creating engaging podcast scripts.
-User Profile: {persona or 'General Reader'}
-Task: {job or 'Document Analysis'}
-
-Create a natural 2-speaker conversation that's informative and engaging."""},
+                {"role": "system", "content": _sys_prompt("podcast", persona, job)},
                 {"role": "user", "content": f"""
 Create a 2-5 minute podcast script with two speakers discussing:
 
@@ -329,10 +901,10 @@ Include natural transitions, questions, and insights from the analysis.
 """}
             ]
             
-            response = await asyncio.to_thread(get_llm_response, messages)
+            response = await self._chat(messages, persona, job, json_mode="object")
             
             try:
-                return json.loads(response)
+                return await _parse_llm_json(response, PODCAST_SCRIPT_TYPE)
             except json.JSONDecodeError:
                 # Fallback script
                 return {
@@ -362,28 +934,32 @@ Include natural transitions, questions, and insights from the analysis.
     async def generate_podcast_audio(self, script: Dict[str, Any], output_dir: str = "backend/data/audio") -> str:
         """Generate audio from podcast script using provided generate_audio.py"""
         try:
-            os.makedirs(output_dir, exist_ok=True)
+            if output_dir not in _ensured_dirs:
+                os.makedirs(output_dir, exist_ok=True)
+                _ensured_dirs.add(output_dir)
             
             # Generate audio for each speaker segment
-            audio_files = []
             speakers = script.get('speakers', [])
             script_segments = script.get('script', [])
             
-            for i, segment in enumerate(script_segments):
-                speaker_name = segment.get('speaker', 'Speaker')
-                text = segment.get('text', '')
-                
-                # Find speaker voice
-                voice = 'alloy'  # default
-                for speaker in speakers:
-                    if speaker.get('name') == speaker_name:
-                        voice = speaker.get('voice', 'alloy')
-                        break
-                
-                # Generate audio segment
+            # Resolve speaker voices once (first definition wins, default 'alloy')
+            voices = {}
+            for speaker in speakers:
+                voices.setdefault(speaker.get('name'), speaker.get('voice', 'alloy'))
+            
+            # Segments are independent, so synthesize them concurrently (capped for the TTS provider)
+            semaphore = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+            
+            async def synthesize(i: int, segment: Dict[str, Any]) -> str:
+                voice = voices.get(segment.get('speaker', 'Speaker'), 'alloy')
                 segment_file = os.path.join(output_dir, f"segment_{i:03d}.mp3")
-                await asyncio.to_thread(generate_audio, text, segment_file, voice=voice)
-                audio_files.append(segment_file)
+                async with semaphore:
+                    await agenerate_audio(segment.get('text', ''), segment_file, voice=voice)
+                return segment_file
+            
+            audio_files = await asyncio.gather(
+                *(synthesize(i, segment) for i, segment in enumerate(script_segments))
+            )
             
             # For now, return the first segment (in production, would concatenate all)
             return audio_files[0] if audio_files else None
@@ -403,16 +979,7 @@ Include natural transitions, questions, and insights from the analysis.
 
         # Extract key information from content
         content_preview = content[:200] if content else "Document content"
-        doc_type = "document"
-
-        if "hackathon" in content.lower():
-            doc_type = "hackathon guide"
-        elif "resume" in content.lower():
-            doc_type = "resume"
-        elif "project" in content.lower():
-            doc_type = "project document"
-        elif "payment" in content.lower():
-            doc_type = "financial document"
+        doc_type = _classify_doc_type(content or "")
 
         fallback_insights = [
             {
@@ -451,3 +1018,9 @@ Include natural transitions, questions, and insights from the analysis.
             })
 
         return fallback_insights
+
+
+@functools.lru_cache(maxsize=None)
+def get_enhanced_llm_service() -> EnhancedLLMService:
+    """Shared EnhancedLLMService so caches and indexes are reused across requests"""
+    return EnhancedLLMService()
@@ -1,8 +1,18 @@
 import os
+import base64
+import asyncio
 import subprocess
 import requests
 from pathlib import Path
 
+# httpx is optional - enables non-blocking cloud TTS calls in agenerate_audio
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
 # Optional imports for different TTS providers
 try:
     from google.cloud import texttospeech
@@ -86,9 +96,25 @@ Usage:
     # With custom voice
     generate_audio("Hello, world!", "output.wav", voice="alloy")
     
+    # From async code (cloud providers use a non-blocking HTTP client)
+    await agenerate_audio("Hello, world!", "output.mp3", voice="alloy")
+    
 
 """
 
+def _cloud_max_chars():
+    """Maximum characters per cloud TTS request (None disables chunking)"""
+    # TTS_CLOUD_MAX_CHARS: Maximum characters per request for cloud providers (azure/gcp)
+    # Defaults to 3000 if not set. Local provider is never chunked.
+    max_chars_env = os.getenv("TTS_CLOUD_MAX_CHARS", "3000")
+    try:
+        max_chars = int(max_chars_env)
+        if max_chars <= 0:
+            return None
+        return max_chars
+    except (TypeError, ValueError):
+        return 3000
+
 def generate_audio(text, output_file, provider=None, voice=None):
     """
     Generate audio from text using the specified TTS provider.
@@ -116,16 +142,7 @@ def generate_audio(text, output_file, provider=None, voice=None):
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
     # Cloud input size limit handling via environment variable
-    # TTS_CLOUD_MAX_CHARS: Maximum characters per request for cloud providers (azure/gcp)
-    # Defaults to 3000 if not set. Local provider is never chunked.
-    max_chars_env = os.getenv("TTS_CLOUD_MAX_CHARS", "3000")
-    max_chars = None
-    try:
-        max_chars = int(max_chars_env)
-        if max_chars <= 0:
-            max_chars = None
-    except (TypeError, ValueError):
-        max_chars = 3000
+    max_chars = _cloud_max_chars()
 
     if provider in ("azure", "gcp") and max_chars and len(text) > max_chars:
         return _generate_cloud_tts_chunked(text, output_file, provider, voice, max_chars)
@@ -139,6 +156,84 @@ def generate_audio(text, output_file, provider=None, voice=None):
     else:
         raise ValueError(f"Unsupported TTS_PROVIDER: {provider}")
 
+_async_client = None
+
+def _get_async_client():
+    """Shared httpx.AsyncClient so concurrent segments reuse pooled connections"""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(timeout=30)
+    return _async_client
+
+async def close_async_client():
+    """Close the shared httpx.AsyncClient (app shutdown)"""
+    global _async_client
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+    _async_client = None
+
+async def agenerate_audio(text, output_file, provider=None, voice=None):
+    """
+    Async variant of generate_audio.
+    
+    Single-request Azure and API-key GCP synthesis are awaited on a shared httpx.AsyncClient,
+    so many segments can be in flight without occupying worker threads. Other paths
+    (local espeak-ng, service-account GCP, chunked cloud synthesis) run generate_audio
+    on a worker thread.
+    
+    Returns:
+        str: Path to the generated audio file
+    """
+    if not text or not text.strip():
+        raise ValueError("Text cannot be empty")
+    
+    provider = provider or os.getenv("TTS_PROVIDER", "local").lower()
+    max_chars = _cloud_max_chars()
+    fits_one_request = not (max_chars and len(text) > max_chars)
+    
+    if HTTPX_AVAILABLE and fits_one_request:
+        if provider == "azure":
+            return await _agenerate_azure_tts(text, output_file, voice)
+        if provider == "gcp" and os.getenv("GOOGLE_API_KEY"):
+            return await _agenerate_gcp_tts(text, output_file, voice)
+    
+    return await asyncio.to_thread(generate_audio, text, output_file, provider, voice)
+
+async def _agenerate_azure_tts(text, output_file, voice=None):
+    """Generate audio using Azure OpenAI TTS without blocking the event loop."""
+    url, headers, payload = _azure_tts_request(text, voice)
+    
+    try:
+        response = await _get_async_client().post(url, headers=headers, json=payload)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"Azure OpenAI TTS failed: {e}")
+    
+    await asyncio.to_thread(_write_audio, output_file, response.content)
+    print(f"Azure OpenAI TTS audio saved to: {output_file}")
+    return output_file
+
+async def _agenerate_gcp_tts(text, output_file, voice=None):
+    """Generate audio using the Google Cloud TTS REST API without blocking the event loop."""
+    url, headers, payload = _gcp_tts_request(text, voice)
+    
+    try:
+        response = await _get_async_client().post(url, headers=headers, json=payload)
+        response.raise_for_status()
+        audio_content = base64.b64decode(response.json()["audioContent"])
+    except Exception as e:
+        raise RuntimeError(f"Google Cloud TTS failed: {e}")
+    
+    await asyncio.to_thread(_write_audio, output_file, audio_content)
+    print(f"Google Cloud TTS audio saved to: {output_file}")
+    return output_file
+
+def _write_audio(output_file, content):
+    """Write audio bytes, creating the parent directory if needed"""
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(content)
+
 def _chunk_text_by_chars(text, max_chars):
     """Split text into chunks not exceeding max_chars, preferring whitespace boundaries.
 
@@ -225,8 +320,8 @@ def _generate_cloud_tts_chunked(text, output_file, provider, voice, max_chars):
             except Exception:
                 pass
 
-def _generate_azure_tts(text, output_file, voice=None):
-    """Generate audio using Azure OpenAI TTS."""
+def _azure_tts_request(text, voice=None):
+    """Build the Azure OpenAI TTS request (url, headers, payload)."""
     api_key = os.getenv("AZURE_TTS_KEY")
     endpoint = os.getenv("AZURE_TTS_ENDPOINT")
     deployment = os.getenv("AZURE_TTS_DEPLOYMENT", "tts")
@@ -247,9 +342,16 @@ def _generate_azure_tts(text, output_file, voice=None):
         "voice": voice,
     }
 
+    url = f"{endpoint}/openai/deployments/{deployment}/audio/speech?api-version={api_version}"
+    return url, headers, payload
+
+def _generate_azure_tts(text, output_file, voice=None):
+    """Generate audio using Azure OpenAI TTS."""
+    url, headers, payload = _azure_tts_request(text, voice)
+
     try:
         response = requests.post(
-            f"{endpoint}/openai/deployments/{deployment}/audio/speech?api-version={api_version}",
+            url,
             headers=headers,
             json=payload,
             timeout=30
@@ -265,6 +367,30 @@ def _generate_azure_tts(text, output_file, voice=None):
     except requests.exceptions.RequestException as e:
         raise RuntimeError(f"Azure OpenAI TTS failed: {e}")
 
+def _gcp_tts_request(text, voice=None):
+    """Build the Google Cloud TTS REST request (url, headers, payload) for API-key auth."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    gcp_voice = voice or os.getenv("GCP_TTS_VOICE", "en-US-Neural2-F")
+    language = os.getenv("GCP_TTS_LANGUAGE", "en-US")
+
+    url = "https://texttospeech.googleapis.com/v1/text:synthesize"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    payload = {
+        "input": {"text": text},
+        "voice": {
+            "languageCode": language,
+            "name": gcp_voice
+        },
+        "audioConfig": {
+            "audioEncoding": "MP3"
+        }
+    }
+    return url, headers, payload
+
 def _generate_gcp_tts(text, output_file, voice=None):
     """Generate audio using Google Cloud Text-to-Speech."""
     api_key = os.getenv("GOOGLE_API_KEY")
@@ -279,30 +405,12 @@ def _generate_gcp_tts(text, output_file, voice=None):
         # Use API key if available, otherwise use service account credentials
         if api_key:
             # For API key authentication, we need to use the REST API directly
-            import requests
-
-            url = "https://texttospeech.googleapis.com/v1/text:synthesize"
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "input": {"text": text},
-                "voice": {
-                    "languageCode": language,
-                    "name": gcp_voice
-                },
-                "audioConfig": {
-                    "audioEncoding": "MP3"
-                }
-            }
+            url, headers, payload = _gcp_tts_request(text, voice)
 
             response = requests.post(url, headers=headers, json=payload, timeout=30)
             response.raise_for_status()
 
             # Decode the base64 audio content
-            import base64
             audio_content = base64.b64decode(response.json()["audioContent"])
 
             with open(output_file, "wb") as f:
@@ -0,0 +1,496 @@
+"""
+LLM Response Cache
+Two-tier cache for LLM responses: exact SHA-256 match first, then semantic
+nearest-neighbour lookup over sentence embeddings (FAISS inner product).
+Provider responses are also persisted to SQLite with a TTL (see cached_llm).
+"""
+
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import functools
+import json
+import string
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# orjson is optional - faster serialization of cache keys and on-disk results
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _dumps_sorted(value: Any) -> bytes:
+    """Deterministic JSON encoding used for cache keys"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS, default=str)
+    return json.dumps(value, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')
+
+# FAISS is optional - without it only the exact tier is used. It is imported on the first
+# semantic lookup so importing the providers does not pay for numpy/faiss at startup.
+np = None
+faiss = None
+
+
+def _load_semantic_backend() -> bool:
+    """Import numpy/faiss on first use; False when they are not installed"""
+    global np, faiss
+    if faiss is None:
+        try:
+            import numpy as np
+            import faiss
+        except ImportError:
+            print("⚠️ faiss not available, LLM cache limited to exact matches")
+            faiss = False
+    return bool(faiss)
+
+
+class SemanticLLMCache:
+    """Exact + semantic cache for chat-style LLM prompts"""
+
+    def __init__(self, distance_threshold: float = 0.15, max_entries: int = 1000, embedding_dim: int = 384):
+        """
+        Initialize the cache
+
+        Args:
+            distance_threshold: Max cosine distance (1 - similarity) for a semantic hit
+            max_entries: Max exact-match entries kept (LRU eviction)
+            embedding_dim: Dimension of the sentence embeddings
+        """
+        self.distance_threshold = distance_threshold
+        self.max_entries = max_entries
+        self.embedding_dim = embedding_dim
+
+        self._exact: "OrderedDict[str, str]" = OrderedDict()
+        # scope + system prompt -> (FAISS index, responses aligned with index rows)
+        self._semantic: Dict[Tuple, Tuple[Any, List[str]]] = {}
+        self._lock = threading.Lock()
+        self._embedder = None
+        self._semantic_enabled = True
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _exact_key(messages: List[Dict[str, str]], scope: Tuple) -> str:
+        """SHA-256 over the scope and the role-tagged prompt"""
+        return hashlib.sha256(_dumps_sorted([list(scope), messages])).hexdigest()
+
+    @staticmethod
+    def _semantic_scope(messages: List[Dict[str, str]], scope: Tuple) -> Tuple:
+        """Semantic hits never cross system prompts, so each prompt template gets its own index"""
+        return tuple(scope) + tuple(m.get('content', '') for m in messages if m.get('role') == 'system')
+
+    @staticmethod
+    def _semantic_text(messages: List[Dict[str, str]]) -> str:
+        """Text embedded for the semantic tier (user turns only; persona/job live in the scope)"""
+        return "\n".join(m.get('content', '') for m in messages if m.get('role') != 'system')
+
+    def _embed(self, text: str):
+        """Embed text with the shared embedding model (lazy-loaded)"""
+        if not _load_semantic_backend():
+            self._semantic_enabled = False
+            return None
+        if self._embedder is None:
+            try:
+                from .embedding_service import get_embedding_service
+                self._embedder = get_embedding_service()
+            except Exception as e:
+                logger.warning(f"Semantic LLM cache disabled: {e}")
+                self._semantic_enabled = False
+                return None
+
+        vector = np.asarray([self._embedder.generate_embedding(text)], dtype='float32')
+        faiss.normalize_L2(vector)
+        return vector
+
+    def get(self, messages: List[Dict[str, str]], scope: Tuple = (), semantic: bool = True) -> Optional[str]:
+        """Return a cached response for these messages, or None on a miss"""
+        key = self._exact_key(messages, scope)
+        with self._lock:
+            if key in self._exact:
+                self._exact.move_to_end(key)
+                self.hits += 1
+                return self._exact[key]
+
+        if semantic and self._semantic_enabled:
+            try:
+                vector = self._embed(self._semantic_text(messages))
+                with self._lock:
+                    entry = self._semantic.get(self._semantic_scope(messages, scope))
+                    if vector is not None and entry is not None and entry[0].ntotal:
+                        similarities, ids = entry[0].search(vector, 1)
+                        if 1.0 - float(similarities[0][0]) <= self.distance_threshold:
+                            self.hits += 1
+                            return entry[1][int(ids[0][0])]
+            except Exception as e:
+                logger.warning(f"Semantic LLM cache lookup failed: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, messages: List[Dict[str, str]], response: str, scope: Tuple = (), semantic: bool = True):
+        """Store a response in both tiers"""
+        if not response:
+            return
+
+        key = self._exact_key(messages, scope)
+        with self._lock:
+            self._exact[key] = response
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+        if semantic and self._semantic_enabled:
+            try:
+                vector = self._embed(self._semantic_text(messages))
+                if vector is None:
+                    return
+                semantic_scope = self._semantic_scope(messages, scope)
+                with self._lock:
+                    entry = self._semantic.get(semantic_scope)
+                    if entry is None or entry[0].ntotal >= self.max_entries:
+                        # Start a fresh index once a scope fills up
+                        entry = (faiss.IndexFlatIP(self.embedding_dim), [])
+                        self._semantic[semantic_scope] = entry
+                    entry[0].add(vector)
+                    entry[1].append(response)
+            except Exception as e:
+                logger.warning(f"Semantic LLM cache insert failed: {e}")
+
+    def clear(self):
+        """Drop all cached responses"""
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+
+
+# Persistent tier for provider responses
+LLM_CACHE_DB = Path(__file__).resolve().parent.parent / "data" / "llm_cache.db"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+
+# Semantic hits for provider prompts need cosine similarity >= 0.95, and only prompts short
+# enough to fit the embedding model's window are matched semantically (longer ones are
+# truncated by the model, so two different documents behind the same template would collide)
+PROMPT_SEMANTIC_THRESHOLD = 0.05
+PROMPT_SEMANTIC_MAX_CHARS = 1000
+
+
+class SQLiteResponseStore:
+    """Exact-match response store in SQLite with per-entry expiry"""
+
+    def __init__(self, db_path: Path = LLM_CACHE_DB, ttl_seconds: int = LLM_CACHE_TTL):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache(expires_at)')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the stored value if it has not expired"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: str):
+        """Store a value, replacing any previous entry for the key"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)',
+                (key, value, now, now + self.ttl_seconds)
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries, returning how many were removed"""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (time.time(),))
+            self._conn.commit()
+        return cursor.rowcount
+
+
+# Whole-result cache for deterministic provider methods (snippets, cross-document connections)
+RESPONSE_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "llm_responses"
+
+
+class ResponseCache:
+    """
+    On-disk JSON results keyed by SHA-256 of the canonical inputs, one file per key.
+    Entries older than the TTL are treated as misses and deleted (on read or by purge_expired).
+    """
+
+    def __init__(self, cache_dir: Path = RESPONSE_CACHE_DIR, ttl_seconds: int = LLM_CACHE_TTL):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def key(**inputs: Any) -> str:
+        """SHA-256 over a canonical (sorted-keys) JSON encoding of the inputs"""
+        return hashlib.sha256(_dumps_sorted(inputs)).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the stored result, or None if missing, expired or unreadable"""
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            data = path.read_bytes()
+            return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: Any):
+        """Write the result atomically (temp file + os.replace) so readers never see partial JSON"""
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(
+                orjson.dumps(value) if ORJSON_AVAILABLE else json.dumps(value, ensure_ascii=False).encode('utf-8')
+            )
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write response cache entry {key[:8]}: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def purge_expired(self) -> int:
+        """Delete entries (and leftover temp files) older than the TTL, returning how many were removed"""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.stat().st_mtime < cutoff:
+                            os.unlink(entry.path)
+                            removed += 1
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        return removed
+
+
+_prompt_cache: Optional[SemanticLLMCache] = None
+_response_store: Optional[SQLiteResponseStore] = None
+_cache_init_lock = threading.Lock()
+
+# Set by callers that expect a structured reply: a response whose text it rejects is
+# returned to the caller but not written to any cache tier
+reply_validator: ContextVar[Optional[Callable[[str], bool]]] = ContextVar('reply_validator', default=None)
+
+# Fixed opening text of the registered prompt templates. A templated prompt is one user message
+# whose variable slots are a small part of it, so its embedding mostly encodes the template and
+# unrelated fills land within the semantic threshold: those prompts use the exact tiers only.
+_template_prefixes: Tuple[str, ...] = ()
+
+# Exact cache key -> future of the call currently producing it (concurrent repeats await it)
+_inflight: Dict[str, "asyncio.Future"] = {}
+# Result handed to waiters when the call they share is cancelled
+_LEADER_CANCELLED = object()
+
+
+def _get_caches() -> Tuple[SemanticLLMCache, Optional[SQLiteResponseStore]]:
+    """Process-wide caches shared by every provider (created on first use)"""
+    global _prompt_cache, _response_store
+    if _prompt_cache is None:
+        with _cache_init_lock:
+            if _prompt_cache is None:
+                try:
+                    _response_store = SQLiteResponseStore()
+                except Exception as e:
+                    logger.warning(f"Persistent LLM cache disabled: {e}")
+                _prompt_cache = SemanticLLMCache(distance_threshold=PROMPT_SEMANTIC_THRESHOLD)
+    return _prompt_cache, _response_store
+
+
+def register_prompt_templates(templates: Iterable[str]):
+    """Keep prompts built from these str.format templates out of the semantic tier"""
+    global _template_prefixes
+    prefixes = {next(string.Formatter().parse(template), ('',))[0] for template in templates}
+    _template_prefixes = tuple(prefix for prefix in prefixes if prefix.strip())
+
+
+def purge_expired_llm_cache() -> int:
+    """Delete expired prompt cache rows and response files (run periodically by the app)"""
+    _, store = _get_caches()
+    purged = store.purge_expired() if store is not None else 0
+    return purged + ResponseCache().purge_expired()
+
+
+def cached_llm(func):
+    """
+    Cache an LLMProvider.generate_text(prompt, max_tokens) coroutine.
+    Checks the exact and semantic in-memory tiers, then SQLite, then calls the model and
+    writes the serialized response back to every tier. Concurrent calls with the same key
+    share one lookup/model call.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, prompt: str, max_tokens: int = 1000, *args, **kwargs):
+        scope = (type(self).__name__, getattr(self, 'model_name', getattr(self, 'deployment_name', '')), max_tokens,
+                 tuple(kwargs.get('stop') or ()))
+        messages = [{"role": "user", "content": prompt}]
+        key = SemanticLLMCache._exact_key(messages, scope)
+
+        while True:
+            pending = _inflight.get(key)
+            if pending is None:
+                break
+            response = await asyncio.shield(pending)
+            if response is not _LEADER_CANCELLED:
+                return response
+            # The call we were waiting on was cancelled: one of the waiters takes over
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            response = await _cached_call(self, prompt, max_tokens, args, kwargs, messages, scope, key)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not reported again at shutdown
+            future.exception()
+            raise
+        except BaseException:
+            # Our own cancellation is not the waiters' result: wake them to redo the call
+            _inflight.pop(key, None)
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            if _inflight.get(key) is future:
+                del _inflight[key]
+
+    async def _cached_call(self, prompt, max_tokens, args, kwargs, messages, scope, key):
+        """Cache lookup, model call and write-back for one key"""
+        semantic = len(prompt) <= PROMPT_SEMANTIC_MAX_CHARS and not prompt.startswith(_template_prefixes)
+        memory, store = _get_caches()
+
+        def lookup() -> Optional[str]:
+            cached = memory.get(messages, scope, semantic=semantic)
+            if cached is None and store is not None:
+                cached = store.get(key)
+                if cached is not None:
+                    memory.put(messages, cached, scope, semantic=semantic)
+            return cached
+
+        def write_back(value: str):
+            memory.put(messages, value, scope, semantic=semantic)
+            if store is not None:
+                store.put(key, value)
+
+        try:
+            cached = await asyncio.to_thread(lookup)
+            if cached is not None:
+                response_type = func.__annotations__.get('return')
+                if hasattr(response_type, 'model_validate_json'):
+                    return response_type.model_validate_json(cached)
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+
+        response = await func(self, prompt, max_tokens, *args, **kwargs)
+
+        validate = reply_validator.get()
+        if validate is not None and not validate(response.content):
+            return response
+        try:
+            await asyncio.to_thread(write_back, response.model_dump_json())
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+        return response
+
+    return wrapper
+
+
+# Slots that identify who a templated response was written for; the remaining slots
+# are document text, keyed by a hash of their full values
+TEMPLATE_AUDIENCE_SLOTS = ("persona", "job")
+
+
+class TemplateResponseCache:
+    """
+    Variation-aware cache for registered prompt templates.
+    Responses are kept per template with the slot values that produced them, so a
+    request for the same document and persona but a different job can reuse an
+    earlier response as the starting point for a short rewrite.
+    """
+
+    def __init__(self, max_per_template: int = 256):
+        self.max_per_template = max_per_template
+        # template_id -> OrderedDict[slot hash, (audience, content key, response)]
+        self._entries: Dict[str, "OrderedDict[str, Tuple[Tuple, str, str]]"] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(slots: Dict[str, Any]) -> Tuple[str, Tuple, str]:
+        """(exact slot hash, audience values, document content key)"""
+        exact = hashlib.sha256(_dumps_sorted(slots)).hexdigest()
+        audience = tuple(slots.get(name) for name in TEMPLATE_AUDIENCE_SLOTS)
+        content = {name: value for name, value in slots.items() if name not in TEMPLATE_AUDIENCE_SLOTS}
+        return exact, audience, hashlib.sha256(_dumps_sorted(content)).hexdigest()
+
+    def lookup(self, template_id: str, slots: Dict[str, Any]) -> Tuple[Optional[str], Optional[Tuple[Dict[str, Any], str]]]:
+        """
+        Returns (exact response, near match). A near match is ({slot: cached value} for the
+        audience slots, response) from the same template, document and persona with a different job.
+        """
+        exact_key, audience, content_key = self._keys(slots)
+        with self._lock:
+            entries = self._entries.get(template_id)
+            if not entries:
+                return None, None
+            if exact_key in entries:
+                entries.move_to_end(exact_key)
+                return entries[exact_key][2], None
+            if audience[0] is None:
+                return None, None
+            for cached_audience, cached_content_key, response in reversed(entries.values()):
+                if cached_content_key == content_key and cached_audience[0] == audience[0]:
+                    return None, (dict(zip(TEMPLATE_AUDIENCE_SLOTS, cached_audience)), response)
+        return None, None
+
+    def store(self, template_id: str, slots: Dict[str, Any], response: str):
+        """Remember the response produced for these slot values"""
+        if not response:
+            return
+        exact_key, audience, content_key = self._keys(slots)
+        with self._lock:
+            entries = self._entries.setdefault(template_id, OrderedDict())
+            entries[exact_key] = (audience, content_key, response)
+            entries.move_to_end(exact_key)
+            while len(entries) > self.max_per_template:
+                entries.popitem(last=False)
@@ -1,22 +1,1062 @@
 """
 Enhanced LLM Provider for Adobe Hackathon - Integrates provided chat_with_llm.py
 Supports multiple LLM providers: Gemini, Azure OpenAI, OpenAI, Ollama
+
+All provider calls are async; run the app on uvloop (run_app.py selects it when installed,
+or `uvicorn --loop uvloop`) so concurrent snippet/connection calls are cheap to schedule.
 """
 
 import os
 import json
+import re
+import mmap
+import time
+import random
+import datetime
 import asyncio
+import hashlib
+import functools
+import threading
+import dataclasses
+from collections import OrderedDict
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
-import openai
-import requests
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Any
 from pydantic import BaseModel
-from .chat_with_llm import get_llm_response
+from .llm_cache import cached_llm, reply_validator, register_prompt_templates, TemplateResponseCache, ResponseCache
+
+# orjson is optional - faster parsing of LLM JSON replies
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# json_repair is optional - recovers replies with trailing commas, truncation, etc.
+try:
+    import json_repair
+    JSON_REPAIR_AVAILABLE = True
+except ImportError:
+    JSON_REPAIR_AVAILABLE = False
+
+def _json_loads(data):
+    """Parse JSON text or bytes (orjson when installed)"""
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+
+def _json_dumps(value) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson when installed)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
 
+
+# Provider SDKs are imported by the provider that uses them, so importing this module
+# (and starting the app) only pays for the configured provider. None = not imported yet,
+# False = import failed.
 # Lazy imports for google.generativeai to avoid version conflicts
 genai = None
 vertexai = None
 GenerativeModel = None
+openai = None
+requests = None
+aiohttp = None
+ollama = None
+
+
+# Prompt templates for every provider prompt, built once at import and filled with
+# str.format (named slots; literal braces are doubled)
+PROMPT_TEMPLATES = {
+    "comprehensive_insights": """
+        You are an advanced AI document analyzer. Analyze this document content and provide exactly 4 comprehensive insights.
+        
+        Document: {document_name}
+        Current Page: {current_page}
+        
+        Content: {content}
+        
+        Generate insights across these categories:
+        1. "key-insight": Most critical takeaway from the document analysis
+        2. "did-you-know": Surprising fact or pattern discovered in the content
+        3. "counterpoint": Alternative perspective or limitation revealed
+        4. "connection": How this content connects to broader concepts or themes
+        
+        Requirements:
+        - Each insight should be 1-2 sentences with clear, actionable value
+        - Focus on content that saves reading time and enhances understanding
+        - Be specific to this document and its content
+        - Score relevance (0.1-1.0) based on insight importance
+        
+        Return ONLY valid JSON array:
+        [{{"type": "key-insight", "title": "Analysis Result", "content": "Specific insight from content", "relevance": 0.9}}]
+        """,
+    "insights": """
+        You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
+        
+        Analyze this COMPLETE PDF document and provide exactly 4 insights that demonstrate deep understanding of the entire content.
+        You have access to the full document content, not just one page. Use this comprehensive view to generate superior insights.
+        
+        FULL PDF CONTENT:
+        {content}
+        
+        Generate insights across these categories:
+        1. "key-insight": Most critical takeaway from analyzing the ENTIRE document
+        2. "did-you-know": Surprising insight or connection discovered across multiple pages/sections  
+        3. "counterpoint": Alternative perspective or limitation considering the complete context
+        4. "connection": How different parts of this document relate to each other or external concepts
+        
+        Requirements for {persona} working on {job}:
+        - Analyze patterns across the ENTIRE document, not just individual pages
+        - Each insight should be 1-2 sentences with actionable value
+        - Leverage the complete context to provide deeper understanding
+        - Score relevance (0.1-1.0) based on importance to persona's goals
+        - Focus on insights only possible from seeing the full document
+        
+        Return ONLY valid JSON array:
+        [{{"type": "key-insight", "title": "Document-Wide Insight", "content": "Insight based on complete analysis", "relevance": 0.95}}, ...]
+        """,
+    "section_snippet": """
+            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
+
+            Write one concise, informative snippet (2-4 sentences) explaining how this section relates to the selected text.
+
+            Selected Text: {selected_text}
+
+            Section: {section}
+
+            Respond with a single JSON object:
+            {{"type": "context|insight|connection", "title": "Short Title", "content": "2-4 sentence snippet"}}
+            """,
+    "section_snippet_text": """
+            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
+
+            In 2-4 plain sentences (no JSON, no lists), explain how this section relates to the selected text.
+
+            Selected Text: {selected_text}
+
+            Section: {section}
+            """,
+    "cross_document_connections": """
+            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
+
+            Find cross-document connections for the selected text. Identify related themes, concepts, or information across different documents.
+
+            Selected Text: {selected_text}
+
+            Available Sections from Multiple Documents:
+            {sections}
+
+            Generate exactly 3 cross-document connections in JSON format:
+            [
+                {{"type": "theme", "title": "Common Theme", "content": "Description of shared theme across documents", "documents": ["doc1", "doc2"]}},
+                {{"type": "concept", "title": "Related Concept", "content": "Related concept found in multiple documents", "documents": ["doc1", "doc3"]}},
+                {{"type": "reference", "title": "Cross Reference", "content": "Information that references or builds upon each other", "documents": ["doc2", "doc3"]}}
+            ]
+            """,
+    "cross_document_batch": """
+            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
+
+            For the selected text, identify thematic connections to each of the numbered sections below.
+            Skip sections that have no meaningful connection.
+
+            Selected Text: {selected_text}
+
+            Sections:
+            {sections}
+
+            Return a JSON array with one entry per connected section:
+            [
+                {{"section_id": 0, "type": "theme|concept|reference", "title": "Short Title", "content": "1-2 sentence description of the connection"}}
+            ]
+            """,
+    "insights_from_pdf": """
+            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
+            
+            Analyze this ENTIRE PDF document and provide exactly 4 insights with deep understanding of the complete content.
+            Focus on page {page} but use the entire document context for comprehensive analysis.
+            
+            Generate insights across these categories:
+            1. "key-insight": Most critical takeaway from the complete PDF analysis
+            2. "did-you-know": Surprising insight discovered from the full document context
+            3. "counterpoint": Alternative perspective considering the entire document scope
+            4. "connection": How different parts of this PDF relate to each other or external concepts
+            
+            Requirements for {persona} working on {job}:
+            - Analyze the COMPLETE PDF file, not just text extraction
+            - Leverage visual elements, formatting, and document structure
+            - Each insight should be 1-2 sentences with actionable value
+            - Score relevance (0.1-1.0) based on importance to persona's goals
+            - Focus on insights only possible from analyzing the actual PDF file
+            
+            Return ONLY valid JSON array:
+            [{{"type": "key-insight", "title": "PDF-Based Insight", "content": "Insight from complete PDF analysis", "relevance": 0.95}}]
+            """,
+    "comprehensive_insights_from_pdf": """
+            You are an advanced AI document analyzer. Analyze this COMPLETE PDF document and provide exactly 4 comprehensive insights.
+            Focus primarily on page {page} but use the entire document context for superior analysis.
+            
+            Generate insights across these categories:
+            1. "key-insight": Most critical takeaway from analyzing the complete document
+            2. "did-you-know": Surprising insight or hidden pattern discovered in the content
+            3. "counterpoint": Alternative perspective or limitation revealed by the analysis
+            4. "connection": How different parts of this document relate or connect to broader concepts
+            
+            Requirements:
+            - Analyze the COMPLETE PDF file including visual elements, formatting, and structure
+            - Each insight should be 1-2 sentences with clear value
+            - Focus on insights only possible from seeing the full document
+            - Be specific and actionable
+            - Score relevance (0.1-1.0) based on insight value
+            
+            Return ONLY valid JSON array:
+            [{{"type": "key-insight", "title": "Document Analysis", "content": "Specific insight from complete analysis", "relevance": 0.95}}]
+            """,
+    "openai_insights": """
+        As an AI assistant helping a {persona} with their job: {job}
+        
+        Analyze this content and provide 3-4 insights in JSON format:
+        
+        Content: {content}...
+        
+        Return a JSON array with insights of these types:
+        - key-insight: Main takeaways
+        - did-you-know: Interesting facts  
+        - counterpoint: Alternative perspectives
+        - connection: Links to other concepts
+        
+        Format: [{{"type": "key-insight", "title": "...", "content": "...", "relevance": 0.9}}]
+        """,
+    "ollama_insights": """
+        You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
+        
+        Analyze this PDF content and provide exactly 4 insights that go beyond what's written on the page.
+        Generate insights that help the user understand the content faster and discover connections.
+        
+        PDF Content: {content}...
+        
+        Provide insights in these categories:
+        1. "key-insight": Critical takeaways that save reading time
+        2. "did-you-know": Surprising facts or context that enriches understanding  
+        3. "counterpoint": Alternative perspectives or potential challenges
+        4. "connection": How this relates to other concepts, trends, or documents
+        
+        Requirements:
+        - Each insight should be 1-2 sentences maximum
+        - Focus on what matters most to a {persona}
+        - Make insights actionable and specific
+        - Include relevance score (0.1-1.0) based on importance to the persona
+        
+        Return valid JSON array:
+        [{{"type": "key-insight", "title": "Main Takeaway", "content": "Specific insight in 1-2 sentences", "relevance": 0.95}}, ...]
+        """,
+}
+
+# Reuses a response generated for the same document and persona but a different job
+PROMPT_REWRITE_TEMPLATE = """
+You are an AI assistant for Adobe's PDF Intelligence System.
+
+The JSON below was written for a {persona} working on: {cached_job}
+
+{response}
+
+Rewrite it for a {persona} working on: {job}
+Keep the same JSON structure, number of items and types, adjusting titles, content and relevance to the new task.
+Return ONLY valid JSON.
+"""
+
+_template_cache = TemplateResponseCache()
+register_prompt_templates([*PROMPT_TEMPLATES.values(), PROMPT_REWRITE_TEMPLATE])
+
+
+_http_client = None
+
+
+def _get_http_client():
+    """
+    Process-wide pooled async HTTP client shared by the OpenAI/Azure SDK clients.
+    Uses HTTP/2 when h2 is installed, so concurrent calls multiplex over a few connections.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        import httpx
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (app shutdown)"""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared by all model calls.
+    acquire() admits callers in arrival order, waiting until both buckets have room;
+    the buckets refill continuously at RPM/60 and TPM/60 per second. 0 disables a limit.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        # asyncio.Lock wakes waiters FIFO, so admission is in order
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until a request of this many tokens fits under both limits, then take it"""
+        if not self.rpm and not self.tpm:
+            return
+        if self.tpm:
+            # A single request larger than the whole budget would otherwise wait forever
+            tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency cap that adapts to the provider's rate-limit headers (AIMD): it halves when
+    x-ratelimit-remaining-requests/-tokens drop below low_water of their limit or a call is
+    rate limited, and grows by one after each other successful call. Used as `async with`.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, low_water: float = 0.1):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.low_water = low_water
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            # Waiters re-check the current cap each time a call finishes
+            await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def decrease(self):
+        self.limit = max(self.minimum, self.limit * 0.5)
+
+    def observe(self, headers):
+        """Adjust the cap from a response's headers (no rate-limit headers: keep it constant)"""
+        fractions = []
+        for kind in ('requests', 'tokens'):
+            try:
+                fractions.append(
+                    float(headers.get(f'x-ratelimit-remaining-{kind}')) / float(headers.get(f'x-ratelimit-limit-{kind}'))
+                )
+            except (TypeError, ValueError, ZeroDivisionError):
+                continue
+        if not fractions:
+            return
+        if min(fractions) < self.low_water:
+            self.decrease()
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+
+
+async def _admit(model: str, prompt: str, max_tokens: int):
+    """Take a request and its prompt + output tokens from the shared rate limiter"""
+    if LLMProvider._limiter.rpm or LLMProvider._limiter.tpm:
+        await LLMProvider._limiter.acquire(_count_tokens(prompt, model) + max_tokens)
+
+
+async def _stream_chat(client, model: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+    """Stream a chat completion from an AsyncOpenAI/AsyncAzureOpenAI client as text deltas"""
+    await _admit(model, prompt, max_tokens)
+    async with LLMProvider._sem:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    CLOSED -> OPEN after failure_threshold consecutive provider failures (5xx, 429, timeouts).
+    OPEN rejects calls for cooldown_s, then HALF_OPEN lets one probe through: success
+    closes the circuit again, failure reopens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown_s:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release_probe(self):
+        """The call let through ended without an outcome (e.g. cancelled): allow another probe"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failure_count += 1
+        if self.state == self.HALF_OPEN or self.failure_count >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+# Retries per call and breaker settings for provider failures
+LLM_RETRY_ATTEMPTS = int(os.getenv('LLM_RETRY_ATTEMPTS', '3'))
+LLM_RETRY_MAX_DELAY = 30.0
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+
+
+def _error_status(e: BaseException) -> Optional[int]:
+    """HTTP status behind a provider error (the SDK error is chained as __cause__)"""
+    while e is not None:
+        for attr in ('status_code', 'status', 'code'):
+            status = getattr(e, attr, None)
+            if isinstance(status, int):
+                return status
+        response = getattr(e, 'response', None)
+        if isinstance(getattr(response, 'status_code', None), int):
+            return response.status_code
+        e = e.__cause__
+    return None
+
+
+def _is_transient(e: BaseException) -> bool:
+    """Timeouts, rate limits and server errors are worth retrying and count against the breaker"""
+    cause = e
+    while cause is not None:
+        if isinstance(cause, (TimeoutError, asyncio.TimeoutError)):
+            return True
+        cause = cause.__cause__
+    status = _error_status(e)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header on a rate-limited response, if present"""
+    while e is not None:
+        headers = getattr(getattr(e, 'response', None), 'headers', None)
+        if headers is not None:
+            try:
+                return float(headers.get('retry-after'))
+            except (TypeError, ValueError):
+                pass
+        e = e.__cause__
+    return None
+
+
+def _resilient(func):
+    """
+    Retry transient provider failures with exponential backoff + jitter (honouring Retry-After)
+    behind a per-provider circuit breaker, so an outage fails fast instead of hanging requests.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        breaker = self.__dict__.get('_breaker')
+        if breaker is None:
+            breaker = self.__dict__.setdefault('_breaker', CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN))
+
+        for attempt in range(LLM_RETRY_ATTEMPTS):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{type(self).__name__} is unavailable (circuit open), try again later")
+            try:
+                result = await func(self, *args, **kwargs)
+            except Exception as e:
+                if not _is_transient(e):
+                    # The provider answered; the request itself was bad
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt == LLM_RETRY_ATTEMPTS - 1 or breaker.state == CircuitBreaker.OPEN:
+                    raise
+                delay = _retry_after(e) or (2 ** attempt + random.random())
+                await asyncio.sleep(min(delay, LLM_RETRY_MAX_DELAY))
+            except BaseException:
+                # Cancelled mid-call: no outcome to record, but a HALF_OPEN probe must not stay taken
+                breaker.release_probe()
+                raise
+            else:
+                breaker.record_success()
+                return result
+    return wrapper
+
+
+def _concurrency_limited(func):
+    """
+    Run a provider's generate_text under the shared rate limits and concurrency limit
+    (or the provider's own _concurrency controller when it has one)
+    """
+    @functools.wraps(func)
+    async def wrapper(self, prompt: str, max_tokens: int = 1000, *args, **kwargs):
+        # Wait for rate-limit room before taking a concurrency slot
+        await _admit(getattr(self, 'model_name', None) or getattr(self, 'deployment_name', ''), prompt, max_tokens)
+        async with getattr(self, '_concurrency', LLMProvider._sem):
+            return await func(self, prompt, max_tokens, *args, **kwargs)
+    return wrapper
+
+
+# Lifetime of the server-side context cache holding a PDF for repeated insight prompts
+PDF_CONTEXT_CACHE_TTL = int(os.getenv('PDF_CONTEXT_CACHE_TTL', '3600'))
+# PDF versions with a live context cache; the least recently used one is deleted server-side past this
+PDF_CONTEXT_CACHE_MAX = max(1, int(os.getenv('PDF_CONTEXT_CACHE_MAX', '32')))
+
+# PDFs at least this large are mapped instead of read and are not kept in the bytes cache
+PDF_MMAP_MIN_BYTES = 16 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=16)
+def _read_pdf(path: str, mtime_ns: int) -> bytes:
+    """PDF file contents, keyed by modification time so edits invalidate the entry"""
+    return Path(path).read_bytes()
+
+
+def _load_pdf(path) -> bytes:
+    """PDF bytes for a multimodal request; large files come straight from an mmap"""
+    stat = os.stat(path)
+    if stat.st_size < PDF_MMAP_MIN_BYTES:
+        return _read_pdf(str(path), stat.st_mtime_ns)
+
+    # One copy out of the page cache, without buffered reads or pinning the file in the LRU
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return bytes(mm)
+
+
+# First JSON array/object span in a reply (skips markdown fences and surrounding prose)
+_JSON_SPAN_RE = re.compile(r'\[.*\]|\{.*\}', re.DOTALL)
+
+
+def _extract_json(text: str) -> Any:
+    """Parse the JSON embedded in an LLM reply; raises ValueError when there is none"""
+    match = _JSON_SPAN_RE.search(text or "")
+    if not match:
+        raise ValueError("No JSON found in LLM response")
+
+    span = match.group(0)
+    try:
+        return _json_loads(span)
+    except ValueError:
+        if not JSON_REPAIR_AVAILABLE:
+            raise
+        return json_repair.loads(span)
+
+
+# Document content budgets (tokens) for the insight prompts, about the previous 10k/8k characters
+INSIGHTS_CONTENT_TOKENS = 2500
+COMPREHENSIVE_CONTENT_TOKENS = 2000
+
+
+@functools.lru_cache(maxsize=8)
+def _enc(model: str):
+    """tiktoken encoder for a model (loaded on first trim), or None without tiktoken or its BPE file"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        if 'gpt' in model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # The BPE file is downloaded on first use; offline this fails and we fall back to estimates
+        print(f"⚠️ tiktoken encoding unavailable for {model}, estimating token counts: {e}")
+        return None
+
+
+def _count_tokens(text: str, model: str) -> int:
+    """Token count for text (~4 characters per token without tiktoken)"""
+    enc = _enc(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _trim(text: str, model: str, max_toks: int) -> str:
+    """Cut text to max_toks tokens on a token boundary, marking it with '...' when trimmed"""
+    enc = _enc(model)
+    if enc is None:
+        # ~4 characters per token
+        max_chars = max_toks * 4
+        return text if len(text) <= max_chars else text[:max_chars] + '...'
+
+    ids = enc.encode(text, disallowed_special=())
+    if len(ids) <= max_toks:
+        return text
+    return enc.decode(ids[:max_toks]) + '...'
+
+
+# Context window (tokens) per model name prefix; unknown models get the conservative default
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-35-turbo": 16385,
+    "gpt-3.5-turbo": 16385,
+    "gemini": 1000000,
+    "llama3": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+# Trailing prompt tokens kept when a prompt is cut (the output instructions live at the end)
+PROMPT_TAIL_TOKENS = 400
+
+
+def _model_ctx(model: str) -> int:
+    """Context window for a model name"""
+    for prefix, tokens in MODEL_CONTEXT_TOKENS.items():
+        if model.startswith(prefix):
+            return tokens
+    return DEFAULT_CONTEXT_TOKENS
+
+
+def _fit_prompt(prompt: str, model: str, max_tokens: int) -> str:
+    """Shorten a prompt that would overflow the model context, keeping its head and instructions"""
+    budget = _model_ctx(model) - max_tokens - 128
+    enc = _enc(model)
+    if enc is None:
+        # ~4 characters per token
+        if len(prompt) <= budget * 4:
+            return prompt
+        tail = PROMPT_TAIL_TOKENS * 4
+        return prompt[:max(budget * 4 - tail, 0)] + "\n...\n" + prompt[-tail:]
+
+    ids = enc.encode(prompt, disallowed_special=())
+    if len(ids) <= budget:
+        return prompt
+    print(f"⚠️ Prompt of {len(ids)} tokens exceeds the {model} budget of {budget}, trimming")
+    head = max(budget - PROMPT_TAIL_TOKENS, 0)
+    return enc.decode(ids[:head]) + "\n...\n" + enc.decode(ids[-PROMPT_TAIL_TOKENS:])
+
+
+def _within_context(func):
+    """Trim oversize prompts before generate_text sends them instead of paying for a failed call"""
+    @functools.wraps(func)
+    async def wrapper(self, prompt: str, max_tokens: int = 1000, *args, **kwargs):
+        model = getattr(self, 'model_name', None) or getattr(self, 'deployment_name', '')
+        return await func(self, _fit_prompt(prompt, model, max_tokens), max_tokens, *args, **kwargs)
+    return wrapper
+
+
+# Output cap and stop sequences for the short JSON-array prompts (3-4 items of ~80 tokens)
+JSON_ARRAY_MAX_TOKENS = 600
+JSON_ARRAY_STOP = ["\n\n\n", "```\n\n"]
+
+
+class _ArrayEndScanner:
+    """Watches streamed text and reports when a top-level JSON array has closed"""
+
+    # Characters allowed before the array starts (whitespace and a ```json fence)
+    _PREFIX_CHARS = frozenset(' \t\r\n`json')
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.done = False
+
+    def feed(self, chunk: str) -> bool:
+        """True once the array that opened the reply is complete"""
+        if self.done:
+            return False
+        for ch in chunk:
+            if not self.started:
+                if ch == '[':
+                    self.started = True
+                    self.depth = 1
+                elif ch not in self._PREFIX_CHARS:
+                    # Not a JSON array reply, keep streaming to the end
+                    self.done = True
+                    return False
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '[{':
+                self.depth += 1
+            elif ch in ']}':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    return True
+        return False
+
+
+# Related sections turned into snippets (one model call each) and the reply budget per call
+SNIPPET_MAX_SECTIONS = 5
+SNIPPET_MAX_TOKENS = 200
+
+# Streamed snippet text is flushed at a sentence end, or once this many words have built up
+_SENTENCE_END_RE = re.compile(r'[.?!]["\')\]]?\s*$')
+SNIPPET_FLUSH_WORDS = 80
+# Streamed snippet pieces buffered between the model streams and the response
+SNIPPET_STREAM_QUEUE = 16
+
+# Section text packed into one cross-document prompt; more sections are split over parallel calls
+CROSS_DOC_BATCH_TOKENS = 3000
+CROSS_DOC_SECTION_CHARS = 300
+
+# Sections sent to the LLM for cross-document connections after local pre-ranking
+CROSS_DOC_TOP_SECTIONS = 3
+
+# Sections kept for the batched cross-document prompt after embedding shortlisting
+CROSS_DOC_SHORTLIST = 20
+
+# Persisted section embeddings (content SHA-256 -> normalized MiniLM vector)
+SECTION_EMBEDDINGS_PATH = Path(__file__).resolve().parent.parent / "data" / "section_embeddings.npz"
+SECTION_EMBED_BATCH = 64
+
+
+class SectionEmbeddingIndex:
+    """
+    Section embeddings keyed by content SHA-256 and saved to disk, so sections embedded at
+    ingest time are not re-embedded per query; a query costs one embedding plus a dot product.
+    The app can plug in its own encoders (use_encoders) whose vectors are already persisted
+    elsewhere; the index then only keeps them in memory and never writes its own file.
+    """
+
+    def __init__(self, path: Path = SECTION_EMBEDDINGS_PATH, max_entries: int = 50000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._encode_texts: Optional[Callable[[List[str]], Any]] = None
+        self._encode_query: Optional[Callable[[str], Any]] = None
+
+    def use_encoders(self, encode_texts: Callable[[List[str]], Any], encode_query: Callable[[str], Any]):
+        """
+        Embed with the app's encoders: encode_texts(texts) -> (n, dim) unit-norm matrix backed by its
+        own persistent cache, encode_query(text) -> unit-norm vector
+        """
+        self._encode_texts = encode_texts
+        self._encode_query = encode_query
+        self._loaded = True  # vectors come from the encoder's cache, not this index's file
+
+    def _embed(self, texts: List[str]):
+        if self._encode_texts is not None:
+            return self._encode_texts(texts)
+        from .embedding_service import get_embedding_service
+        return get_embedding_service().generate_embeddings_batch(
+            texts, batch_size=SECTION_EMBED_BATCH, show_progress=False
+        )
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8', 'ignore')).hexdigest()
+
+    def _load(self, np):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with np.load(self.path) as data:
+                for key, vector in zip(data['keys'], data['vectors']):
+                    self._vectors[str(key)] = vector
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def vectors(self, texts: List[str]):
+        """Embedding matrix for texts (one row each), embedding only unseen texts in batches"""
+        import numpy as np
+
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            self._load(np)
+            missing = list({key: i for i, key in enumerate(keys) if key not in self._vectors}.values())
+        if missing:
+            vectors = self._embed([texts[i] for i in missing])
+            with self._lock:
+                for i, vector in zip(missing, vectors):
+                    self._vectors[keys[i]] = np.asarray(vector, dtype='float32')
+                while len(self._vectors) > self.max_entries:
+                    self._vectors.popitem(last=False)
+                self._dirty = self._encode_texts is None
+
+        with self._lock:
+            rows = [self._vectors.get(key) for key in keys]
+        if any(row is None for row in rows):
+            # Evicted by a concurrent insert; embed those again without caching
+            evicted = [i for i, row in enumerate(rows) if row is None]
+            for i, vector in zip(evicted, self._embed([texts[i] for i in evicted])):
+                rows[i] = np.asarray(vector, dtype='float32')
+        return np.stack(rows)
+
+    def add_many(self, texts: List[str]):
+        """Embed texts ahead of queries (ingest time) and persist the index (unless app encoders are used)"""
+        if texts:
+            self.vectors(texts)
+            self.save()
+
+    def save(self):
+        """Write the index atomically if it changed"""
+        import numpy as np
+        with self._lock:
+            if not self._dirty or not self._vectors:
+                return
+            keys = np.array(list(self._vectors.keys()))
+            matrix = np.stack(list(self._vectors.values()))
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.stem + '.tmp.npz')
+            np.savez(tmp_path, keys=keys, vectors=matrix)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save section embeddings: {e}")
+
+    def search(self, query: str, texts: List[str], top_k: int) -> List[int]:
+        """Indexes of the top_k texts by cosine similarity to query, in their original order"""
+        import numpy as np
+
+        matrix = self.vectors(texts)
+        # Embeddings are L2-normalized, so the dot product is the cosine similarity
+        if self._encode_query is not None:
+            q = np.asarray(self._encode_query(query), dtype='float32').ravel()
+        else:
+            from .embedding_service import get_embedding_service
+            q = np.asarray(get_embedding_service().generate_embedding(query), dtype='float32')
+        scores = matrix @ q
+        return sorted(np.argsort(-scores)[:top_k].tolist())
+
+
+section_index = SectionEmbeddingIndex()
+
+
+def _rank_sections(selected_text: str, sections: List[Dict], top_k: int) -> List[int]:
+    """
+    Indexes of the top_k sections by similarity to the selection, in their original order
+    (so sections from one document stay together). Falls back to all sections
+    when the embedding model is unavailable.
+    """
+    if len(sections) <= top_k:
+        return list(range(len(sections)))
+
+    try:
+        return section_index.search(selected_text, [section.get('content', '') for section in sections], top_k)
+    except Exception as e:
+        print(f"⚠️ Section pre-ranking unavailable: {e}")
+        return list(range(len(sections)))
+
+
+def _usage_dict(usage) -> Optional[Dict[str, Any]]:
+    """OpenAI usage object as a plain dict"""
+    return usage.model_dump() if usage is not None else None
+
+
+_response_cache = ResponseCache()
+
+
+def _result_key(provider, kind: str, selected_text: str, sections: List[Dict], persona: str, job: str) -> str:
+    """ResponseCache key for a provider method result"""
+    return ResponseCache.key(
+        kind=kind, provider=type(provider).__name__,
+        model=getattr(provider, 'model_name', None) or getattr(provider, 'deployment_name', None),
+        text=selected_text, sections=sections, persona=persona, job=job
+    )
+
+
+class UncachedResult(Exception):
+    """Raised inside a _cached computation to return a fallback or partial result without storing it"""
+
+    def __init__(self, result: Any):
+        super().__init__("result not cacheable")
+        self.result = result
+
+
+def _parses_as_json(text: str) -> bool:
+    try:
+        _extract_json(text)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _result_cached(kind: str, item_type):
+    """
+    Memoize a (selected_text, sections, persona, job) provider method on disk via LLMProvider._cached.
+    The method returns plain dicts (as parsed from the model); callers get item_type instances.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, selected_text, sections, persona, job):
+            key = _result_key(self, kind, selected_text, sections, persona, job)
+            items = await self._cached(key, lambda: func(self, selected_text, sections, persona, job))
+            return [item_type.from_dict(item) for item in items if isinstance(item, dict)]
+        return wrapper
+    return decorator
+
+
+def _parse_connections(results: List[Any], all_sections: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    Merge the per-section verdict arrays returned for each cross-document chunk.
+    Raises UncachedResult with the partial list when any chunk failed or did not parse.
+    """
+    connections = []
+    complete = True
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error finding cross-document connections: {result}")
+            complete = False
+            continue
+        try:
+            verdicts = _extract_json(result)
+        except ValueError:
+            complete = False
+            continue
+        for verdict in verdicts if isinstance(verdicts, list) else []:
+            if not isinstance(verdict, dict):
+                continue
+            section_id = verdict.get('section_id')
+            if isinstance(section_id, int) and 0 <= section_id < len(all_sections):
+                verdict.setdefault('documents', [all_sections[section_id].get('document_name', 'Unknown')])
+            connections.append(verdict)
+    if not complete:
+        raise UncachedResult(connections)
+    return connections
+
+
+# Batch job polling: first wait and cap for the exponential backoff (seconds)
+BATCH_POLL_INITIAL = 5
+BATCH_POLL_MAX = 300
+
+
+async def _openai_batch(client, endpoint: str, model: str, prompts: Dict[str, str], max_tokens: int) -> Dict[str, str]:
+    """
+    Run chat prompts through the OpenAI/Azure Batch API and return reply text by custom_id.
+    Uploads the requests as JSONL, polls the batch with exponential backoff until it finishes
+    and reads the output file. Requests that failed inside the batch are left out.
+    """
+    lines = [
+        _json_dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": endpoint,
+            "body": {"model": model, "messages": [{"role": "user", "content": prompt}], "max_tokens": max_tokens}
+        })
+        for custom_id, prompt in prompts.items()
+    ]
+    input_file = await client.files.create(file=("batch.jsonl", b"\n".join(lines)), purpose="batch")
+    batch = await client.batches.create(input_file_id=input_file.id, endpoint=endpoint, completion_window="24h")
+
+    delay = BATCH_POLL_INITIAL
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, BATCH_POLL_MAX)
+        batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+
+    output = await client.files.content(batch.output_file_id)
+    replies = {}
+    for line in output.content.splitlines():
+        if not line.strip():
+            continue
+        row = _json_loads(line)
+        body = (row.get("response") or {}).get("body") or {}
+        if body.get("choices"):
+            replies[row["custom_id"]] = body["choices"][0]["message"]["content"] or ""
+    return replies
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class Snippet:
+    type: str
+    title: str
+    content: str
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Snippet":
+        return cls(str(data.get('type', 'context')), str(data.get('title', '')), str(data.get('content', '')))
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class Connection(Snippet):
+    documents: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Connection":
+        documents = data.get('documents') or ()
+        return cls(
+            str(data.get('type', 'theme')), str(data.get('title', '')), str(data.get('content', '')),
+            tuple(str(d) for d in (documents if isinstance(documents, (list, tuple)) else [documents]))
+        )
 
 
 class LLMResponse(BaseModel):
@@ -28,35 +1068,261 @@ class LLMResponse(BaseModel):
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
 
+    # Max model calls in flight across all providers (cache hits do not take a slot)
+    _sem = asyncio.Semaphore(int(os.getenv('LLM_MAX_CONCURRENCY', '16')))
+    # Provider quota: LLM_RPM requests and LLM_TPM tokens per minute (unset = unlimited)
+    _limiter = RateLimiter(int(os.getenv('LLM_RPM', '0')), int(os.getenv('LLM_TPM', '0')))
+
     @abstractmethod
-    async def generate_text(self, prompt: str, max_tokens: int = 1000) -> LLMResponse:
+    async def generate_text(self, prompt: str, max_tokens: int = 1000, stop: Optional[List[str]] = None) -> LLMResponse:
         pass
 
     @abstractmethod
     async def generate_insights(self, content: str, persona: str, job: str) -> List[Dict[str, Any]]:
         pass
 
-    @abstractmethod
-    async def generate_snippets(self, selected_text: str, related_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Generate 2-4 sentence snippets from related sections"""
+    @_result_cached("snippets", Snippet)
+    async def generate_snippets(self, selected_text: str, related_sections: List[Dict], persona: str, job: str) -> List[Snippet]:
+        """Generate 2-4 sentence snippets from related sections, one concurrent call per section"""
+        # Concurrency is bounded by the shared semaphore around generate_text
+        results = await asyncio.gather(
+            *[self._snippet_for(selected_text, section, persona, job) for section in related_sections[:SNIPPET_MAX_SECTIONS]],
+            return_exceptions=True
+        )
+
+        snippets = []
+        failed = False
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error generating snippet: {result}")
+                failed = True
+            elif result:
+                snippets.append(result)
+        if failed:
+            raise UncachedResult(snippets)
+        return snippets
+
+    async def _snippet_for(self, selected_text: str, section: Dict, persona: str, job: str) -> Optional[Dict[str, Any]]:
+        """Snippet for a single related section (providers may override)"""
+        response_text = await self._generate_templated(
+            "section_snippet",
+            {"persona": persona, "job": job, "selected_text": selected_text, "section": section.get('content', '')[:500]},
+            SNIPPET_MAX_TOKENS
+        )
+        try:
+            snippet = _extract_json(response_text)
+        except ValueError:
+            # Plain-text reply: keep it as the snippet body
+            return {"type": "context", "title": section.get('title') or "Context", "content": response_text.strip()}
+        if isinstance(snippet, list):
+            snippet = snippet[0] if snippet else None
+        return snippet if isinstance(snippet, dict) else None
+
+    async def stream_text(self, prompt: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        """Yield the reply in chunks as it is generated (providers without streaming yield it whole)"""
+        response = await self.generate_text(prompt, max_tokens)
+        yield response.content
+
+    async def stream_snippets(self, selected_text: str, related_sections: List[Dict], persona: str, job: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream snippet text for the related sections as sentences complete.
+        Sections are generated concurrently; each yielded item carries the index of its section.
+        """
+        # Bounded: when the client reads slowly, producers block on put() and stop pulling from the model
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SNIPPET_STREAM_QUEUE)
+        sections = related_sections[:SNIPPET_MAX_SECTIONS]
+
+        async def produce(index: int, section: Dict):
+            prompt = PROMPT_TEMPLATES["section_snippet_text"].format(
+                persona=persona, job=job, selected_text=selected_text, section=section.get('content', '')[:500]
+            )
+            buf = ""
+            try:
+                async for chunk in self.stream_text(prompt, SNIPPET_MAX_TOKENS):
+                    buf += chunk
+                    if _SENTENCE_END_RE.search(buf) or len(buf.split()) > SNIPPET_FLUSH_WORDS:
+                        await queue.put({"type": "insight", "section": index, "content": buf.strip()})
+                        buf = ""
+                if buf.strip():
+                    await queue.put({"type": "insight", "section": index, "content": buf.strip()})
+            except Exception as e:
+                print(f"Error streaming snippet: {e}")
+            # Not in a finally: a cancelled producer must not block on a full queue nobody reads
+            await queue.put(None)
+
+        tasks = [asyncio.create_task(produce(i, section)) for i, section in enumerate(sections)]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is None:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            # Client went away mid-stream: stop the outstanding model calls (and their token spend)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @_result_cached("connections", Connection)
+    async def find_cross_document_connections(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Connection]:
+        """
+        Find semantically related sections across documents.
+        The CROSS_DOC_SHORTLIST sections closest to the selection go into one prompt asking
+        for per-section verdicts; when they exceed
+        CROSS_DOC_BATCH_TOKENS they are split into chunks that are sent concurrently.
+        """
+        # Only the closest sections (precomputed embeddings) go to the LLM
+        shortlist = [all_sections[i] for i in await asyncio.to_thread(
+            _rank_sections, selected_text, all_sections, CROSS_DOC_SHORTLIST
+        )]
+        results = await asyncio.gather(*[
+            self._generate_templated("cross_document_batch", slots, JSON_ARRAY_MAX_TOKENS,
+                                     stop=JSON_ARRAY_STOP, json_reply=True)
+            for slots in self._connection_batches(selected_text, shortlist, persona, job)
+        ], return_exceptions=True)
+        return _parse_connections(results, shortlist)
+
+    def _connection_batches(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Dict[str, str]]:
+        """Template slots for each token-budgeted chunk of numbered sections"""
+        model = getattr(self, 'model_name', None) or getattr(self, 'deployment_name', '')
+
+        batches, batch, batch_tokens = [], [], 0
+        for section_id, section in enumerate(all_sections):
+            entry = (f"[{section_id}] Document: {section.get('document_name', 'Unknown')}\n"
+                     f"{section.get('content', '')[:CROSS_DOC_SECTION_CHARS]}")
+            tokens = _count_tokens(entry, model)
+            if batch and batch_tokens + tokens > CROSS_DOC_BATCH_TOKENS:
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(entry)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+
+        return [
+            {"persona": persona, "job": job, "selected_text": selected_text, "sections": "\n\n".join(entries)}
+            for entries in batches
+        ]
+
+    # Chat-completions path for the provider's Batch API, or None to run bulk passes in-process
+    _batch_endpoint: Optional[str] = None
+
+    async def find_cross_document_connections_bulk(self, pairs: List[Tuple[str, List[Dict], str, str]]) -> List[List[Connection]]:
+        """
+        Cross-document connections for many (selected_text, sections, persona, job) pairs, for
+        background passes where latency does not matter. Providers with a Batch API submit every
+        prompt as one batch job (cheaper, separate rate limits); others run the calls concurrently.
+        Results are stored in the response cache, so later interactive calls for a pair are hits.
+        """
+        if self._batch_endpoint is None:
+            return await asyncio.gather(*[self.find_cross_document_connections(*pair) for pair in pairs])
+
+        prompts, chunk_counts = {}, []
+        for pair_id, (selected_text, sections, persona, job) in enumerate(pairs):
+            batches = self._connection_batches(selected_text, sections, persona, job)
+            chunk_counts.append(len(batches))
+            for chunk_id, slots in enumerate(batches):
+                prompts[f"{pair_id}-{chunk_id}"] = PROMPT_TEMPLATES["cross_document_batch"].format(**slots)
+
+        replies = await _openai_batch(
+            self._client, self._batch_endpoint,
+            getattr(self, 'model_name', None) or getattr(self, 'deployment_name', ''),
+            prompts, JSON_ARRAY_MAX_TOKENS
+        )
+
+        all_connections = []
+        for pair_id, (pair, chunk_count) in enumerate(zip(pairs, chunk_counts)):
+            results = [replies.get(f"{pair_id}-{chunk_id}", "") for chunk_id in range(chunk_count)]
+            connections = _parse_connections(results, pair[1])
+            if connections:
+                await asyncio.to_thread(_response_cache.put, _result_key(self, "connections", *pair), connections)
+            all_connections.append([Connection.from_dict(item) for item in connections if isinstance(item, dict)])
+        return all_connections
+
+    async def aclose(self):
+        """Release pooled connections held by the provider (called on app shutdown)"""
         pass
 
-    @abstractmethod
-    async def find_cross_document_connections(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Find semantically related sections across documents"""
+    async def warmup(self):
+        """Open connections / load the model with a minimal request (called on app startup)"""
+        try:
+            await self._warmup()
+            print(f"🔥 {type(self).__name__} warmed up")
+        except Exception as e:
+            print(f"⚠️ {type(self).__name__} warm-up skipped: {e}")
+
+    async def _warmup(self):
         pass
 
+    async def generate_all(self, selected_text: str, content: str, sections: List[Dict], persona: str, job: str) -> Dict[str, List[Any]]:
+        """Generate insights, snippets and cross-document connections concurrently"""
+        results = await asyncio.gather(
+            self.generate_insights(content, persona, job),
+            self.generate_snippets(selected_text, sections, persona, job),
+            self.find_cross_document_connections(selected_text, sections, persona, job),
+            return_exceptions=True
+        )
 
-class GeminiProvider(LLMProvider):
-    def __init__(self):
-        # Import genai here to avoid module-level import errors
-        global genai, vertexai, GenerativeModel
+        output = {}
+        for name, result in zip(("insights", "snippets", "connections"), results):
+            if isinstance(result, Exception):
+                print(f"Error generating {name}: {result}")
+                result = []
+            output[name] = result
+        return output
+
+    async def _cached(self, key: str, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the on-disk result for key, or await coro_factory() and store what it returns"""
+        cached = await asyncio.to_thread(_response_cache.get, key)
+        if cached is not None:
+            return cached
         try:
-            import google.generativeai as genai
-        except ImportError:
-            print("⚠️ google-generativeai not available")
-            genai = None
-        
+            result = await coro_factory()
+        except UncachedResult as e:
+            return e.result
+        if result:
+            await asyncio.to_thread(_response_cache.put, key, result)
+        return result
+
+    async def _generate_templated(self, template_id: str, slots: Dict[str, Any], max_tokens: int,
+                                  stop: Optional[List[str]] = None, json_reply: bool = False) -> str:
+        """
+        Fill a registered prompt template, reusing cached responses for matching slots.
+        With json_reply, a reply that does not parse as JSON is returned but not cached.
+        """
+        cached, near = _template_cache.lookup(template_id, slots)
+        if cached is not None:
+            return cached
+
+        if near is not None:
+            # Same document and persona, different job: rewrite instead of regenerating from the document
+            cached_slots, cached_response = near
+            prompt = PROMPT_REWRITE_TEMPLATE.format(
+                persona=slots["persona"], job=slots["job"],
+                cached_job=cached_slots["job"], response=cached_response
+            )
+        else:
+            prompt = PROMPT_TEMPLATES[template_id].format(**slots)
+
+        token = reply_validator.set(_parses_as_json if json_reply else None)
+        try:
+            response = await self.generate_text(prompt, max_tokens, stop=stop)
+        finally:
+            reply_validator.reset(token)
+        if not json_reply or _parses_as_json(response.content):
+            _template_cache.store(template_id, slots, response.content)
+        return response.content
+
+
+class GeminiProvider(LLMProvider):
+    @staticmethod
+    def _load_vertex():
+        """Import vertexai on first use; only needed when service-account credentials are configured"""
+        global vertexai, GenerativeModel
+        if vertexai is not None:
+            return
         try:
             import vertexai as vertex_module
             from vertexai.generative_models import GenerativeModel as GenModel
@@ -64,15 +1330,34 @@ class GeminiProvider(LLMProvider):
             GenerativeModel = GenModel
         except (ImportError, Exception) as e:
             print(f"⚠️ vertexai not available: {e}")
-            vertexai = None
-            GenerativeModel = None
-        
+            vertexai = False
+
+    @staticmethod
+    def _load_genai():
+        """Import google.generativeai on first use (the fallback when Vertex AI is not used)"""
+        global genai
+        if genai is not None:
+            return
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            print("⚠️ google-generativeai not available")
+            genai = False
+
+    def __init__(self):
+        # (path, mtime_ns) -> (model bound to a context cache holding the PDF or None,
+        # the remote CachedContent or None, renew time); LRU-bounded by PDF_CONTEXT_CACHE_MAX
+        self._pdf_caches: "OrderedDict[Tuple[str, int], Tuple[Any, Any, float]]" = OrderedDict()
+        self._cleanup_tasks = set()  # background deletes of evicted remote caches
+
         # Configure Gemini using Vertex AI
         credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
         project_id = os.getenv('GOOGLE_CLOUD_PROJECT', 'your-project-id')
         location = os.getenv('GOOGLE_CLOUD_LOCATION', 'us-central1')
         
         try:
+            if credentials_path:
+                self._load_vertex()
             if credentials_path and vertexai:
                 # Set credentials environment variable
                 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
@@ -89,6 +1374,9 @@ class GeminiProvider(LLMProvider):
         except Exception as e:
             print(f"⚠️ Vertex AI initialization failed, falling back to genai: {e}")
             # Fallback to direct genai configuration
+            self._load_genai()
+            if not genai:
+                raise RuntimeError("google-generativeai not available. Please install it: pip install google-generativeai")
             if credentials_path:
                 with open(credentials_path, 'r') as f:
                     credentials = json.load(f)
@@ -100,66 +1388,130 @@ class GeminiProvider(LLMProvider):
         else:
             self.use_vertex = True
     
-    async def generate_text(self, prompt: str, max_tokens: int = 1000) -> LLMResponse:
+    @cached_llm
+    @_within_context
+    @_resilient
+    @_concurrency_limited
+    async def generate_text(self, prompt: str, max_tokens: int = 1000, stop: Optional[List[str]] = None) -> LLMResponse:
         try:
-            if hasattr(self, 'use_vertex') and self.use_vertex:
-                # Use Vertex AI
-                response = await asyncio.to_thread(
-                    self.model.generate_content,
-                    prompt
-                )
-                return LLMResponse(
-                    content=response.text,
-                    model=self.model_name
-                )
-            else:
-                # Use genai fallback with simple config
-                response = await asyncio.to_thread(
-                    self.model.generate_content,
-                    prompt
-                )
-                return LLMResponse(
-                    content=response.text,
-                    model=self.model_name
-                )
+            generation_config = {"max_output_tokens": max_tokens}
+            if stop:
+                generation_config["stop_sequences"] = stop
+            
+            # Vertex AI and the genai fallback share the native async streaming API; a reply
+            # that is a JSON array is cut off as soon as the array closes
+            responses = await self.model.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                stream=True
+            )
+            parts = []
+            scanner = _ArrayEndScanner()
+            async for chunk in responses:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text (e.g. the final finish-reason chunk)
+                    continue
+                parts.append(text)
+                if scanner.feed(text):
+                    break
+            
+            return LLMResponse(
+                content="".join(parts),
+                model=self.model_name
+            )
         except Exception as e:
-            raise Exception(f"Gemini API error: {str(e)}")
+            raise Exception(f"Gemini API error: {str(e)}") from e
+
+    async def _warmup(self):
+        # One-token reply: pays for auth and the channel setup before the first real request
+        await self.model.generate_content_async("ping", generation_config={"max_output_tokens": 1})
+
+    async def stream_text(self, prompt: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        await _admit(self.model_name, prompt, max_tokens)
+        async with LLMProvider._sem:
+            responses = await self.model.generate_content_async(
+                prompt,
+                generation_config={"max_output_tokens": max_tokens},
+                stream=True
+            )
+            async for chunk in responses:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue
+                if text:
+                    yield text
     
+    async def _pdf_model(self, pdf_path: str, pdf_part) -> Tuple[Any, List[Any]]:
+        """
+        Model and content prefix for prompts about a PDF. The PDF is the large invariant prefix of
+        every page/persona/job prompt for it, so it is put in a Vertex AI context cache once per
+        file version and later prompts send only their instructions. Falls back to sending the
+        PDF inline when caching is unavailable (e.g. the document is under the cache minimum).
+        """
+        try:
+            key = (pdf_path, os.stat(pdf_path).st_mtime_ns)
+        except OSError:
+            return self.model, [pdf_part]
+
+        model, cached, expires_at = self._pdf_caches.get(key, (None, None, 0.0))
+        if time.monotonic() >= expires_at:
+            stale = [cached] if cached is not None else []
+            try:
+                model, cached = await asyncio.to_thread(self._create_pdf_cache, pdf_part)
+            except Exception as e:
+                print(f"⚠️ PDF context cache not used: {e}")
+                model, cached = None, None
+            # Renew a little before the server drops the cache; failures are not retried until then
+            self._pdf_caches[key] = (model, cached, time.monotonic() + PDF_CONTEXT_CACHE_TTL - 60)
+            # Older versions of this file and the least recently used PDFs give up their caches
+            for old_key in [k for k in self._pdf_caches if k[0] == pdf_path and k != key]:
+                stale.append(self._pdf_caches.pop(old_key)[1])
+            while len(self._pdf_caches) > PDF_CONTEXT_CACHE_MAX:
+                stale.append(self._pdf_caches.popitem(last=False)[1][1])
+            stale = [c for c in stale if c is not None]
+            if stale:
+                task = asyncio.create_task(asyncio.to_thread(self._delete_pdf_caches, stale))
+                self._cleanup_tasks.add(task)
+                task.add_done_callback(self._cleanup_tasks.discard)
+        self._pdf_caches.move_to_end(key)
+        return (model, []) if model is not None else (self.model, [pdf_part])
+
+    @staticmethod
+    def _delete_pdf_caches(caches: List[Any]):
+        """Delete evicted context caches server-side (already-expired ones may fail; that is fine)"""
+        for cached in caches:
+            try:
+                cached.delete()
+            except Exception as e:
+                print(f"⚠️ Could not delete PDF context cache: {e}")
+
+    def _create_pdf_cache(self, pdf_part):
+        """Cache the PDF server-side for PDF_CONTEXT_CACHE_TTL; returns (model bound to it, the cache)"""
+        from vertexai.preview import caching
+        from vertexai.preview.generative_models import GenerativeModel as PreviewModel, Content
+
+        cached = caching.CachedContent.create(
+            model_name=self.model_name,
+            contents=[Content(role="user", parts=[pdf_part])],
+            ttl=datetime.timedelta(seconds=PDF_CONTEXT_CACHE_TTL),
+        )
+        return PreviewModel.from_cached_content(cached_content=cached), cached
+
     async def generate_insights_from_pdf(self, pdf_path: str, page: int, persona: str, job: str) -> List[Dict[str, Any]]:
         """Generate insights by sending the actual PDF file to Gemini (multimodal)"""
         try:
             from pathlib import Path
-            import base64
             
             if not Path(pdf_path).exists():
                 raise Exception(f"PDF file not found: {pdf_path}")
             
-            # Read PDF file as base64 for multimodal input
-            with open(pdf_path, "rb") as pdf_file:
-                pdf_data = base64.b64encode(pdf_file.read()).decode('utf-8')
-            
-            prompt = f"""
-            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
-            
-            Analyze this ENTIRE PDF document and provide exactly 4 insights with deep understanding of the complete content.
-            Focus on page {page} but use the entire document context for comprehensive analysis.
-            
-            Generate insights across these categories:
-            1. "key-insight": Most critical takeaway from the complete PDF analysis
-            2. "did-you-know": Surprising insight discovered from the full document context
-            3. "counterpoint": Alternative perspective considering the entire document scope
-            4. "connection": How different parts of this PDF relate to each other or external concepts
-            
-            Requirements for {persona} working on {job}:
-            - Analyze the COMPLETE PDF file, not just text extraction
-            - Leverage visual elements, formatting, and document structure
-            - Each insight should be 1-2 sentences with actionable value
-            - Score relevance (0.1-1.0) based on importance to persona's goals
-            - Focus on insights only possible from analyzing the actual PDF file
+            # Raw PDF bytes for multimodal input (cached until the file changes)
+            pdf_bytes = _load_pdf(pdf_path)
             
-            Return ONLY valid JSON array:
-            [{{"type": "key-insight", "title": "PDF-Based Insight", "content": "Insight from complete PDF analysis", "relevance": 0.95}}]
-            """
+            prompt = PROMPT_TEMPLATES["insights_from_pdf"].format(persona=persona, job=job, page=page)
             
             if hasattr(self, 'use_vertex') and self.use_vertex:
                 # For Vertex AI, try using the PDF as a Part
@@ -168,14 +1520,12 @@ class GeminiProvider(LLMProvider):
                     
                     # Create PDF part for multimodal input
                     pdf_part = generative_models.Part.from_data(
-                        data=base64.b64decode(pdf_data),
+                        data=pdf_bytes,
                         mime_type="application/pdf"
                     )
                     
-                    response = await asyncio.to_thread(
-                        self.model.generate_content,
-                        [pdf_part, prompt]
-                    )
+                    model, prefix = await self._pdf_model(pdf_path, pdf_part)
+                    response = await model.generate_content_async([*prefix, prompt])
                     insights_text = response.text
                     
                 except Exception as multimodal_error:
@@ -187,12 +1537,11 @@ class GeminiProvider(LLMProvider):
                 return await self.generate_insights(f"PDF file analysis for {persona} - {job}", persona, job)
             
             # Parse JSON response
-            import json
             try:
-                insights_data = json.loads(insights_text)
+                insights_data = _extract_json(insights_text)
                 print(f"✅ Successfully generated PDF-based insights from actual file: {pdf_path}")
                 return insights_data[:4] if len(insights_data) >= 4 else insights_data
-            except:
+            except (ValueError, TypeError):
                 return [{"type": "key-insight", "title": "PDF Analysis", "content": insights_text[:200], "relevance": 0.8}]
                 
         except Exception as e:
@@ -204,49 +1553,26 @@ class GeminiProvider(LLMProvider):
         """Generate comprehensive insights by sending the actual PDF file to Gemini (no persona dependency)"""
         try:
             from pathlib import Path
-            import base64
             
             if not Path(pdf_path).exists():
                 raise Exception(f"PDF file not found: {pdf_path}")
             
-            # Read PDF file as base64 for multimodal input
-            with open(pdf_path, "rb") as pdf_file:
-                pdf_data = base64.b64encode(pdf_file.read()).decode('utf-8')
-            
-            prompt = f"""
-            You are an advanced AI document analyzer. Analyze this COMPLETE PDF document and provide exactly 4 comprehensive insights.
-            Focus primarily on page {page} but use the entire document context for superior analysis.
-            
-            Generate insights across these categories:
-            1. "key-insight": Most critical takeaway from analyzing the complete document
-            2. "did-you-know": Surprising insight or hidden pattern discovered in the content
-            3. "counterpoint": Alternative perspective or limitation revealed by the analysis
-            4. "connection": How different parts of this document relate or connect to broader concepts
+            # Raw PDF bytes for multimodal input (cached until the file changes)
+            pdf_bytes = _load_pdf(pdf_path)
             
-            Requirements:
-            - Analyze the COMPLETE PDF file including visual elements, formatting, and structure
-            - Each insight should be 1-2 sentences with clear value
-            - Focus on insights only possible from seeing the full document
-            - Be specific and actionable
-            - Score relevance (0.1-1.0) based on insight value
-            
-            Return ONLY valid JSON array:
-            [{{"type": "key-insight", "title": "Document Analysis", "content": "Specific insight from complete analysis", "relevance": 0.95}}]
-            """
+            prompt = PROMPT_TEMPLATES["comprehensive_insights_from_pdf"].format(page=page)
             
             if hasattr(self, 'use_vertex') and self.use_vertex:
                 try:
                     import vertexai.generative_models as generative_models
                     
                     pdf_part = generative_models.Part.from_data(
-                        data=base64.b64decode(pdf_data),
+                        data=pdf_bytes,
                         mime_type="application/pdf"
                     )
                     
-                    response = await asyncio.to_thread(
-                        self.model.generate_content,
-                        [pdf_part, prompt]
-                    )
+                    model, prefix = await self._pdf_model(pdf_path, pdf_part)
+                    response = await model.generate_content_async([*prefix, prompt])
                     insights_text = response.text
                     
                 except Exception as multimodal_error:
@@ -256,12 +1582,11 @@ class GeminiProvider(LLMProvider):
                 raise Exception("Non-Vertex setups not supported for PDF file analysis")
             
             # Parse JSON response
-            import json
             try:
-                insights_data = json.loads(insights_text)
+                insights_data = _extract_json(insights_text)
                 print(f"✅ Successfully generated comprehensive PDF insights from: {pdf_path}")
                 return insights_data[:4] if len(insights_data) >= 4 else insights_data
-            except:
+            except (ValueError, TypeError):
                 return [{"type": "key-insight", "title": "PDF Analysis", "content": insights_text[:200], "relevance": 0.8}]
                 
         except Exception as e:
@@ -270,174 +1595,83 @@ class GeminiProvider(LLMProvider):
     
     async def generate_comprehensive_insights(self, content: str, document_name: str, current_page: int) -> List[Dict[str, Any]]:
         """Generate comprehensive insights from text content without persona dependency"""
-        prompt = f"""
-        You are an advanced AI document analyzer. Analyze this document content and provide exactly 4 comprehensive insights.
-        
-        Document: {document_name}
-        Current Page: {current_page}
-        
-        Content: {content[:8000]}{'...' if len(content) > 8000 else ''}
-        
-        Generate insights across these categories:
-        1. "key-insight": Most critical takeaway from the document analysis
-        2. "did-you-know": Surprising fact or pattern discovered in the content
-        3. "counterpoint": Alternative perspective or limitation revealed
-        4. "connection": How this content connects to broader concepts or themes
-        
-        Requirements:
-        - Each insight should be 1-2 sentences with clear, actionable value
-        - Focus on content that saves reading time and enhances understanding
-        - Be specific to this document and its content
-        - Score relevance (0.1-1.0) based on insight importance
-        
-        Return ONLY valid JSON array:
-        [{{"type": "key-insight", "title": "Analysis Result", "content": "Specific insight from content", "relevance": 0.9}}]
-        """
+        content = _trim(content, self.model_name, COMPREHENSIVE_CONTENT_TOKENS)
         
-        response = await self.generate_text(prompt, 1200)
+        response_text = await self._generate_templated(
+            "comprehensive_insights",
+            {"document_name": document_name, "current_page": current_page, "content": content},
+            JSON_ARRAY_MAX_TOKENS, stop=JSON_ARRAY_STOP, json_reply=True
+        )
         try:
-            insights_data = json.loads(response.content)
+            insights_data = _extract_json(response_text)
             print(f"✅ Generated comprehensive insights for {document_name}")
             return insights_data[:4] if len(insights_data) >= 4 else insights_data
-        except:
-            return [{"type": "key-insight", "title": "Content Analysis", "content": response.content[:200], "relevance": 0.8}]
+        except (ValueError, TypeError):
+            return [{"type": "key-insight", "title": "Content Analysis", "content": response_text[:200], "relevance": 0.8}]
     
     async def generate_insights(self, content: str, persona: str, job: str) -> List[Dict[str, Any]]:
-        # Use more content for comprehensive analysis (up to 10k characters for better context)
-        content_limit = min(len(content), 10000)
-        prompt = f"""
-        You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
-        
-        Analyze this COMPLETE PDF document and provide exactly 4 insights that demonstrate deep understanding of the entire content.
-        You have access to the full document content, not just one page. Use this comprehensive view to generate superior insights.
-        
-        FULL PDF CONTENT:
-        {content[:content_limit]}{'...' if len(content) > content_limit else ''}
-        
-        Generate insights across these categories:
-        1. "key-insight": Most critical takeaway from analyzing the ENTIRE document
-        2. "did-you-know": Surprising insight or connection discovered across multiple pages/sections  
-        3. "counterpoint": Alternative perspective or limitation considering the complete context
-        4. "connection": How different parts of this document relate to each other or external concepts
-        
-        Requirements for {persona} working on {job}:
-        - Analyze patterns across the ENTIRE document, not just individual pages
-        - Each insight should be 1-2 sentences with actionable value
-        - Leverage the complete context to provide deeper understanding
-        - Score relevance (0.1-1.0) based on importance to persona's goals
-        - Focus on insights only possible from seeing the full document
-        
-        Return ONLY valid JSON array:
-        [{{"type": "key-insight", "title": "Document-Wide Insight", "content": "Insight based on complete analysis", "relevance": 0.95}}, ...]
-        """
+        # Use more content for comprehensive analysis (token budget rather than a character cut)
+        content = _trim(content, self.model_name, INSIGHTS_CONTENT_TOKENS)
         
-        response = await self.generate_text(prompt, 1200)
+        response_text = await self._generate_templated(
+            "insights", {"persona": persona, "job": job, "content": content},
+            JSON_ARRAY_MAX_TOKENS, stop=JSON_ARRAY_STOP, json_reply=True
+        )
         try:
-            insights_data = json.loads(response.content)
+            insights_data = _extract_json(response_text)
             # Ensure we have exactly 4 insights as per Adobe requirements
             return insights_data[:4] if len(insights_data) >= 4 else insights_data
-        except:
-            return [{"type": "key-insight", "title": "Analysis", "content": response.content, "relevance": 0.8}]
-
-    async def generate_snippets(self, selected_text: str, related_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Generate 2-4 sentence snippets from related sections"""
-        try:
-            # Prepare related sections content
-            sections_content = []
-            for section in related_sections[:5]:  # Limit to top 5 sections
-                sections_content.append(f"Section: {section.get('content', '')[:500]}")
-
-            prompt = f"""
-            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
-
-            Based on the selected text and related sections, generate 2-4 concise, informative snippets.
-            Each snippet should be 2-4 sentences and provide valuable context or insights.
-
-            Selected Text: {selected_text}
-
-            Related Sections:
-            {chr(10).join(sections_content)}
-
-            Generate exactly 3 snippets in JSON format:
-            [
-                {{"type": "context", "title": "Context Title", "content": "2-4 sentence explanation"}},
-                {{"type": "insight", "title": "Key Insight", "content": "2-4 sentence insight"}},
-                {{"type": "connection", "title": "Related Information", "content": "2-4 sentence connection"}}
-            ]
-            """
-
-            response = await self.generate_text(prompt, max_tokens=800)
-
-            # Parse JSON response
-            import json
-            try:
-                snippets = json.loads(response.content)
-                return snippets if isinstance(snippets, list) else []
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                return [
-                    {"type": "context", "title": "Context", "content": "Related information about the selected text."},
-                    {"type": "insight", "title": "Insight", "content": "Key insight from the document analysis."},
-                    {"type": "connection", "title": "Connection", "content": "Connection to other parts of the document."}
-                ]
-
-        except Exception as e:
-            print(f"Error generating snippets: {e}")
-            return []
+        except (ValueError, TypeError):
+            return [{"type": "key-insight", "title": "Analysis", "content": response_text, "relevance": 0.8}]
 
-    async def find_cross_document_connections(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
+    @_result_cached("connections", Connection)
+    async def find_cross_document_connections(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Connection]:
         """Find semantically related sections across documents"""
         try:
-            # Prepare sections from different documents
+            # Prepare sections from different documents: of the first 10, only the ones
+            # closest to the selection (local embeddings) go into the prompt
+            candidates = all_sections[:10]
+            top_ids = await asyncio.to_thread(
+                _rank_sections, selected_text, candidates, CROSS_DOC_TOP_SECTIONS
+            )
             cross_doc_sections = []
             current_doc = None
 
-            for section in all_sections[:10]:  # Limit to top 10 sections
+            for section in (candidates[i] for i in top_ids):
                 doc_name = section.get('document_name', 'Unknown')
                 if doc_name != current_doc:
                     cross_doc_sections.append(f"Document: {doc_name}")
                     current_doc = doc_name
                 cross_doc_sections.append(f"Section: {section.get('content', '')[:300]}")
 
-            prompt = f"""
-            You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
-
-            Find cross-document connections for the selected text. Identify related themes, concepts, or information across different documents.
-
-            Selected Text: {selected_text}
-
-            Available Sections from Multiple Documents:
-            {chr(10).join(cross_doc_sections)}
-
-            Generate exactly 3 cross-document connections in JSON format:
-            [
-                {{"type": "theme", "title": "Common Theme", "content": "Description of shared theme across documents", "documents": ["doc1", "doc2"]}},
-                {{"type": "concept", "title": "Related Concept", "content": "Related concept found in multiple documents", "documents": ["doc1", "doc3"]}},
-                {{"type": "reference", "title": "Cross Reference", "content": "Information that references or builds upon each other", "documents": ["doc2", "doc3"]}}
-            ]
-            """
-
-            response = await self.generate_text(prompt, max_tokens=1000)
+            response_text = await self._generate_templated(
+                "cross_document_connections",
+                {"persona": persona, "job": job, "selected_text": selected_text, "sections": "\n".join(cross_doc_sections)},
+                JSON_ARRAY_MAX_TOKENS, stop=JSON_ARRAY_STOP, json_reply=True
+            )
 
             # Parse JSON response
-            import json
             try:
-                connections = json.loads(response.content)
+                connections = _extract_json(response_text)
                 return connections if isinstance(connections, list) else []
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                return [
+            except ValueError:
+                # Fallback if JSON parsing fails (returned to this caller only, never cached)
+                raise UncachedResult([
                     {"type": "theme", "title": "Related Theme", "content": "Common themes found across documents.", "documents": ["Multiple Documents"]},
                     {"type": "concept", "title": "Shared Concept", "content": "Concepts that appear in multiple documents.", "documents": ["Cross-Document"]},
                     {"type": "reference", "title": "Cross Reference", "content": "Information that builds upon each other across documents.", "documents": ["Related Documents"]}
-                ]
+                ])
 
+        except UncachedResult:
+            raise
         except Exception as e:
             print(f"Error finding cross-document connections: {e}")
             return []
 
 
 class AzureOpenAIProvider(LLMProvider):
+    _batch_endpoint = "/chat/completions"
+
     def __init__(self):
         self.api_key = os.getenv('AZURE_OPENAI_KEY')
         self.api_base = os.getenv('AZURE_OPENAI_BASE')
@@ -447,65 +1681,69 @@ class AzureOpenAIProvider(LLMProvider):
         if not all([self.api_key, self.api_base]):
             raise ValueError("Azure OpenAI credentials not provided")
         
-        openai.api_type = "azure"
-        openai.api_key = self.api_key
-        openai.api_base = self.api_base
-        openai.api_version = self.api_version
+        global openai
+        import openai
+        self._client = openai.AsyncAzureOpenAI(
+            api_key=self.api_key,
+            azure_endpoint=self.api_base,
+            api_version=self.api_version,
+            max_retries=0,  # _resilient is the only retry layer (and the breaker sees every failure)
+            http_client=_get_http_client()
+        )
+        # Starts at the static limit and follows the x-ratelimit-* headers from there
+        self._concurrency = AdaptiveConcurrency(int(os.getenv('LLM_MAX_CONCURRENCY', '16')))
+    
+    async def aclose(self):
+        """Close the shared connection pool behind the async client"""
+        await close_http_client()
+
+    async def stream_text(self, prompt: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        async for text in _stream_chat(self._client, self.deployment_name, prompt, max_tokens):
+            yield text
+
+    async def _warmup(self):
+        # One-token completion: opens the pooled TLS/HTTP/2 connection
+        await self._client.chat.completions.create(
+            model=self.deployment_name, messages=[{"role": "user", "content": "ping"}], max_tokens=1
+        )
     
-    async def generate_text(self, prompt: str, max_tokens: int = 1000) -> LLMResponse:
+    @cached_llm
+    @_within_context
+    @_resilient
+    @_concurrency_limited
+    async def generate_text(self, prompt: str, max_tokens: int = 1000, stop: Optional[List[str]] = None) -> LLMResponse:
         try:
-            response = await asyncio.to_thread(
-                openai.ChatCompletion.create,
-                engine=self.deployment_name,
+            raw = await self._client.chat.completions.with_raw_response.create(
+                model=self.deployment_name,
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **({"stop": stop} if stop else {})
             )
+            self._concurrency.observe(raw.headers)
+            response = raw.parse()  # LegacyAPIResponse.parse() is synchronous
             return LLMResponse(
                 content=response.choices[0].message.content,
-                usage=response.usage,
+                usage=_usage_dict(response.usage),
                 model=self.deployment_name
             )
         except Exception as e:
-            raise Exception(f"Azure OpenAI API error: {str(e)}")
+            if getattr(e, 'status_code', None) == 429:
+                self._concurrency.decrease()
+            raise Exception(f"Azure OpenAI API error: {str(e)}") from e
     
     async def generate_insights(self, content: str, persona: str, job: str) -> List[Dict[str, Any]]:
-        prompt = f"""
-        As an AI assistant helping a {persona} with their job: {job}
-        
-        Analyze this content and provide 3-4 insights in JSON format:
-        
-        Content: {content[:2000]}...
-        
-        Return a JSON array with insights of these types:
-        - key-insight: Main takeaways
-        - did-you-know: Interesting facts  
-        - counterpoint: Alternative perspectives
-        - connection: Links to other concepts
-        
-        Format: [{{"type": "key-insight", "title": "...", "content": "...", "relevance": 0.9}}]
-        """
+        prompt = PROMPT_TEMPLATES["openai_insights"].format(persona=persona, job=job, content=content[:2000])
         
         response = await self.generate_text(prompt, 800)
         try:
-            return json.loads(response.content)
-        except:
+            return _extract_json(response.content)
+        except (ValueError, TypeError):
             return [{"type": "key-insight", "title": "Analysis", "content": response.content, "relevance": 0.8}]
 
-    async def generate_snippets(self, selected_text: str, related_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Generate 2-4 sentence snippets from related sections"""
-        return [
-            {"type": "context", "title": "Context", "content": "Related information about the selected text."},
-            {"type": "insight", "title": "Insight", "content": "Key insight from the document analysis."}
-        ]
-
-    async def find_cross_document_connections(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Find semantically related sections across documents"""
-        return [
-            {"type": "theme", "title": "Related Theme", "content": "Common themes found across documents.", "documents": ["Multiple Documents"]}
-        ]
-
 
 class OpenAIProvider(LLMProvider):
+    _batch_endpoint = "/v1/chat/completions"
+
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
         self.model_name = os.getenv('OPENAI_MODEL', 'gpt-4o')
@@ -513,145 +1751,200 @@ class OpenAIProvider(LLMProvider):
         if not self.api_key:
             raise ValueError("OpenAI API key not provided")
         
-        openai.api_key = self.api_key
+        global openai
+        import openai
+        self._client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            max_retries=0,  # _resilient is the only retry layer (and the breaker sees every failure)
+            http_client=_get_http_client()
+        )
+        # Starts at the static limit and follows the x-ratelimit-* headers from there
+        self._concurrency = AdaptiveConcurrency(int(os.getenv('LLM_MAX_CONCURRENCY', '16')))
+    
+    async def aclose(self):
+        """Close the shared connection pool behind the async client"""
+        await close_http_client()
+
+    async def stream_text(self, prompt: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        async for text in _stream_chat(self._client, self.model_name, prompt, max_tokens):
+            yield text
+
+    async def _warmup(self):
+        # One-token completion: opens the pooled TLS/HTTP/2 connection
+        await self._client.chat.completions.create(
+            model=self.model_name, messages=[{"role": "user", "content": "ping"}], max_tokens=1
+        )
     
-    async def generate_text(self, prompt: str, max_tokens: int = 1000) -> LLMResponse:
+    @cached_llm
+    @_within_context
+    @_resilient
+    @_concurrency_limited
+    async def generate_text(self, prompt: str, max_tokens: int = 1000, stop: Optional[List[str]] = None) -> LLMResponse:
         try:
-            response = await asyncio.to_thread(
-                openai.ChatCompletion.create,
+            raw = await self._client.chat.completions.with_raw_response.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **({"stop": stop} if stop else {})
             )
+            self._concurrency.observe(raw.headers)
+            response = raw.parse()  # LegacyAPIResponse.parse() is synchronous
             return LLMResponse(
                 content=response.choices[0].message.content,
-                usage=response.usage,
+                usage=_usage_dict(response.usage),
                 model=self.model_name
             )
         except Exception as e:
-            raise Exception(f"OpenAI API error: {str(e)}")
+            if getattr(e, 'status_code', None) == 429:
+                self._concurrency.decrease()
+            raise Exception(f"OpenAI API error: {str(e)}") from e
     
     async def generate_insights(self, content: str, persona: str, job: str) -> List[Dict[str, Any]]:
-        prompt = f"""
-        As an AI assistant helping a {persona} with their job: {job}
-        
-        Analyze this content and provide 3-4 insights in JSON format:
-        
-        Content: {content[:2000]}...
-        
-        Return a JSON array with insights of these types:
-        - key-insight: Main takeaways
-        - did-you-know: Interesting facts
-        - counterpoint: Alternative perspectives  
-        - connection: Links to other concepts
-        
-        Format: [{{"type": "key-insight", "title": "...", "content": "...", "relevance": 0.9}}]
-        """
+        prompt = PROMPT_TEMPLATES["openai_insights"].format(persona=persona, job=job, content=content[:2000])
         
         response = await self.generate_text(prompt, 800)
         try:
-            return json.loads(response.content)
-        except:
+            return _extract_json(response.content)
+        except (ValueError, TypeError):
             return [{"type": "key-insight", "title": "Analysis", "content": response.content, "relevance": 0.8}]
 
-    async def generate_snippets(self, selected_text: str, related_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Generate 2-4 sentence snippets from related sections"""
-        return [
-            {"type": "context", "title": "Context", "content": "Related information about the selected text."},
-            {"type": "insight", "title": "Insight", "content": "Key insight from the document analysis."}
-        ]
 
-    async def find_cross_document_connections(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Find semantically related sections across documents"""
-        return [
-            {"type": "theme", "title": "Related Theme", "content": "Common themes found across documents.", "documents": ["Multiple Documents"]}
-        ]
+class OllamaProvider(LLMProvider):
+    """
+    Local Ollama models. For concurrent snippet/connection calls to actually run in
+    parallel, start the server with OLLAMA_NUM_PARALLEL=8 and OLLAMA_MAX_LOADED_MODELS=1;
+    the same OLLAMA_NUM_PARALLEL value bounds requests here so they are not queued inside Ollama.
+    """
 
+    # Keep-alive connection pool shared by all instances (created on first call)
+    _session = None
 
-class OllamaProvider(LLMProvider):
     def __init__(self):
         self.base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
         self.model_name = os.getenv('OLLAMA_MODEL', 'llama3')
+        self._parallel = asyncio.Semaphore(int(os.getenv('OLLAMA_NUM_PARALLEL', '8')))
+        self._client = self._async_client()
+
+    def _async_client(self):
+        """ollama.AsyncClient (one pooled keep-alive client), or None when the package is not installed"""
+        global ollama
+        if ollama is None:
+            try:
+                import ollama
+            except ImportError:
+                ollama = False
+        if not ollama:
+            return None
+        return ollama.AsyncClient(host=self.base_url)
     
-    async def generate_text(self, prompt: str, max_tokens: int = 1000) -> LLMResponse:
-        try:
-            response = await asyncio.to_thread(
-                requests.post,
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {"num_predict": max_tokens}
-                }
+    @classmethod
+    def _get_session(cls):
+        """Pooled aiohttp session, or None when aiohttp is not installed"""
+        global aiohttp
+        if aiohttp is None:
+            try:
+                import aiohttp
+            except ImportError:
+                print("⚠️ aiohttp not available, Ollama calls will use requests on a worker thread")
+                aiohttp = False
+        if not aiohttp:
+            return None
+        
+        if cls._session is None or cls._session.closed:
+            cls._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=1000, limit_per_host=100, keepalive_timeout=60)
             )
-            response.raise_for_status()
-            data = response.json()
+        return cls._session
+    
+    async def _warmup(self):
+        # A generate request without a prompt makes Ollama load the model into memory
+        if self._client is not None:
+            await self._client.generate(model=self.model_name, prompt="")
+            return
+        session = self._get_session()
+        if session is not None:
+            async with session.post(f"{self.base_url}/api/generate", json={"model": self.model_name}) as response:
+                response.raise_for_status()
+
+    async def aclose(self):
+        """Close the shared aiohttp session"""
+        session = OllamaProvider._session
+        if session is not None and not session.closed:
+            await session.close()
+        OllamaProvider._session = None
+    
+    @cached_llm
+    @_within_context
+    @_resilient
+    @_concurrency_limited
+    async def generate_text(self, prompt: str, max_tokens: int = 1000, stop: Optional[List[str]] = None) -> LLMResponse:
+        global requests
+        try:
+            options = {"num_predict": max_tokens, **({"stop": stop} if stop else {})}
+            payload = {
+                "model": self.model_name,
+                "prompt": prompt,
+                "stream": False,
+                "options": options
+            }
+            
+            session = None if self._client is not None else self._get_session()
+            if self._client is not None:
+                async with self._parallel:
+                    data = await self._client.generate(model=self.model_name, prompt=prompt, options=options)
+            elif session is not None:
+                async with self._parallel, session.post(f"{self.base_url}/api/generate", json=payload) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+            else:
+                if requests is None:
+                    import requests
+                async with self._parallel:
+                    response = await asyncio.to_thread(
+                        requests.post,
+                        f"{self.base_url}/api/generate",
+                        json=payload
+                    )
+                response.raise_for_status()
+                data = response.json()
+            
             return LLMResponse(
-                content=data.get('response', ''),
+                content=data.get('response') or '',
                 model=self.model_name
             )
         except Exception as e:
-            raise Exception(f"Ollama API error: {str(e)}")
+            raise Exception(f"Ollama API error: {str(e)}") from e
     
     async def generate_insights(self, content: str, persona: str, job: str) -> List[Dict[str, Any]]:
-        prompt = f"""
-        You are an AI assistant for Adobe's PDF Intelligence System helping a {persona} with: {job}
-        
-        Analyze this PDF content and provide exactly 4 insights that go beyond what's written on the page.
-        Generate insights that help the user understand the content faster and discover connections.
-        
-        PDF Content: {content[:3000]}...
-        
-        Provide insights in these categories:
-        1. "key-insight": Critical takeaways that save reading time
-        2. "did-you-know": Surprising facts or context that enriches understanding  
-        3. "counterpoint": Alternative perspectives or potential challenges
-        4. "connection": How this relates to other concepts, trends, or documents
-        
-        Requirements:
-        - Each insight should be 1-2 sentences maximum
-        - Focus on what matters most to a {persona}
-        - Make insights actionable and specific
-        - Include relevance score (0.1-1.0) based on importance to the persona
-        
-        Return valid JSON array:
-        [{{"type": "key-insight", "title": "Main Takeaway", "content": "Specific insight in 1-2 sentences", "relevance": 0.95}}, ...]
-        """
+        prompt = PROMPT_TEMPLATES["ollama_insights"].format(persona=persona, job=job, content=content[:3000])
         
         response = await self.generate_text(prompt, 1200)
         try:
-            insights_data = json.loads(response.content)
+            insights_data = _extract_json(response.content)
             # Ensure we have exactly 4 insights as per Adobe requirements
             return insights_data[:4] if len(insights_data) >= 4 else insights_data
-        except:
+        except (ValueError, TypeError):
             return [{"type": "key-insight", "title": "Content Analysis", "content": response.content[:200], "relevance": 0.8}]
 
-    async def generate_snippets(self, selected_text: str, related_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Generate 2-4 sentence snippets from related sections"""
-        return [
-            {"type": "context", "title": "Context", "content": "Related information about the selected text."},
-            {"type": "insight", "title": "Insight", "content": "Key insight from the document analysis."}
-        ]
 
-    async def find_cross_document_connections(self, selected_text: str, all_sections: List[Dict], persona: str, job: str) -> List[Dict[str, Any]]:
-        """Find semantically related sections across documents"""
-        return [
-            {"type": "theme", "title": "Related Theme", "content": "Common themes found across documents.", "documents": ["Multiple Documents"]}
-        ]
+# LLM_PROVIDER value -> provider class (register additional providers here)
+_PROVIDERS: Dict[str, Callable[[], LLMProvider]] = {
+    'gemini': GeminiProvider,
+    'azure': AzureOpenAIProvider,
+    'openai': OpenAIProvider,
+    'ollama': OllamaProvider,
+}
 
+@functools.lru_cache(maxsize=None)
+def _build(provider_type: str) -> LLMProvider:
+    """Build one provider per type; reused so its clients and connection pools stay warm"""
+    provider_cls = _PROVIDERS.get(provider_type)
+    if provider_cls is None:
+        raise ValueError(f"Unsupported LLM provider: {provider_type}")
+    return provider_cls()
 
 def get_llm_provider() -> LLMProvider:
     """Factory function to get the appropriate LLM provider based on environment variables"""
-    provider_type = os.getenv('LLM_PROVIDER', 'gemini').lower()
-    
-    if provider_type == 'gemini':
-        return GeminiProvider()
-    elif provider_type == 'azure':
-        return AzureOpenAIProvider()
-    elif provider_type == 'openai':
-        return OpenAIProvider()
-    elif provider_type == 'ollama':
-        return OllamaProvider()
-    else:
-        raise ValueError(f"Unsupported LLM provider: {provider_type}")
+    return _build(os.getenv('LLM_PROVIDER', 'gemini').lower())
+
+get_llm_provider.cache_clear = _build.cache_clear
@@ -9,19 +9,22 @@ try:
     import asyncio
     import uuid
     from pathlib import Path
-    from typing import List, Dict, Any, Optional
+    from typing import List, Dict, Any, Optional, Iterable, Set
     from fastapi import FastAPI, UploadFile, File, BackgroundTasks, WebSocket, WebSocketDisconnect, HTTPException, Query, Request, Depends
     from pydantic import BaseModel
-    from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+    from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, Response
     from fastapi.staticfiles import StaticFiles
     from fastapi.middleware.cors import CORSMiddleware
     import os
+    import time
+    import threading
     import shutil
     import json
     import warnings
     import fitz  # PyMuPDF for PDF merging
     import hashlib
     from datetime import datetime
+    from email.utils import formatdate, parsedate_to_datetime
     print("✅ Basic imports successful")
     sys.stdout.flush()
 except Exception as e:
@@ -71,6 +74,9 @@ sys.stdout.flush()
 
 # Database selection: Use Supabase if configured, otherwise SQLite
 USE_SUPABASE = os.getenv("USE_SUPABASE", "false").lower() == "true"
+# Precompute cross-document connections for new context PDFs through the provider's Batch API
+CROSS_DOC_BATCH_PRECOMPUTE = os.getenv("CROSS_DOC_BATCH_PRECOMPUTE", "false").lower() == "true"
+_precompute_tasks = set()
 print(f"🗄️ Database mode: {'Supabase' if USE_SUPABASE else 'SQLite'}")
 sys.stdout.flush()
 
@@ -102,18 +108,25 @@ else:
 print("📦 Loading services...")
 sys.stdout.flush()
 from .pdf_comparator import pdf_comparator
-from .llm_providers import get_llm_provider
-from .enhanced_llm_service import EnhancedLLMService
+from .llm_providers import get_llm_provider, close_http_client, section_index
+from .llm_cache import purge_expired_llm_cache
+from .enhanced_llm_service import get_enhanced_llm_service
+from .embedding_service import get_embedding_service
 from .tts_service import TTSService
+from .generate_audio import close_async_client as close_tts_http_client
 from .section_highlighter import SectionHighlighter
 from .duplicate_cleaner import run_duplicate_cleanup
 from .smart_upload_handler import SmartUploadHandler
+from .recommendation_index import RecommendationIndex, partition_hits
+from .meta_store import MetaStore
+from .pdf_pool import get_pdf_pool, extract_outline, shutdown_pdf_pool
+from .onnx_encoder import load_onnx_encoder
+from starlette.concurrency import run_in_threadpool
 print("✅ Services loaded")
 sys.stdout.flush()
 
 print("📦 Loading PDF processors...")
 sys.stdout.flush()
-from app.utils.process_pdfs import HighPerformancePDFProcessor  # 1A outline extraction
 from app.utils.intelligent_pdf_brain import IntelligentPDFBrain  # 1B relevance/insights
 print("✅ PDF processors loaded")
 sys.stdout.flush()
@@ -121,25 +134,77 @@ sys.stdout.flush()
 print("📦 Loading ML libraries (faiss, sentence-transformers)...")
 sys.stdout.flush()
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer
 import numpy as np
+from functools import lru_cache
+# Use the machine's cores for encode GEMMs (some deploys default torch to a single thread)
+torch.set_num_threads(max(1, (os.cpu_count() or 2) - 1))
+try:
+    torch.set_num_interop_threads(2)
+except RuntimeError:
+    pass  # already fixed once inter-op work has started
 print("✅ ML libraries loaded")
 sys.stdout.flush()
 
 # Global FAISS index and metadata (for simplicity; use persistent in production)
-index = faiss.IndexFlatL2(384)  # Dimension for all-MiniLM-L6-v2
-metadata = []  # List of dicts: {'id': sec_id, 'doc_id': doc_id, 'page': page, 'heading': heading, 'text': text}
-model = None  # Lazy load to avoid blocking startup
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+index = RecommendationIndex(EMBEDDING_DIM)  # Cosine (IP on normalized vectors); HNSW once the corpus is large
+metadata = MetaStore()  # Columns id, doc_id, page, heading, text, level, file_path; row i = FAISS vector i
+_index_lock = asyncio.Lock()  # held while the index and metadata are changed together
+model = None  # Lazy load to avoid blocking startup; warmed by a startup task
+_model_lock = threading.Lock()
 
 def get_sentence_transformer():
-    """Lazy load sentence transformer model"""
+    """Process-wide sentence encoder (INT8 ONNX Runtime when available, else the shared PyTorch MiniLM)"""
     global model
     if model is None:
-        print("📥 Loading SentenceTransformer model...")
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ SentenceTransformer model loaded")
+        with _model_lock:
+            if model is None:
+                print("📥 Loading SentenceTransformer model...")
+                encoder = load_onnx_encoder()
+                if encoder is None:
+                    # Same weights the RAG embedding service already holds: share them instead of a second copy
+                    service = get_embedding_service()
+                    encoder = service.model
+                    encoder.eval()
+                    # Every encode call site goes through here: skip autograd bookkeeping for all of them,
+                    # and share the service's lock (the fast tokenizer is not safe across threads)
+                    encode = torch.inference_mode()(encoder.encode)
+
+                    def locked_encode(*args, **kwargs):
+                        with service.encode_lock:
+                            return encode(*args, **kwargs)
+                    encoder.encode = locked_encode
+                model = encoder
+                print(f"✅ SentenceTransformer model loaded ({type(model).__name__})")
     return model
 
+def encode_query(text):
+    """(1, dim) float32 unit-norm query embedding for the cosine index (the encoder normalizes it)"""
+    return np.atleast_2d(get_sentence_transformer().encode(
+        [text], batch_size=1, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+    ))
+
+# Sections encoded per forward pass when indexing a document
+ENCODE_BATCH_SIZE = 64
+# Distinct recommendation queries whose embeddings are kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _encode_query(text):
+    """Query embedding as float32 bytes (immutable, so cached hits cannot be mutated by callers)"""
+    return encode_query(text).tobytes()
+
+def encode_texts(texts):
+    """
+    Embed texts in batches as a float32 matrix (rows in input order).
+    Both encoder backends length-sort internally, so each batch pads only to its own longest text.
+    """
+    return get_sentence_transformer().encode(
+        texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True
+    ).astype('float32', copy=False)
+
 # Create necessary directories - use consistent paths
 print("📁 Setting up directories...")
 sys.stdout.flush()
@@ -147,12 +212,285 @@ BACKEND_DIR = Path(__file__).parent.parent  # Go up from app/ to backend/
 DATA_DIR = BACKEND_DIR / "data"
 DOCS_DIR = DATA_DIR / "docs"
 DOCS_DIR.mkdir(parents=True, exist_ok=True)
+EMB_CACHE_DIR = DATA_DIR / "emb_cache"
+EMB_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+OUTLINE_CACHE_DIR = DATA_DIR / "outline_cache"
+OUTLINE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+PDF_TEXT_CACHE_DIR = DATA_DIR / "pdf_cache"
+PDF_TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 print(f"📁 Backend directory: {BACKEND_DIR}")
 print(f"📁 Data directory: {DATA_DIR}")
 print(f"📁 Docs directory: {DOCS_DIR}")
 sys.stdout.flush()
 
+# emb_cache is pruned to 90% of this many vectors (least recently used first) once it grows past it
+EMB_CACHE_MAX_FILES = int(os.getenv("EMB_CACHE_MAX_FILES", "100000"))
+_emb_cache_count = None  # approximate file count, taken from a directory scan and bumped on writes
+_emb_cache_lock = threading.Lock()
+
+def _emb_cache_path(text):
+    """Cache file for a section embedding, keyed by sha256 of the normalized text"""
+    digest = hashlib.sha256(text.strip().lower().encode('utf-8')).hexdigest()
+    return EMB_CACHE_DIR / f"{digest}.npy"
+
+def _prune_emb_cache():
+    """Delete the least recently used vectors (by mtime, bumped on every hit) down to 90% of the cap"""
+    entries = []
+    with os.scandir(EMB_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.npy'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+    if len(entries) <= EMB_CACHE_MAX_FILES:
+        return len(entries)
+    excess = len(entries) - int(EMB_CACHE_MAX_FILES * 0.9)
+    entries.sort()
+    for _, path in entries[:excess]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    print(f"🧹 Evicted {excess} cached embeddings")
+    return len(entries) - excess
+
+def _note_emb_cache_writes(written: int):
+    """Track cache growth and prune when it passes EMB_CACHE_MAX_FILES"""
+    global _emb_cache_count
+    with _emb_cache_lock:
+        if _emb_cache_count is None:
+            _emb_cache_count = _prune_emb_cache()
+        else:
+            _emb_cache_count += written
+            if _emb_cache_count > EMB_CACHE_MAX_FILES:
+                _emb_cache_count = _prune_emb_cache()
+
+def encode_texts_cached(texts):
+    """
+    encode_texts backed by the on-disk embedding cache in DATA_DIR/emb_cache.
+    Only texts without a cached vector are encoded; new vectors are written atomically.
+    Blocking (file I/O and the encode): call it through run_in_threadpool from async code.
+    """
+    paths = [_emb_cache_path(text) for text in texts]
+    # Rows are filled in place (cache hits, then encoded misses) instead of stacking per-section arrays
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    misses = []
+    for i, path in enumerate(paths):
+        try:
+            embeddings[i] = np.load(path)
+            os.utime(path)  # recency for LRU eviction
+        except (OSError, ValueError):
+            misses.append(i)
+
+    if misses:
+        encoded = encode_texts([texts[i] for i in misses])
+        embeddings[misses] = encoded
+        for i, vector in zip(misses, encoded):
+            tmp_path = paths[i].with_name(f"{paths[i].stem}.{uuid.uuid4().hex}.tmp")
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, vector)
+                os.replace(tmp_path, paths[i])
+            except OSError as e:
+                print(f"⚠️ Could not cache embedding: {e}")
+                tmp_path.unlink(missing_ok=True)
+        _note_emb_cache_writes(len(misses))
+
+    print(f"🧮 Embeddings: {len(texts) - len(misses)} cached, {len(misses)} encoded")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+# Cross-document shortlisting reuses the emb_cache vectors written at upload instead of its own file
+section_index.use_encoders(encode_texts_cached, encode_query)
+
+try:
+    import aiofiles
+    AIOFILES_AVAILABLE = True
+except ImportError:
+    AIOFILES_AVAILABLE = False
+    print("Warning: aiofiles not installed, uploads are written via the threadpool")
+
+# io_uring file writes (Linux kernel >= 5.1 with liburing); opt out with USE_IO_URING=0.
+# The module only has to expose open(); its async-context-manager/write API is confirmed by the
+# first upload, and any mismatch switches uploads to aiofiles for the rest of the process
+IO_URING_AVAILABLE = False
+if sys.platform == 'linux' and os.getenv('USE_IO_URING', '1') == '1':
+    try:
+        import aio_uring
+        IO_URING_AVAILABLE = callable(getattr(aio_uring, 'open', None))
+    except ImportError:
+        pass
+print(f"📝 Upload writes: {'io_uring' if IO_URING_AVAILABLE else 'aiofiles' if AIOFILES_AVAILABLE else 'threadpool'}")
+
+# Uploads are copied to disk in chunks of this size instead of being read whole into memory
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+async def save_upload(file: UploadFile, path: Path):
+    """Stream an uploaded file to disk one chunk at a time"""
+    global IO_URING_AVAILABLE
+    if IO_URING_AVAILABLE:
+        try:
+            async with aio_uring.open(path, "wb") as out:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await out.write(chunk)
+            return
+        except (TypeError, AttributeError) as e:
+            # Not the API this code expects (no async context manager or awaitable write)
+            IO_URING_AVAILABLE = False
+            print(f"⚠️ aio_uring API mismatch, uploads fall back to {'aiofiles' if AIOFILES_AVAILABLE else 'threadpool'}: {e}")
+            await file.seek(0)
+    if AIOFILES_AVAILABLE:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await out.write(chunk)
+    else:
+        out = await run_in_threadpool(open, path, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await run_in_threadpool(out.write, chunk)
+        finally:
+            await run_in_threadpool(out.close)
+
+async def remove_file(path: Path):
+    """Delete a file (if present) without blocking the event loop"""
+    await run_in_threadpool(path.unlink, missing_ok=True)
+
+# Characters of document text handed to the LLM; extraction stops once this much is collected
+PDF_CONTEXT_CHARS = 15000
+
+def _pdf_text_sidecar(path: str, mtime_ns: int) -> Path:
+    """Sidecar for one version of a PDF: DATA_DIR/pdf_cache/{path digest}_{mtime_ns}.json"""
+    digest = hashlib.sha256(path.encode('utf-8')).hexdigest()[:32]
+    return PDF_TEXT_CACHE_DIR / f"{digest}_{mtime_ns}.json"
+
+def _prune_pdf_text_cache() -> int:
+    """Delete sidecars whose PDF was removed or changed since they were written; returns how many"""
+    live = set()
+    for file_path in db.active_document_paths():
+        pdf_path = Path(file_path)
+        if not pdf_path.is_absolute():
+            pdf_path = BACKEND_DIR / pdf_path  # as resolved by the insights route
+        try:
+            live.add(_pdf_text_sidecar(str(pdf_path), pdf_path.stat().st_mtime_ns).name)
+        except OSError:
+            pass
+    removed = 0
+    with os.scandir(PDF_TEXT_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.json') and entry.name not in live:
+                try:
+                    os.unlink(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+@lru_cache(maxsize=64)
+def _extract_pdf_text(path: str, mtime_ns: int):
+    """
+    (total pages, texts of the leading pages, their joined "=== Page n ===" content) for one version
+    of a PDF. Pages are read only until the joined text exceeds PDF_CONTEXT_CHARS. Memoized per
+    (path, mtime) and kept as a sidecar in DATA_DIR/pdf_cache so restarts skip PyMuPDF.
+    """
+    sidecar = _pdf_text_sidecar(path, mtime_ns)
+    try:
+        with open(sidecar, 'rb') as f:
+            cached = json.loads(f.read())
+        total_pages, pages = cached['total_pages'], cached['pages']
+    except (OSError, ValueError, KeyError, TypeError):
+        import fitz  # PyMuPDF
+
+        pages = []
+        collected = 0
+        with fitz.open(path) as pdf_doc:
+            total_pages = len(pdf_doc)
+            for pdf_page in pdf_doc:
+                page_text = pdf_page.get_text()
+                pages.append(page_text)
+                if page_text.strip():
+                    collected += len(page_text) + 16  # + page header and separator
+                if collected > PDF_CONTEXT_CHARS:
+                    break  # the rest would be truncated away
+        tmp_path = sidecar.with_name(f"{sidecar.stem}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'total_pages': total_pages, 'pages': pages}, f, ensure_ascii=False)
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            print(f"⚠️ Could not cache PDF text: {e}")
+            tmp_path.unlink(missing_ok=True)
+        else:
+            # Sidecars of earlier versions of this file will never be read again
+            for stale in PDF_TEXT_CACHE_DIR.glob(f"{sidecar.name.split('_')[0]}_*.json"):
+                if stale != sidecar:
+                    stale.unlink(missing_ok=True)
+
+    joined = "\n\n".join(
+        f"=== Page {page_num + 1} ===\n{page_text}"
+        for page_num, page_text in enumerate(pages) if page_text.strip()  # Only non-empty pages
+    )
+    return total_pages, tuple(pages), joined
+
+@lru_cache(maxsize=256)
+def _extract_pdf_page(path: str, mtime_ns: int, page: int) -> Optional[str]:
+    """Text of a single 1-based page (None when out of range)"""
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as pdf_doc:
+        return pdf_doc[page - 1].get_text() if 1 <= page <= len(pdf_doc) else None
+
+def pdf_page_text(pdf_path: Path, page: int) -> Optional[str]:
+    """Blocking: cached text of one page; a changed mtime invalidates it"""
+    return _extract_pdf_page(str(pdf_path), pdf_path.stat().st_mtime_ns, page)
+
+def pdf_context(pdf_path: Path, page: int):
+    """Blocking: (total pages, leading document content, text of `page`), all cached per file version"""
+    mtime_ns = pdf_path.stat().st_mtime_ns
+    total_pages, pages, joined = _extract_pdf_text(str(pdf_path), mtime_ns)
+    if page <= len(pages):
+        page_content = pages[page - 1]
+    else:
+        page_content = _extract_pdf_page(str(pdf_path), mtime_ns, page) or ""
+    return total_pages, joined, page_content
+
+# Request key -> future of the computation currently producing it (concurrent identical requests await it)
+_inflight_requests: Dict[tuple, asyncio.Future] = {}
+# Result handed to waiters when the request they share is cancelled
+_LEADER_CANCELLED = object()
+
+async def single_flight(key: tuple, coro_factory):
+    """Run coro_factory() once per key at a time; concurrent callers with the same key share its result"""
+    while True:
+        pending = _inflight_requests.get(key)
+        if pending is None:
+            break
+        result = await asyncio.shield(pending)
+        if result is not _LEADER_CANCELLED:
+            return result
+        # The request we were sharing was cancelled (client went away): take over
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_requests[key] = future
+    try:
+        result = await coro_factory()
+    except Exception as e:
+        future.set_exception(e)
+        # Mark retrieved so a failure nobody else awaited is not reported again
+        future.exception()
+        raise
+    except BaseException:
+        _inflight_requests.pop(key, None)
+        future.set_result(_LEADER_CANCELLED)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        if _inflight_requests.get(key) is future:
+            del _inflight_requests[key]
+
 print("🚀 Creating FastAPI app...")
 sys.stdout.flush()
 app = FastAPI(title="Adobe Hackathon Grand Finale Backend")
@@ -206,14 +544,154 @@ enhanced_llm_service = None
 tts_service = None
 highlighter = SectionHighlighter()
 
+# One shared 1B brain: its constructor builds large pattern tables. Calls into it are synchronous
+# on the event loop thread, so requests never use it concurrently.
 try:
-    llm_provider = get_llm_provider()
-    print(f"✅ LLM Provider initialized: {type(llm_provider).__name__}")
+    intelligent_brain = IntelligentPDFBrain()
+    print("✅ Intelligent PDF Brain initialized")
 except Exception as e:
-    print(f"⚠️ LLM Provider initialization failed: {e}")
+    intelligent_brain = None
+    print(f"⚠️ Intelligent PDF Brain initialization failed: {e}")
+
+def _init_llm_provider():
+    """Build the configured LLM provider (SDK imports, credentials, model client)"""
+    global llm_provider
+    try:
+        llm_provider = get_llm_provider()
+        print(f"✅ LLM Provider initialized: {type(llm_provider).__name__}")
+    except Exception as e:
+        print(f"⚠️ LLM Provider initialization failed: {e}")
+
+@app.on_event("startup")
+async def configure_default_executor():
+    """Size the default executor used by asyncio.to_thread for blocking LLM SDK calls"""
+    from concurrent.futures import ThreadPoolExecutor
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=int(os.getenv('LLM_THREAD_POOL', '128')), thread_name_prefix='llm')
+    )
+
+async def _init_and_warm_llm_provider():
+    """Build the provider, then send a minimal probe so the first user request skips cold start"""
+    await asyncio.to_thread(_init_llm_provider)
+    if llm_provider is not None:
+        await llm_provider.warmup()
+
+@app.on_event("startup")
+async def prewarm_llm_provider():
+    """Initialize and warm the LLM provider in the background so startup is not held up by it"""
+    app.state.llm_provider_init = asyncio.create_task(_init_and_warm_llm_provider())
+    # Load the shared MiniLM model too; cross-document pre-ranking embeds sections with it
+    app.state.embedder_init = asyncio.create_task(asyncio.to_thread(get_embedding_service))
+    # Load the search encoder now so the first selection/podcast/recommendation request does not pay for it
+    app.state.encoder_init = asyncio.create_task(asyncio.to_thread(get_sentence_transformer))
+
+# Recommendation index + section metadata persisted across restarts; bump when either layout changes
+SEARCH_INDEX_SCHEMA_VERSION = 2  # 2: inner-product index over normalized vectors
+FAISS_INDEX_PATH = DATA_DIR / "faiss.index"
+META_PATH = DATA_DIR / "meta.npz"
+
+def _replace_durably(tmp_path: Path, path: Path):
+    """fsync a fully written temp file, then atomically rename it over path"""
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_search_index():
+    """Write the FAISS index and metadata columns (meta.npz is renamed last: it marks a complete pair)"""
+    index_tmp = FAISS_INDEX_PATH.with_suffix('.index.tmp')
+    meta_tmp = META_PATH.with_suffix('.npz.tmp')
+    index.write(str(index_tmp))
+    with open(meta_tmp, 'wb') as f:
+        metadata.save(f, schema_version=SEARCH_INDEX_SCHEMA_VERSION, ntotal=index.ntotal)
+    _replace_durably(index_tmp, FAISS_INDEX_PATH)
+    _replace_durably(meta_tmp, META_PATH)
+
+def _without_documents(rec_index: RecommendationIndex, meta: MetaStore, doc_ids: Set[str], keep: bool = False):
+    """(index, metadata) with the rows of doc_ids removed (or, with keep=True, only those kept);
+    None when no row changes"""
+    codes = np.array([code for code, doc_id in enumerate(meta.doc_ids) if doc_id in doc_ids], dtype=np.int32)
+    rows = np.nonzero(np.isin(meta.doc_code, codes) == keep)[0]
+    if len(rows) == len(meta):
+        return None
+    return rec_index.subset(rows), meta.subset(rows)
+
+def load_search_index():
+    """Restore the FAISS index and metadata saved at the last shutdown, if they match this schema;
+    sections of documents deleted since then are dropped"""
+    global index, metadata
+    if not (FAISS_INDEX_PATH.exists() and META_PATH.exists()):
+        return
+    try:
+        with np.load(META_PATH, allow_pickle=True) as data:
+            if int(data['schema_version']) != SEARCH_INDEX_SCHEMA_VERSION:
+                print("⚠️ Persisted search index has an old schema, rebuilding from uploads")
+                return
+            loaded_metadata = MetaStore.load(data)
+            ntotal = int(data['ntotal'])
+        loaded_index = RecommendationIndex.read(str(FAISS_INDEX_PATH))
+        if loaded_index.ntotal != ntotal or len(loaded_metadata) != ntotal:
+            print("⚠️ Persisted search index and metadata disagree, ignoring them")
+            return
+        pruned = _without_documents(loaded_index, loaded_metadata, db.active_document_ids(), keep=True)
+        if pruned is not None:
+            print(f"🧹 Dropped {ntotal - len(pruned[1])} sections of deleted documents from the search index")
+            loaded_index, loaded_metadata = pruned
+        index, metadata = loaded_index, loaded_metadata
+        print(f"✅ Loaded search index: {len(metadata)} sections from {len(metadata.doc_ids)} documents")
+    except Exception as e:
+        print(f"⚠️ Failed to load persisted search index: {e}")
+
+async def forget_documents(doc_ids: Iterable[str]):
+    """Remove the sections of deleted documents from the index and metadata"""
+    global index, metadata
+    async with _index_lock:
+        pruned = await run_in_threadpool(_without_documents, index, metadata, set(doc_ids))
+        if pruned is not None:
+            index, metadata = pruned
+
+async def reconcile_search_index():
+    """Drop sections of every document the database no longer lists as active"""
+    global index, metadata
+    async with _index_lock:
+        active_ids = await run_in_threadpool(db.active_document_ids)
+        pruned = await run_in_threadpool(_without_documents, index, metadata, active_ids, True)
+        if pruned is not None:
+            index, metadata = pruned
+
+# Document delete routes reach this through request.app.state (they cannot import main)
+app.state.forget_documents = forget_documents
+
+@app.on_event("startup")
+async def restore_search_index():
+    """Reload the persisted index so restarts do not re-embed every PDF"""
+    await asyncio.to_thread(load_search_index)
+
+@app.on_event("shutdown")
+async def persist_search_index():
+    """Save the index and metadata for the next start"""
+    if len(metadata) == 0:
+        return
+    try:
+        await asyncio.to_thread(save_search_index)
+        print(f"💾 Saved search index ({len(metadata)} sections)")
+    except Exception as e:
+        print(f"⚠️ Failed to save search index: {e}")
+
+@app.on_event("shutdown")
+async def stop_pdf_pool():
+    """Stop the outline extraction workers"""
+    shutdown_pdf_pool()
+
+@app.on_event("shutdown")
+async def close_llm_provider():
+    """Release pooled LLM provider and cloud TTS connections"""
+    if llm_provider is not None:
+        await llm_provider.aclose()
+    await close_http_client()
+    await close_tts_http_client()
 
 try:
-    enhanced_llm_service = EnhancedLLMService()
+    enhanced_llm_service = get_enhanced_llm_service()
     print(f"✅ Enhanced LLM Service initialized")
 except Exception as e:
     print(f"⚠️ Enhanced LLM Service initialization failed: {e}")
@@ -227,64 +705,161 @@ except Exception as e:
 print(f"✅ Section Highlighter initialized")
 
 # Initialize smart upload handler
+smart_upload_handler = None
 try:
     smart_upload_handler = SmartUploadHandler(DOCS_DIR, db.db_path)
     print(f"✅ Smart Upload Handler initialized")
 except Exception as e:
     print(f"⚠️ Smart Upload Handler initialization failed: {e}")
 
-# Fix database file paths before cleanup
-try:
-    print("🔧 Fixing database file paths...")
-    import sqlite3
-    from pathlib import Path
+@app.on_event("shutdown")
+async def close_smart_upload_handler():
+    """Close the duplicate checker's database connection"""
+    if smart_upload_handler is not None:
+        smart_upload_handler.close()
 
-    # Get current working directory and docs directory
-    current_dir = Path.cwd()
-    docs_dir = current_dir / "backend" / "data" / "docs"
-
-    conn = sqlite3.connect(db.db_path)
-    cursor = conn.cursor()
-
-    # Get all documents with their current file paths
-    cursor.execute("SELECT id, filename, file_path FROM documents WHERE status != 'deleted'")
-    documents = cursor.fetchall()
-
-    fixed_count = 0
-    for doc_id, filename, current_path in documents:
-        # Check if current path is incorrect (contains old paths)
-        if "D:\\" in current_path or "backend\\data\\backend" in current_path:
-            # Create correct path
-            correct_path = docs_dir / filename
-            if correct_path.exists():
-                cursor.execute("UPDATE documents SET file_path = ? WHERE id = ?", (str(correct_path), doc_id))
-                fixed_count += 1
-                print(f"  ✅ Fixed path for: {filename}")
-
-    conn.commit()
-    conn.close()
-
-    if fixed_count > 0:
-        print(f"🔧 Fixed {fixed_count} file paths in database")
-    else:
-        print("✅ All file paths are correct")
+def fix_database_paths():
+    """Rewrite stale (Windows / doubled backend) document paths to the docs directory"""
+    try:
+        print("🔧 Fixing database file paths...")
+        import sqlite3
+
+        # Get current working directory and docs directory
+        current_dir = Path.cwd()
+        docs_dir = current_dir / "backend" / "data" / "docs"
+
+        conn = sqlite3.connect(db.db_path)
+        cursor = conn.cursor()
+
+        # Get all documents with their current file paths
+        cursor.execute("SELECT id, filename, file_path FROM documents WHERE status != 'deleted'")
+        documents = cursor.fetchall()
+
+        fixed_count = 0
+        for doc_id, filename, current_path in documents:
+            # Check if current path is incorrect (contains old paths)
+            if "D:\\" in current_path or "backend\\data\\backend" in current_path:
+                # Create correct path
+                correct_path = docs_dir / filename
+                if correct_path.exists():
+                    cursor.execute("UPDATE documents SET file_path = ? WHERE id = ?", (str(correct_path), doc_id))
+                    fixed_count += 1
+                    print(f"  ✅ Fixed path for: {filename}")
+
+        conn.commit()
+        conn.close()
+
+        if fixed_count > 0:
+            print(f"🔧 Fixed {fixed_count} file paths in database")
+        else:
+            print("✅ All file paths are correct")
 
-except Exception as e:
-    print(f"⚠️ File path fix failed: {e}")
+    except Exception as e:
+        print(f"⚠️ File path fix failed: {e}")
 
-# Run duplicate PDF cleanup on startup (with safety checks)
-try:
-    print("🧹 Running duplicate PDF cleanup...")
-    cleanup_stats = run_duplicate_cleanup(db, DOCS_DIR)
-    if cleanup_stats['files_removed'] > 0:
-        print(f"🎉 Removed {cleanup_stats['files_removed']} duplicate PDFs")
-    else:
-        print("✅ No duplicate PDFs found")
-except Exception as e:
-    print(f"⚠️ Duplicate cleanup failed: {e}")
+def cleanup_duplicate_pdfs():
+    """Duplicate PDF cleanup (with safety checks)"""
+    try:
+        print("🧹 Running duplicate PDF cleanup...")
+        cleanup_stats = run_duplicate_cleanup(db, DOCS_DIR)
+        if cleanup_stats['files_removed'] > 0:
+            print(f"🎉 Removed {cleanup_stats['files_removed']} duplicate PDFs")
+        else:
+            print("✅ No duplicate PDFs found")
+    except Exception as e:
+        print(f"⚠️ Duplicate cleanup failed: {e}")
+
+# Duplicate cleanup and cache expiry run at most once per interval (tracked across restarts by a marker file)
+DUPLICATE_CLEANUP_INTERVAL = float(os.getenv("DUPLICATE_CLEANUP_INTERVAL_HOURS", "24")) * 3600
+DUPLICATE_CLEANUP_MARKER = DATA_DIR / ".last_duplicate_cleanup"
+
+async def _maintenance_loop():
+    """Fix stale DB paths once, then run the duplicate cleanup and cache expiry whenever it is due"""
+    await run_in_threadpool(fix_database_paths)
+    while True:
+        try:
+            last_run = DUPLICATE_CLEANUP_MARKER.stat().st_mtime
+        except OSError:
+            last_run = 0
+        due_in = last_run + DUPLICATE_CLEANUP_INTERVAL - time.time()
+        if due_in > 0:
+            await asyncio.sleep(due_in)
+            continue
+        await run_in_threadpool(cleanup_duplicate_pdfs)
+        DUPLICATE_CLEANUP_MARKER.touch()
+        # The cleanup soft-deletes rows; their sections must not be recommended any more
+        await reconcile_search_index()
+        try:
+            purged = await run_in_threadpool(purge_expired_llm_cache)
+            if purged:
+                print(f"🧹 Purged {purged} expired LLM cache entries")
+        except Exception as e:
+            print(f"⚠️ LLM cache purge failed: {e}")
+        try:
+            removed = await run_in_threadpool(_prune_pdf_text_cache)
+            if removed:
+                print(f"🧹 Removed {removed} orphaned PDF text sidecars")
+        except Exception as e:
+            print(f"⚠️ PDF text cache prune failed: {e}")
+
+@app.on_event("startup")
+async def start_maintenance():
+    """Run DB/file maintenance in the background (first worker only) so startup does not wait on it"""
+    if os.getenv("WORKER_INDEX", "0") == "0":
+        app.state.maintenance = asyncio.create_task(_maintenance_loop())
+
+@app.on_event("shutdown")
+async def stop_maintenance():
+    task = getattr(app.state, 'maintenance', None)
+    if task is not None:
+        task.cancel()
 
 # Enhanced PDF processing function with better integration
-async def process_pdf(job_id: str, client_id: str, file_path: str, pdf_type: str, persona: str = None, job: str = None):
+async def precompute_cross_document_connections(job_id: str, outline: List[Dict], persona: str, job: str):
+    """Background pass: connections from the new document's headings to sections of the other documents"""
+    other_rows = np.nonzero(metadata.doc_code != metadata.code_of(job_id))[0][:20]
+    other_sections = [
+        {'document_name': Path(metadata.file_path[row]).name, 'content': metadata.text[row]}
+        for row in other_rows
+    ]
+    if not other_sections:
+        return
+    pairs = [
+        (sec['heading'], other_sections, persona, job)
+        for sec in outline[:10] if sec.get('heading')
+    ]
+    try:
+        await llm_provider.find_cross_document_connections_bulk(pairs)
+        print(f"✅ Precomputed cross-document connections for {len(pairs)} sections of {job_id}")
+    except Exception as e:
+        print(f"⚠️ Cross-document precompute failed for {job_id}: {e}")
+
+def load_cached_outline(file_hash: Optional[str]):
+    """Outline previously extracted from a PDF with this content hash, or None"""
+    if not file_hash:
+        return None
+    try:
+        with open(OUTLINE_CACHE_DIR / f"{file_hash}.json", 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+def cache_outline(file_hash: Optional[str], outline: List[Dict]):
+    """Keep an extracted outline under the PDF's content hash (atomic write)"""
+    if not file_hash:
+        return
+    path = OUTLINE_CACHE_DIR / f"{file_hash}.json"
+    tmp_path = path.with_name(f"{file_hash}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(outline, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not cache outline: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+async def process_pdf(job_id: str, client_id: str, file_path: str, pdf_type: str, persona: str = None, job: str = None,
+                      file_hash: Optional[str] = None):
     print(f"Processing {pdf_type} job {job_id} for client {client_id}")
 
     try:
@@ -295,10 +870,14 @@ async def process_pdf(job_id: str, client_id: str, file_path: str, pdf_type: str
             "data": {"percent": 10, "message": "Starting PDF extraction..."}
         }, client_id)
 
-        # 1A: Extract outline (headings, pages, text)
-        processor = HighPerformancePDFProcessor()
-        result = processor.process_single_pdf(Path(file_path), Path('data'))
-        outline = result.get('outline', [])
+        # 1A: Extract outline (headings, pages, text) in the PDF worker processes,
+        # unless this exact file (by the upload handler's content hash) was parsed before
+        outline = await run_in_threadpool(load_cached_outline, file_hash)
+        if outline is None:
+            outline = await asyncio.get_running_loop().run_in_executor(get_pdf_pool(), extract_outline, file_path)
+            await run_in_threadpool(cache_outline, file_hash, outline)
+        else:
+            print(f"♻️ Reusing cached outline for {Path(file_path).name}")
 
         await manager.send_message({
             "type": "progress",
@@ -306,31 +885,33 @@ async def process_pdf(job_id: str, client_id: str, file_path: str, pdf_type: str
             "data": {"percent": 30, "message": f"Extracted {len(outline)} sections"}
         }, client_id)
 
-        # Enhanced embedding and FAISS indexing
+        # Enhanced embedding and FAISS indexing: one batched encode and a single index.add
+        # Create more comprehensive text for embedding (only non-empty sections are indexed)
+        sections = [(sec, f"{sec.get('heading', '')} {sec.get('text', '')}") for sec in outline]
+        sections = [(sec, text) for sec, text in sections if text.strip()]
+        # Sections of this document already in the (possibly restored) index are not embedded again
+        indexed_texts = {metadata.text[row] for row in metadata.rows_for(job_id)}
+        sections = [(sec, text) for sec, text in sections if text not in indexed_texts]
         sections_added = 0
-        for sec in outline:
+        if sections:
             try:
-                sec_id = str(uuid.uuid4())
-                # Create more comprehensive text for embedding
-                section_text = f"{sec.get('heading', '')} {sec.get('text', '')}"
-
-                if section_text.strip():  # Only process non-empty sections
-                    embedding = get_sentence_transformer().encode(section_text)
-                    index.add(np.array([embedding]).astype('float32'))
+                texts = [text for _, text in sections]
+                embeddings = await run_in_threadpool(encode_texts_cached, texts)
+                async with _index_lock:
+                    index.add(embeddings)
 
-                    metadata.append({
-                        'id': sec_id,
+                    metadata.extend({
+                        'id': str(uuid.uuid4()),
                         'doc_id': job_id,
                         'page': sec.get('page', 1),
                         'heading': sec.get('heading', 'Untitled Section'),
-                        'text': section_text,
+                        'text': text,
                         'level': sec.get('level', 'unknown'),
                         'file_path': file_path
-                    })
-                    sections_added += 1
+                    } for sec, text in sections)
+                sections_added = len(sections)
             except Exception as e:
-                print(f"Error processing section: {e}")
-                continue
+                print(f"Error processing sections: {e}")
 
         await manager.send_message({
             "type": "progress",
@@ -338,6 +919,19 @@ async def process_pdf(job_id: str, client_id: str, file_path: str, pdf_type: str
             "data": {"percent": 60, "message": f"Indexed {sections_added} sections"}
         }, client_id)
 
+        if CROSS_DOC_BATCH_PRECOMPUTE:
+            # Load this document's section vectors (already in emb_cache) for the batch shortlisting
+            try:
+                await asyncio.to_thread(section_index.add_many, [metadata.text[row] for row in metadata.rows_for(job_id)])
+            except Exception as e:
+                print(f"⚠️ Section embedding precompute failed: {e}")
+
+        if CROSS_DOC_BATCH_PRECOMPUTE and pdf_type == 'context' and persona and job and llm_provider:
+            # Batch jobs can take hours to finish, so this runs detached from the upload
+            task = asyncio.create_task(precompute_cross_document_connections(job_id, outline, persona, job))
+            _precompute_tasks.add(task)
+            task.add_done_callback(_precompute_tasks.discard)
+
         # 1B: Enhanced relevance and insights processing
         insights = []
         relevance_data = []
@@ -358,7 +952,9 @@ async def process_pdf(job_id: str, client_id: str, file_path: str, pdf_type: str
                 print(f"Error generating insights: {e}")
                 # Fallback to 1B brain
                 try:
-                    brain = IntelligentPDFBrain()
+                    if intelligent_brain is None:
+                        raise RuntimeError("Intelligent PDF Brain not available")
+                    brain = intelligent_brain
                     temp_collection_path = Path('data/temp_collection')
                     temp_collection_path.mkdir(exist_ok=True)
                     shutil.copy(file_path, temp_collection_path / Path(file_path).name)
@@ -428,16 +1024,14 @@ async def upload_context_files(
         temp_file_path = DOCS_DIR / f"temp_{uuid.uuid4()}_{file.filename}"
 
         # Save the uploaded file temporarily
-        file_content = await file.read()
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(file_content)
+        await save_upload(file, temp_file_path)
 
         # Use smart upload handler for duplicate detection and processing
         try:
             print(f"📚 Processing bulk upload with smart handler: {file.filename}")
 
-            upload_result = smart_upload_handler.handle_upload(
-                temp_file_path, file.filename, user_id, persona, job
+            upload_result = await run_in_threadpool(
+                smart_upload_handler.handle_upload, temp_file_path, file.filename, user_id, persona, job
             )
 
             if upload_result['is_duplicate']:
@@ -454,17 +1048,16 @@ async def upload_context_files(
 
                 # Start background processing for new files
                 actual_file_path = DOCS_DIR / filename_with_id
-                background_tasks.add_task(process_pdf, job_id, user_id, str(actual_file_path), 'context', persona, job)
+                background_tasks.add_task(process_pdf, job_id, user_id, str(actual_file_path), 'context', persona, job,
+                                          file_hash=upload_result.get('file_hash'))
 
             # Clean up temporary file
-            if temp_file_path.exists():
-                temp_file_path.unlink()
+            await remove_file(temp_file_path)
 
         except Exception as e:
             print(f"⚠️ Failed to process bulk document {file.filename}: {e}")
             # Clean up temporary file on error
-            if temp_file_path.exists():
-                temp_file_path.unlink()
+            await remove_file(temp_file_path)
             # Continue with next file even if one fails
 
     return JSONResponse(
@@ -495,16 +1088,14 @@ async def upload_active_file(
     file_path = DOCS_DIR / filename_with_id
 
     # Save the uploaded file temporarily
-    file_content = await file.read()
-    with open(file_path, "wb") as buffer:
-        buffer.write(file_content)
+    await save_upload(file, file_path)
 
     # Use smart upload handler for duplicate detection and processing
     try:
         print(f"📚 Processing upload with smart handler: {file.filename}")
 
-        upload_result = smart_upload_handler.handle_upload(
-            file_path, file.filename, user_id, persona, job
+        upload_result = await run_in_threadpool(
+            smart_upload_handler.handle_upload, file_path, file.filename, user_id, persona, job
         )
 
         if upload_result['is_duplicate']:
@@ -512,8 +1103,7 @@ async def upload_active_file(
             existing_doc = upload_result['existing_document']
 
             # Remove temporary file since we're using existing one
-            if file_path.exists():
-                file_path.unlink()
+            await remove_file(file_path)
 
             # Return existing document info
             return JSONResponse(
@@ -531,21 +1121,22 @@ async def upload_active_file(
             print(f"✅ New file processed: {file.filename}")
             job_id = upload_result['document_id']
             filename_with_id = upload_result['filename']
+            file_hash = upload_result.get('file_hash')
 
             # Remove temporary file since smart handler already processed it
-            if file_path.exists():
-                file_path.unlink()
-                print(f"🗑️ Removed temporary file: {file_path.name}")
+            await remove_file(file_path)
+            print(f"🗑️ Removed temporary file: {file_path.name}")
 
             print(f"✅ New document processed successfully: {filename_with_id}")
 
             # Verify it was stored
-            all_docs = db.get_all_documents(client_id=user_id)
+            all_docs = await run_in_threadpool(db.get_all_documents, client_id=user_id)
             print(f"📊 Total documents in database after upload: {len(all_docs)}")
 
         # Start the background processing task for this file
         actual_file_path = DOCS_DIR / filename_with_id
-        background_tasks.add_task(process_pdf, job_id, user_id, str(actual_file_path), 'current', persona, job)
+        background_tasks.add_task(process_pdf, job_id, user_id, str(actual_file_path), 'current', persona, job,
+                                  file_hash=file_hash)
 
         return JSONResponse(
             status_code=202,
@@ -563,8 +1154,7 @@ async def upload_active_file(
         traceback.print_exc()
 
         # Clean up temporary file on error
-        if file_path.exists():
-            file_path.unlink()
+        await remove_file(file_path)
 
         raise HTTPException(status_code=500, detail=f"Upload processing failed: {str(e)}")
 
@@ -637,57 +1227,50 @@ async def get_recommendations(
         if persona and job:
             current_content += f" Context: {persona} working on {job}"
 
-        # Encode query
-        query_embedding = get_sentence_transformer().encode(current_content)
+        # Encode query (cached per formatted query, so persona/job variants are distinct entries);
+        # a miss runs the encoder, so it goes to the threadpool instead of blocking the loop
+        query_bytes = await run_in_threadpool(_encode_query, current_content)
+        query_embedding = np.frombuffer(query_bytes, dtype=np.float32).reshape(1, -1)
 
-        # Search FAISS index for semantic similarity
+        # Search FAISS index for semantic (cosine) similarity
         k = min(10, len(metadata))  # Get top 10 candidates
-        distances, indices = index.search(np.array([query_embedding]).astype('float32'), k)
+        scores, indices = index.search(query_embedding, k)
 
-        # Separate same-document and cross-document recommendations
-        same_document_recommendations = []
-        cross_document_recommendations = []
-        
-        # Track unique documents for cross-document intelligence
-        document_texts = {}
-        
-        for i, idx in enumerate(indices[0]):
-            if idx < len(metadata):
-                meta = metadata[idx]
-                relevance = float(1.0 - distances[0][i])
-                
-                # Skip very low relevance matches
-                if relevance < 0.3:
-                    continue
-                
-                recommendation = {
-                    "id": meta['id'],
-                    "title": meta['heading'],
-                    "snippet": meta['text'][:200] + "..." if len(meta['text']) > 200 else meta['text'],
-                    "page": meta['page'],
-                    "relevance": relevance,
-                    "documentId": meta['doc_id'],
-                    "documentName": f"Document {meta['doc_id']}",
-                    "bbox": None,  # Will be populated by highlighting system
-                    "file_path": meta.get('file_path', '')
-                }
-                
-                if meta['doc_id'] == document_id:
-                    same_document_recommendations.append(recommendation)
-                else:
-                    cross_document_recommendations.append(recommendation)
-                    # Store document content for intelligent analysis
-                    if meta['doc_id'] not in document_texts:
-                        document_texts[meta['doc_id']] = []
-                    document_texts[meta['doc_id']].append(meta['text'])
+        # Score, threshold and split same-document vs cross-document hits (still in FAISS rank order)
+        ids = indices[0]
+        relevance, same_doc, cross_doc = partition_hits(
+            scores[0], ids, metadata.doc_code, metadata.code_of(document_id), 0.4
+        )
+        same_rows = np.nonzero(same_doc)[0]
+        cross_rows = np.nonzero(cross_doc)[0]
+
+        def recommendation(row):
+            idx = ids[row]
+            doc_id = metadata.doc_id_at(idx)
+            return {
+                "id": metadata.id[idx],
+                "title": metadata.heading[idx],
+                "snippet": metadata.snippet[idx],
+                "page": int(metadata.page[idx]),
+                "relevance": float(relevance[row]),
+                "documentId": doc_id,
+                "documentName": f"Document {doc_id}",
+                "bbox": None,  # Will be populated by highlighting system
+                "file_path": metadata.file_path[idx]
+            }
+
+        # Only materialize the hits that can be returned (cross-document top 5 feed the brain)
+        same_document_recommendations = [recommendation(row) for row in same_rows[:3]]
+        cross_document_recommendations = [recommendation(row) for row in cross_rows[:5]]
 
         # Enhanced cross-document intelligence using the intelligent PDF brain
         enhanced_cross_document = []
         if include_cross_document and cross_document_recommendations and persona and job:
             try:
-                # Initialize the intelligent PDF brain
-                from app.utils.intelligent_pdf_brain import IntelligentPDFBrain
-                brain = IntelligentPDFBrain()
+                # Shared intelligent PDF brain (built once at startup)
+                if intelligent_brain is None:
+                    raise RuntimeError("Intelligent PDF Brain not available")
+                brain = intelligent_brain
                 
                 # Score cross-document sections using intelligent analysis
                 for rec in cross_document_recommendations[:5]:  # Limit to top 5 for processing
@@ -728,7 +1311,7 @@ async def get_recommendations(
         result = {
             "recommendations": same_document_recommendations[:3],
             "cross_document_sections": enhanced_cross_document[:3] if include_cross_document else [],
-            "total_found": len(same_document_recommendations) + len(cross_document_recommendations),
+            "total_found": len(same_rows) + len(cross_rows),
             "intelligence_enabled": include_cross_document and persona and job
         }
         
@@ -749,6 +1332,15 @@ async def get_insights(
     job: str = Query(None)
 ):
     """Generate comprehensive AI-powered insights for a specific document and page using actual PDF content"""
+    # Bursts of identical requests share one PDF extraction + LLM call
+    return await single_flight(
+        ('insights', document_id, page, persona, job),
+        lambda: _generate_insights(document_id, page, persona, job)
+    )
+
+
+async def _generate_insights(document_id: str, page: int, persona: Optional[str], job: Optional[str]):
+    """Insights for one (document, page, persona, job); see get_insights"""
     try:
         if not enhanced_llm_service:
             print("⚠️ Enhanced LLM service not available, returning mock insights for testing")
@@ -786,7 +1378,7 @@ async def get_insights(
             return {"insights": mock_insights, "mock": True}
 
         # Get the actual document from database
-        document = db.get_document_by_id(document_id)
+        document = await run_in_threadpool(db.get_document_by_id, document_id)
         if not document:
             return {"insights": [], "error": "Document not found"}
 
@@ -794,8 +1386,6 @@ async def get_insights(
         page_content = ""
         full_pdf_content = ""
         try:
-            import fitz  # PyMuPDF
-
             # Handle both absolute and relative paths
             pdf_path = Path(document.file_path)
             if not pdf_path.is_absolute():
@@ -808,24 +1398,9 @@ async def get_insights(
             print(f"🔍 File exists: {pdf_path.exists()}")
 
             if pdf_path.exists():
-                pdf_doc = fitz.open(pdf_path)
-                total_pages = len(pdf_doc)
-                
-                # Extract content from ALL pages for comprehensive analysis
-                all_pages_content = []
-                for page_num in range(total_pages):
-                    page_text = pdf_doc[page_num].get_text()
-                    if page_text.strip():  # Only add non-empty pages
-                        all_pages_content.append(f"=== Page {page_num + 1} ===\n{page_text}")
-                
-                # Get current page content specifically
-                if page <= total_pages:
-                    current_page = pdf_doc[page - 1]
-                    page_content = current_page.get_text()
-                
-                # Combine all content with current page highlighted
-                full_pdf_content = "\n\n".join(all_pages_content)
-                
+                # Leading document content + current page (cached per file version), off the event loop
+                total_pages, full_pdf_content, page_content = await run_in_threadpool(pdf_context, pdf_path, page)
+
                 # Create comprehensive content for LLM analysis
                 full_content = f"""DOCUMENT: {document.original_name}
 TOTAL PAGES: {total_pages}
@@ -835,16 +1410,15 @@ CURRENT PAGE CONTENT:
 {page_content}
 
 COMPLETE DOCUMENT CONTENT:
-{full_pdf_content[:15000]}{'...' if len(full_pdf_content) > 15000 else ''}"""
-                
-                pdf_doc.close()
-                print(f"📄 Extracted full PDF: {total_pages} pages, {len(full_pdf_content)} characters total")
+{full_pdf_content[:PDF_CONTEXT_CHARS]}{'...' if len(full_pdf_content) > PDF_CONTEXT_CHARS else ''}"""
+
+                print(f"📄 Extracted PDF: {total_pages} pages, {len(full_pdf_content)} characters of context")
             else:
                 print(f"⚠️ PDF file not found: {pdf_path}")
                 # Fallback: try to get content from FAISS metadata
-                matching_sections = [meta for meta in metadata if meta.get('doc_id') == document_id]
-                if matching_sections:
-                    page_content = "\n".join([meta.get('text', '') for meta in matching_sections if meta.get('page') == page])
+                matching_rows = metadata.rows_for(document_id)
+                if len(matching_rows):
+                    page_content = "\n".join(metadata.text[row] for row in matching_rows[metadata.page[matching_rows] == page])
                     full_content = f"Page {page} Content:\n{page_content}"
                 else:
                     full_content = f"Document {document.original_name}, Page {page} - Content extraction failed"
@@ -852,9 +1426,9 @@ COMPLETE DOCUMENT CONTENT:
         except Exception as e:
             print(f"Error extracting PDF content: {e}")
             # Fallback to FAISS metadata if PDF extraction fails
-            matching_sections = [meta for meta in metadata if meta.get('doc_id') == document_id]
-            if matching_sections:
-                page_content = "\n".join([meta.get('text', '') for meta in matching_sections if meta.get('page') == page])
+            matching_rows = metadata.rows_for(document_id)
+            if len(matching_rows):
+                page_content = "\n".join(metadata.text[row] for row in matching_rows[metadata.page[matching_rows] == page])
                 full_content = f"Page {page} Content:\n{page_content}"
             else:
                 full_content = f"Document: {document.original_name}, Page {page} - Unable to extract content"
@@ -996,17 +1570,15 @@ async def generate_podcast(request: Request):
                     # Try to extract content from the PDF
                     pdf_path = Path(doc.file_path)
                     if pdf_path.exists():
-                        import PyPDF2
-                        with open(pdf_path, 'rb') as file:
-                            pdf_reader = PyPDF2.PdfReader(file)
-                            if page <= len(pdf_reader.pages):
-                                page_content = pdf_reader.pages[page - 1].extract_text()
-                                content = page_content[:2000]  # Limit for reasonable audio length
-                                title = f"{doc.original_name} - Page {page}"
-                                print(f"📄 Using PDF content ({len(content)} chars)")
-                            else:
-                                content = f"Content from page {page} of {doc.original_name}"
-                                title = f"{doc.original_name} - Page {page}"
+                        # PyMuPDF page text, cached per file version (shared with insights/selection)
+                        page_content = await run_in_threadpool(pdf_page_text, pdf_path, page)
+                        if page_content is not None:
+                            content = page_content[:2000]  # Limit for reasonable audio length
+                            title = f"{doc.original_name} - Page {page}"
+                            print(f"📄 Using PDF content ({len(content)} chars)")
+                        else:
+                            content = f"Content from page {page} of {doc.original_name}"
+                            title = f"{doc.original_name} - Page {page}"
                     else:
                         content = f"Document content from {doc.original_name}, page {page}"
                         title = f"{doc.original_name} - Page {page}"
@@ -1023,45 +1595,81 @@ async def generate_podcast(request: Request):
         if persona and job:
             content = f"As a {persona} working on {job}, here's what you need to know: {content}"
 
-        # Generate audio using Azure TTS (now with proper audio_config)
-        print(f"🔊 Generating audio with Azure TTS...")
-        try:
-            audio_data = await tts_service.generate_podcast(content, title)
+        # Identical concurrent requests share one synthesis
+        return await single_flight(
+            ('podcast', document_id, page, hash(content)),
+            lambda: _synthesize_podcast(content, title, document_id, page)
+        )
 
-            # Save to temporary file
-            filename = f"podcast_{document_id}_{page}_{hash(content) % 10000}.wav"
-            audio_file = await tts_service.save_audio_file(audio_data, filename)
+    except Exception as e:
+        print(f"❌ Error generating podcast: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-            print(f"✅ Podcast generated: {audio_file}")
-            return {"audioUrl": f"/api/audio/{Path(audio_file).name}"}
 
-        except Exception as tts_error:
-            print(f"⚠️ Azure TTS failed: {tts_error}")
-            print(f"🔄 Using demo audio as fallback...")
+async def _synthesize_podcast(content: str, title: str, document_id: str, page: int):
+    """Generate and save the podcast audio (falls back to the demo audio if TTS fails)"""
+    # Generate audio using Azure TTS (now with proper audio_config)
+    print(f"🔊 Generating audio with Azure TTS...")
+    try:
+        audio_data = await tts_service.generate_podcast(content, title)
 
-            # Fallback to demo audio for hackathon
-            return {
-                "audioUrl": "/api/audio/demo_podcast.mp3",
-                "title": title,
-                "content_length": len(content),
-                "status": "fallback_demo",
-                "message": f"Using demo audio - Azure TTS error: {str(tts_error)}"
-            }
+        # Save to temporary file
+        filename = f"podcast_{document_id}_{page}_{hash(content) % 10000}.wav"
+        audio_file = await tts_service.save_audio_file(audio_data, filename)
 
-    except Exception as e:
-        print(f"❌ Error generating podcast: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        print(f"✅ Podcast generated: {audio_file}")
+        return {"audioUrl": f"/api/audio/{Path(audio_file).name}"}
+
+    except Exception as tts_error:
+        print(f"⚠️ Azure TTS failed: {tts_error}")
+        print(f"🔄 Using demo audio as fallback...")
+
+        # Fallback to demo audio for hackathon
+        return {
+            "audioUrl": "/api/audio/demo_podcast.mp3",
+            "title": title,
+            "content_length": len(content),
+            "status": "fallback_demo",
+            "message": f"Using demo audio - Azure TTS error: {str(tts_error)}"
+        }
 
 
 # Old endpoints removed - now using proper API routes in api_routes.py
 
+def conditional_file_response(request: Request, path: Path, media_type: str, headers: Dict[str, str]):
+    """
+    FileResponse (sent with sendfile) carrying a strong ETag from (size, mtime) and Last-Modified.
+    Answers 304 with no body when the client's If-None-Match / If-Modified-Since still matches.
+    """
+    st = path.stat()
+    etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    validators = {"ETag": etag, "Last-Modified": formatdate(st.st_mtime, usegmt=True)}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    else:
+        not_modified = False
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                not_modified = int(st.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                pass
+
+    if not_modified:
+        return Response(status_code=304, headers={**validators, "Cache-Control": headers.get("Cache-Control", "")})
+    return FileResponse(path, media_type=media_type, headers={**headers, **validators})
+
+
 @app.get("/api/files/{filename}")
 @app.head("/api/files/{filename}")
-async def get_pdf_file(filename: str):
+async def get_pdf_file(filename: str, request: Request):
     """Serve uploaded PDF files for PDF.js and Adobe PDF Embed API with proper CORS headers"""
     file_path = DOCS_DIR / filename
     if file_path.exists():
-        return FileResponse(
+        return conditional_file_response(
+            request,
             file_path,
             media_type="application/pdf",
             headers={
@@ -1080,13 +1688,14 @@ async def get_pdf_file(filename: str):
 
 
 @app.get("/api/audio/{filename}")
-async def get_audio(filename: str):
+async def get_audio(filename: str, request: Request):
     """Serve generated audio files with proper headers for web playback"""
     # Check temp_audio directory first (for generated files)
     audio_path = DATA_DIR / "temp_audio" / filename
     if audio_path.exists():
         media_type = "audio/wav" if filename.endswith('.wav') else "audio/mpeg"
-        return FileResponse(
+        return conditional_file_response(
+            request,
             audio_path,
             media_type=media_type,
             headers={
@@ -1100,7 +1709,8 @@ async def get_audio(filename: str):
     demo_audio_path = DATA_DIR / "audio" / filename
     if demo_audio_path.exists():
         media_type = "audio/wav" if filename.endswith('.wav') else "audio/mpeg"
-        return FileResponse(
+        return conditional_file_response(
+            request,
             demo_audio_path,
             media_type=media_type,
             headers={
@@ -1181,68 +1791,74 @@ async def analyze_text_selection(request: TextSelectionAnalysisRequest):
 
         context = f"Document: {current_doc.original_name} (Page {request.page})"
 
-        # Generate insights for selected text
-        text_insights = await enhanced_llm_service.generate_text_selection_insights(
+        # Generate insights for selected text (independent of the search below, so it runs alongside it)
+        text_insights_task = asyncio.create_task(enhanced_llm_service.generate_text_selection_insights(
             request.selected_text, context, request.persona, request.job
-        )
-
-        related_sections = []
-        cross_document_sections = []
-
-        if request.include_cross_document:
-            # Get all indexed sections for cross-document search
-            all_sections = []
+        ))
 
-            # Query FAISS index for similar sections
-            if len(metadata) > 0:
-                try:
-                    # Use existing FAISS search logic but enhance with LLM
-                    import numpy as np
-                    from sentence_transformers import SentenceTransformer
-
-                    # Get embedding for selected text
-                    query_embedding = get_sentence_transformer().encode([selected_text])
-
-                    # Search FAISS index
-                    k = min(20, len(metadata))  # Get more candidates for LLM filtering
-                    distances, indices = index.search(query_embedding.astype('float32'), k)
-
-                    # Prepare sections for LLM analysis
-                    candidate_sections = []
-                    for i, idx in enumerate(indices[0]):
-                        if idx < len(metadata):
-                            section_data = metadata[idx]
-                            candidate_sections.append({
-                                "section_id": i,
-                                "document_id": section_data.get("document_id"),
-                                "document_name": section_data.get("document_name"),
-                                "title": section_data.get("section_title", "Untitled"),
-                                "content": section_data.get("text", ""),
-                                "page": section_data.get("page", 1),
-                                "faiss_score": float(1.0 / (1.0 + distances[0][i]))  # Convert distance to similarity
-                            })
+        try:
+            related_sections = []
+            cross_document_sections = []
 
-                    # Use LLM to find truly related sections
-                    related_sections = await enhanced_llm_service.find_related_sections(
-                        request.selected_text, candidate_sections, request.persona, request.job, max_results=5
-                    )
+            if request.include_cross_document:
+                # Get all indexed sections for cross-document search
+                all_sections = []
 
-                    # Separate current document vs cross-document sections
-                    for section in related_sections:
-                        if section.get("document_id") == request.document_id:
-                            # Same document - add to related sections
-                            pass  # Could add same-document sections here
-                        else:
-                            # Different document - add to cross-document sections
-                            cross_document_sections.append(section)
+                # Query FAISS index for similar sections
+                if len(metadata) > 0:
+                    try:
+                        # Use existing FAISS search logic but enhance with LLM
+                        # Get embedding for selected text (off the loop so the insights call keeps moving)
+                        query_embedding = await run_in_threadpool(encode_query, request.selected_text)
+
+                        # Search FAISS index
+                        k = min(20, len(metadata))  # Get more candidates for LLM filtering
+                        scores, indices = index.search(query_embedding, k)
+
+                        # Prepare sections for LLM analysis
+                        candidate_sections = []
+                        for i, idx in enumerate(indices[0]):
+                            if 0 <= idx < len(metadata):
+                                candidate_sections.append({
+                                    "section_id": i,
+                                    "document_id": metadata.doc_id_at(idx),
+                                    "document_name": Path(metadata.file_path[idx]).name,
+                                    "title": metadata.heading[idx] or "Untitled",
+                                    "content": metadata.text[idx],
+                                    "page": int(metadata.page[idx]),
+                                    "faiss_score": float(scores[0][i])  # Cosine similarity
+                                })
+
+                        # Use LLM to find truly related sections
+                        related_sections = await enhanced_llm_service.find_related_sections(
+                            request.selected_text, candidate_sections, request.persona, request.job, max_results=5
+                        )
+
+                        # Separate current document vs cross-document sections
+                        for section in related_sections:
+                            if section.get("document_id") == request.document_id:
+                                # Same document - add to related sections
+                                pass  # Could add same-document sections here
+                            else:
+                                # Different document - add to cross-document sections
+                                cross_document_sections.append(section)
 
-                except Exception as e:
-                    print(f"Error in cross-document search: {e}")
+                    except Exception as e:
+                        print(f"Error in cross-document search: {e}")
 
-        # Generate insights bulb content
-        insights_bulb = await enhanced_llm_service.generate_insights_bulb(
-            request.selected_text, related_sections[:3], request.persona, request.job
-        )
+            # Generate insights bulb content while the text insights call finishes
+            text_insights, insights_bulb = await asyncio.gather(
+                text_insights_task,
+                enhanced_llm_service.generate_insights_bulb(
+                    request.selected_text, related_sections[:3], request.persona, request.job
+                )
+            )
+        finally:
+            # Error paths leave the insights call unawaited: stop it, and mark a failure as retrieved
+            if not text_insights_task.done():
+                text_insights_task.cancel()
+            elif not text_insights_task.cancelled():
+                text_insights_task.exception()
 
         return {
             "selected_text": request.selected_text,
@@ -1285,8 +1901,6 @@ async def ask_gemini_selection(request: dict):
         # Extract context around the selected text
         context_text = ""
         try:
-            import fitz  # PyMuPDF
-
             # Handle both absolute and relative paths
             pdf_path = Path(document.file_path)
             if not pdf_path.is_absolute():
@@ -1294,10 +1908,8 @@ async def ask_gemini_selection(request: dict):
                 pdf_path = backend_dir / pdf_path
 
             if pdf_path.exists():
-                pdf_doc = fitz.open(pdf_path)
-                if page <= len(pdf_doc):
-                    current_page = pdf_doc[page - 1]
-                    full_page_text = current_page.get_text()
+                full_page_text = await run_in_threadpool(pdf_page_text, pdf_path, page)
+                if full_page_text is not None:
 
                     # Find the selected text in the page
                     selected_index = full_page_text.find(selected_text)
@@ -1309,8 +1921,6 @@ async def ask_gemini_selection(request: dict):
                     else:
                         # If exact match not found, use the selected text with some page context
                         context_text = f"Selected text: {selected_text}\n\nPage context:\n{full_page_text[:1000]}"
-
-                pdf_doc.close()
             else:
                 context_text = selected_text
 
@@ -1369,21 +1979,17 @@ async def generate_podcast(
         related_sections = []
         if include_related and len(metadata) > 0:
             try:
-                import numpy as np
-                from sentence_transformers import SentenceTransformer
-
-                query_embedding = get_sentence_transformer().encode([content[:500]])  # Use first 500 chars
+                query_embedding = encode_query(content[:500])  # Use first 500 chars
 
                 k = min(5, len(metadata))
-                distances, indices = index.search(query_embedding.astype('float32'), k)
+                scores, indices = index.search(query_embedding, k)
 
-                for i, idx in enumerate(indices[0]):
-                    if idx < len(metadata):
-                        section_data = metadata[idx]
+                for idx in indices[0]:
+                    if 0 <= idx < len(metadata):
                         related_sections.append({
-                            "title": section_data.get("section_title", "Section"),
-                            "content": section_data.get("text", "")[:200],
-                            "document_name": section_data.get("document_name", "Document")
+                            "title": metadata.heading[idx] or "Section",
+                            "content": metadata.text[idx][:200],
+                            "document_name": Path(metadata.file_path[idx]).name or "Document"
                         })
             except Exception as e:
                 print(f"Error getting related sections for podcast: {e}")
@@ -1425,6 +2031,58 @@ async def generate_podcast(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class InsightsBulbStreamRequest(BaseModel):
+    content: str
+    related_sections: List[Dict[str, Any]] = []
+    persona: str = None
+    job: str = None
+
+
+@app.post("/api/insights-bulb/stream")
+async def stream_insights_bulb(request: InsightsBulbStreamRequest):
+    """
+    Stream insights bulb entries as Server-Sent Events
+    Each insight is sent as soon as the LLM finishes generating it
+    """
+    if not enhanced_llm_service:
+        raise HTTPException(status_code=503, detail="Enhanced LLM service not available")
+
+    async def event_stream():
+        async for insight in enhanced_llm_service.stream_insights_bulb(
+            request.content, request.related_sections, request.persona, request.job
+        ):
+            yield f"data: {json.dumps(insight)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+class SnippetStreamRequest(BaseModel):
+    selected_text: str
+    related_sections: List[Dict[str, Any]]
+    persona: str = None
+    job: str = None
+
+
+@app.post("/api/snippets/stream")
+async def stream_snippets(request: SnippetStreamRequest):
+    """
+    Stream snippet text for the related sections as Server-Sent Events
+    Each event is flushed at a sentence boundary and carries the index of its section
+    """
+    if not llm_provider:
+        raise HTTPException(status_code=503, detail="LLM provider not available")
+
+    async def event_stream():
+        async for snippet in llm_provider.stream_snippets(
+            request.selected_text, request.related_sections, request.persona, request.job
+        ):
+            yield f"data: {json.dumps(snippet)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.get("/api/highlights/{document_id}")
 async def get_section_highlights(
     document_id: str,
@@ -1919,6 +2577,23 @@ async def delete_document_from_rag(document_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Supabase user ids allowed on /api/admin endpoints (comma-separated, as in middleware/auth.py)
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+
+def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    """Authenticated caller; in Supabase mode it must also be listed in ADMIN_USER_IDS"""
+    if USE_SUPABASE and current_user.get("sub") not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
+
+@app.post("/api/admin/clear-query-cache")
+async def clear_query_cache(current_user: dict = Depends(require_admin)):
+    """Drop cached recommendation query embeddings"""
+    cache_info = _encode_query.cache_info()
+    _encode_query.cache_clear()
+    return {"success": True, "cleared": cache_info.currsize}
+
+
 # Catch-all route for SPA routing (MUST be last)
 @app.get("/{path:path}")
 async def serve_frontend(path: str):
@@ -0,0 +1,131 @@
+"""
+Section Metadata Store
+Columnar (structure-of-arrays) storage for the metadata of every section in the
+recommendation index. Row i describes FAISS vector i. Numeric columns are NumPy
+arrays so recommendation filtering is vectorized; strings stay in plain lists.
+"""
+
+from typing import Dict, Iterable, Iterator
+
+import numpy as np
+
+COLUMNS = ('id', 'doc_id', 'page', 'heading', 'text', 'level', 'file_path')
+SNIPPET_CHARS = 200
+
+
+def make_snippet(text: str) -> str:
+    """Recommendation card snippet: the first SNIPPET_CHARS characters of a section"""
+    return text[:SNIPPET_CHARS] + "..." if len(text) > SNIPPET_CHARS else text
+
+
+class MetaStore:
+    """Section metadata as parallel columns; doc ids are interned to int32 codes"""
+
+    def __init__(self, capacity: int = 1024):
+        self.id = []
+        self.heading = []
+        self.text = []
+        self.snippet = []  # precomputed at ingest so queries do no string work
+        self.level = []
+        self.file_path = []
+        self.doc_ids = []  # distinct document ids, indexed by code
+        self._doc_codes = {}
+        self._page = np.empty(capacity, dtype=np.int32)
+        self._doc_code = np.empty(capacity, dtype=np.int32)
+        self.n = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def page(self) -> np.ndarray:
+        return self._page[:self.n]
+
+    @property
+    def doc_code(self) -> np.ndarray:
+        return self._doc_code[:self.n]
+
+    def code_of(self, doc_id: str) -> int:
+        """Interned code for a document id, -1 if the document has no sections"""
+        return self._doc_codes.get(doc_id, -1)
+
+    def doc_id_at(self, row: int) -> str:
+        return self.doc_ids[self._doc_code[row]]
+
+    def rows_for(self, doc_id: str) -> np.ndarray:
+        """Row ids of every section of a document"""
+        return np.nonzero(self.doc_code == self.code_of(doc_id))[0]
+
+    def _reserve(self, extra: int):
+        needed = self.n + extra
+        if needed <= len(self._page):
+            return
+        capacity = max(needed, 2 * len(self._page))
+        self._page = np.resize(self._page, capacity)
+        self._doc_code = np.resize(self._doc_code, capacity)
+
+    def extend(self, rows: Iterable[Dict]):
+        """Append rows given as dicts with the COLUMNS keys"""
+        rows = list(rows)
+        self._reserve(len(rows))
+        for row in rows:
+            code = self._doc_codes.get(row['doc_id'])
+            if code is None:
+                code = self._doc_codes[row['doc_id']] = len(self.doc_ids)
+                self.doc_ids.append(row['doc_id'])
+            self._page[self.n] = row.get('page', 1)
+            self._doc_code[self.n] = code
+            self.id.append(row['id'])
+            self.heading.append(row.get('heading', ''))
+            self.text.append(row.get('text', ''))
+            self.snippet.append(make_snippet(self.text[-1]))
+            self.level.append(row.get('level', 'unknown'))
+            self.file_path.append(row.get('file_path', ''))
+            self.n += 1
+
+    def __getitem__(self, row: int) -> Dict:
+        """One row as a dict (for callers that need a record rather than columns)"""
+        return {
+            'id': self.id[row],
+            'doc_id': self.doc_id_at(row),
+            'page': int(self._page[row]),
+            'heading': self.heading[row],
+            'text': self.text[row],
+            'level': self.level[row],
+            'file_path': self.file_path[row],
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self[row] for row in range(self.n))
+
+    def subset(self, rows: np.ndarray) -> "MetaStore":
+        """New store holding only the given rows, in order (doc codes are re-interned)"""
+        store = MetaStore(capacity=max(1024, len(rows)))
+        store.extend(self[int(row)] for row in rows)
+        return store
+
+    def save(self, file, **extra):
+        """Write the columns to an .npz (string columns are pickled object arrays)"""
+        np.savez_compressed(
+            file,
+            page=self.page,
+            doc_code=self.doc_code,
+            doc_ids=np.array(self.doc_ids, dtype=object),
+            **{name: np.array(getattr(self, name), dtype=object)
+               for name in ('id', 'heading', 'text', 'level', 'file_path')},
+            **extra
+        )
+
+    @classmethod
+    def load(cls, data) -> "MetaStore":
+        """Rebuild a store from the arrays of a loaded save() file"""
+        store = cls(capacity=max(1024, len(data['page'])))
+        store.n = len(data['page'])
+        store._page[:store.n] = data['page']
+        store._doc_code[:store.n] = data['doc_code']
+        store.doc_ids = data['doc_ids'].tolist()
+        store._doc_codes = {doc_id: code for code, doc_id in enumerate(store.doc_ids)}
+        for name in ('id', 'heading', 'text', 'level', 'file_path'):
+            setattr(store, name, data[name].tolist())
+        store.snippet = [make_snippet(text) for text in store.text]
+        return store
@@ -0,0 +1,99 @@
+"""
+ONNX Sentence Encoder
+INT8-quantized all-MiniLM-L6-v2 on ONNX Runtime, a drop-in for SentenceTransformer.encode
+on CPU. The model is exported and quantized once into backend/models/ and reused afterwards.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+    print("Warning: onnxruntime/transformers not installed, using PyTorch for embeddings")
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODELS_DIR = Path(__file__).parent.parent / "models"
+ONNX_EXPORT_DIR = MODELS_DIR / "minilm-onnx"
+ONNX_INT8_PATH = MODELS_DIR / "minilm-int8.onnx"
+MAX_SEQ_LENGTH = 256  # same truncation as the SentenceTransformer model
+
+
+def _export_int8_model():
+    """Export the model to ONNX with optimum and dynamic-quantize the weights to INT8"""
+    from optimum.exporters.onnx import main_export
+
+    print(f"📦 Exporting {MODEL_NAME} to ONNX...")
+    main_export(MODEL_NAME, output=ONNX_EXPORT_DIR, task="feature-extraction")
+    tmp_path = ONNX_INT8_PATH.with_suffix(".onnx.tmp")
+    quantize_dynamic(str(ONNX_EXPORT_DIR / "model.onnx"), str(tmp_path), weight_type=QuantType.QInt8)
+    os.replace(tmp_path, ONNX_INT8_PATH)
+    print(f"✅ Quantized model written to {ONNX_INT8_PATH}")
+
+
+class OnnxSentenceEncoder:
+    """Tokenize, run the INT8 session, mean-pool over the attention mask, L2-normalize"""
+
+    def __init__(self):
+        if not ONNX_INT8_PATH.exists():
+            _export_int8_model()
+        tokenizer_source = ONNX_EXPORT_DIR if (ONNX_EXPORT_DIR / "tokenizer.json").exists() else MODEL_NAME
+        self.tokenizer = AutoTokenizer.from_pretrained(str(tokenizer_source))
+
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(ONNX_INT8_PATH), sess_options, providers=['CPUExecutionProvider']
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        # The fast tokenizer mutates its padding/truncation state per call ("Already borrowed" across
+        # threads); the ONNX session itself is safe to run concurrently
+        self._tokenizer_lock = threading.Lock()
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        with self._tokenizer_lock:
+            encoded = self.tokenizer(
+                texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np"
+            )
+        feeds = {name: encoded[name].astype(np.int64) for name in self._input_names if name in encoded}
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Same contract as SentenceTransformer.encode: 1-D for a str, (n, 384) for a list"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 384), dtype=np.float32)
+        # Longest-first like SentenceTransformer.encode, so each batch only pads to its own longest text
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        sorted_texts = [texts[i] for i in order]
+        embeddings = np.vstack([
+            self._encode_batch(sorted_texts[start:start + batch_size])
+            for start in range(0, len(sorted_texts), batch_size)
+        ]).astype(np.float32, copy=False)
+        embeddings = embeddings[np.argsort(order)]
+        return embeddings[0] if single else embeddings
+
+
+def load_onnx_encoder():
+    """OnnxSentenceEncoder, or None when ONNX Runtime is missing or the export fails"""
+    if not ONNX_AVAILABLE or os.getenv("USE_ONNX_EMBEDDER", "true").lower() != "true":
+        return None
+    try:
+        return OnnxSentenceEncoder()
+    except Exception as e:
+        print(f"⚠️ ONNX encoder unavailable, falling back to PyTorch: {e}")
+        return None
@@ -13,8 +13,18 @@ import PyPDF2
 import logging
 from datetime import datetime
 
+# xxHash is optional - falls back to SHA-256 over the same prefix
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Only the first MiB of a file is fingerprinted for the quick pre-filter
+QUICKHASH_PREFIX_BYTES = 1 << 20
+
 class PDFDuplicateDetector:
     """Advanced PDF duplicate detection using multiple techniques"""
     
@@ -34,6 +44,21 @@ class PDFDuplicateDetector:
             logger.error(f"Error calculating hash for {file_path}: {e}")
             return ""
     
+    def calculate_quickhash(self, file_path: Path) -> str:
+        """Calculate a cheap fingerprint of the file size and first MiB (pre-filter only)"""
+        try:
+            file_path = Path(file_path)
+            with open(file_path, "rb") as f:
+                prefix = f.read(QUICKHASH_PREFIX_BYTES)
+            size_tag = f"{file_path.stat().st_size:x}"
+            
+            if XXHASH_AVAILABLE:
+                return f"{size_tag}:{xxhash.xxh3_128_hexdigest(prefix)}"
+            return f"{size_tag}:{hashlib.sha256(prefix).hexdigest()[:32]}"
+        except Exception as e:
+            logger.error(f"Error calculating quickhash for {file_path}: {e}")
+            return ""
+    
     def extract_pdf_metadata(self, file_path: Path) -> Dict:
         """Extract PDF metadata for comparison"""
         try:
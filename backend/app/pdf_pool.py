@@ -0,0 +1,47 @@
+"""
+PDF Outline Process Pool
+Outline extraction (PyMuPDF + layout heuristics) is CPU-bound, so it runs in worker
+processes instead of on the event loop's thread pool. Each worker builds one
+HighPerformancePDFProcessor and reuses it for every PDF it is given.
+"""
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_processor = None
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _init_worker():
+    """Worker initializer: build the outline processor once per process"""
+    global _processor
+    from .utils.process_pdfs import HighPerformancePDFProcessor
+    _processor = HighPerformancePDFProcessor()
+
+
+def extract_outline(file_path: str) -> List[Dict]:
+    """Outline sections of one PDF (runs inside a worker; the result is plain JSON data)"""
+    return _processor.extract_document(Path(file_path)).get('outline', [])
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Lazily start the pool (spawned workers, so the parent's torch/FAISS threads are not forked)"""
+    global _pool
+    if _pool is None:
+        workers = int(os.getenv('PDF_POOL_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+        _pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=mp.get_context('spawn'), initializer=_init_worker
+        )
+        print(f"✅ PDF process pool started ({workers} workers)")
+    return _pool
+
+
+def shutdown_pdf_pool():
+    """Stop the workers (pending extractions are cancelled)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,117 @@
+"""
+Recommendation Index
+FAISS index over section embeddings for /api/recommendations and the selection
+search endpoints. Search is exact (flat) while the corpus is small; once it reaches
+HNSW_MIN_VECTORS the vectors move into an HNSW graph, which answers queries without
+scanning every vector. HNSW is not worth it below that size.
+Vectors are L2-normalized, so both indexes use inner product: scores are cosine similarities.
+"""
+
+import faiss
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    print("Warning: numba not installed, recommendation scoring uses NumPy")
+
+HNSW_MIN_VECTORS = 1000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+
+class RecommendationIndex:
+    """Inner-product flat index that cuts over to IndexHNSWFlat as the corpus grows"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._flat = faiss.IndexFlatIP(dim)
+        self._hnsw = None
+
+    @property
+    def ntotal(self) -> int:
+        return self._active().ntotal
+
+    def _active(self):
+        return self._hnsw if self._hnsw is not None else self._flat
+
+    def add(self, vectors: np.ndarray):
+        """Add L2-normalized float32 row vectors (ids continue from ntotal)"""
+        if self._hnsw is not None:
+            self._hnsw.add(vectors)
+            return
+        self._flat.add(vectors)
+        if self._flat.ntotal >= HNSW_MIN_VECTORS:
+            self._build_hnsw()
+
+    def _build_hnsw(self):
+        """Move every vector from the flat index into a new HNSW graph (same ids)"""
+        hnsw = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+        hnsw.add(self._flat.reconstruct_n(0, self._flat.ntotal))
+        self._hnsw = hnsw
+        self._flat.reset()
+        print(f"✅ Recommendation index switched to HNSW ({hnsw.ntotal} vectors)")
+
+    def search(self, queries: np.ndarray, k: int):
+        """(cosine scores, ids) of the k most similar vectors for each normalized query row"""
+        return self._active().search(queries, k)
+
+    def subset(self, rows: np.ndarray) -> "RecommendationIndex":
+        """New index holding only the vectors of the given rows, renumbered 0..len(rows)-1"""
+        active = self._active()
+        rec_index = RecommendationIndex(self.dim)
+        if len(rows):
+            rec_index.add(np.ascontiguousarray(active.reconstruct_n(0, active.ntotal)[rows]))
+        return rec_index
+
+    def write(self, path: str):
+        """Serialize the active index (flat or HNSW) with faiss.write_index"""
+        faiss.write_index(self._active(), path)
+
+    @classmethod
+    def read(cls, path: str) -> "RecommendationIndex":
+        """Load an index written by write(); HNSW search depth is reapplied"""
+        loaded = faiss.read_index(path)
+        rec_index = cls(loaded.d)
+        if isinstance(loaded, faiss.IndexHNSWFlat):
+            loaded.hnsw.efSearch = HNSW_EF_SEARCH
+            rec_index._hnsw = loaded
+        else:
+            rec_index._flat = loaded
+        return rec_index
+
+
+def _partition_hits_loop(scores, ids, doc_codes, current_code, threshold):
+    """Single pass over the k hits: relevance, same-document mask, cross-document mask"""
+    k = ids.shape[0]
+    relevance = np.empty(k, dtype=np.float32)
+    same = np.zeros(k, dtype=np.bool_)
+    cross = np.zeros(k, dtype=np.bool_)
+    for i in range(k):
+        relevance[i] = scores[i]
+        idx = ids[i]
+        # Drop padding ids (-1) and very low relevance matches
+        if idx < 0 or idx >= doc_codes.shape[0] or relevance[i] < threshold:
+            continue
+        if doc_codes[idx] == current_code:
+            same[i] = True
+        else:
+            cross[i] = True
+    return relevance, same, cross
+
+
+def _partition_hits_numpy(scores, ids, doc_codes, current_code, threshold):
+    relevance = scores.astype(np.float32, copy=False)
+    keep = (ids >= 0) & (ids < doc_codes.shape[0]) & (relevance >= threshold)
+    same = np.zeros(ids.shape[0], dtype=np.bool_)
+    same[keep] = doc_codes[ids[keep]] == current_code
+    return relevance, same, keep & ~same
+
+
+# (relevance, same_mask, cross_mask) for one query's FAISS hits, compiled once and cached on disk
+partition_hits = njit(cache=True)(_partition_hits_loop) if NUMBA_AVAILABLE else _partition_hits_numpy
@@ -26,6 +26,10 @@ class SmartUploadHandler:
         self.docs_dir = Path(docs_dir)
         self.db_path = db_path
         self.cleanup_system = DuplicateCleanupSystem(db_path, docs_dir)
+    
+    def close(self):
+        """Release the duplicate cleanup system's database connection"""
+        self.cleanup_system.close()
         
     def handle_upload(self, file_path: Path, original_name: str, client_id: str = None, 
                      persona: str = None, job: str = None) -> Dict[str, any]:
@@ -33,7 +37,7 @@ class SmartUploadHandler:
         Handle PDF upload with duplicate detection
         
         Returns:
-            - If new file: {'is_duplicate': False, 'document_id': str, 'message': str}
+            - If new file: {'is_duplicate': False, 'document_id': str, 'file_hash': str, 'message': str}
             - If duplicate: {'is_duplicate': True, 'existing_document': dict, 'message': str}
         """
         
@@ -93,6 +97,7 @@ class SmartUploadHandler:
             
             # Calculate file hash
             file_hash = self.cleanup_system.detector.calculate_file_hash(target_path)
+            quickhash = self.cleanup_system.detector.calculate_quickhash(target_path)
             
             # Get file size
             file_size = target_path.stat().st_size
@@ -104,6 +109,7 @@ class SmartUploadHandler:
                 file_size=file_size,
                 file_path=str(target_path),
                 file_hash=file_hash,
+                quickhash=quickhash,
                 client_id=client_id,
                 persona=persona,
                 job_role=job
@@ -116,6 +122,7 @@ class SmartUploadHandler:
                 'is_duplicate': False,
                 'document_id': document.id,
                 'filename': unique_filename,
+                'file_hash': file_hash,
                 'message': f"File uploaded successfully as {unique_filename}",
                 'document': document
             }
@@ -153,4 +160,7 @@ def run_duplicate_cleanup(db_instance, docs_dir: Path, dry_run: bool = False) ->
     Enhanced duplicate cleanup function to replace the existing one
     """
     handler = SmartUploadHandler(docs_dir, db_instance.db_path)
-    return handler.bulk_cleanup_existing_duplicates(dry_run=dry_run)
+    try:
+        return handler.bulk_cleanup_existing_duplicates(dry_run=dry_run)
+    finally:
+        handler.close()
@@ -7,7 +7,7 @@ import os
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 from dataclasses import dataclass, asdict
 import json
 from supabase import create_client, Client
@@ -146,6 +146,30 @@ class SupabaseDatabase:
         
         return documents
     
+    def active_document_ids(self, page_size: int = 1000) -> Set[str]:
+        """Ids of every non-deleted document, across all users (paged past the row limit)"""
+        ids = set()
+        offset = 0
+        while True:
+            result = self.client.table('documents').select('id').neq('status', 'deleted') \
+                .range(offset, offset + page_size - 1).execute()
+            ids.update(row['id'] for row in result.data)
+            if len(result.data) < page_size:
+                return ids
+            offset += page_size
+
+    def active_document_paths(self, page_size: int = 1000) -> Set[str]:
+        """Stored file paths of every non-deleted document, across all users (paged past the row limit)"""
+        paths = set()
+        offset = 0
+        while True:
+            result = self.client.table('documents').select('file_path').neq('status', 'deleted') \
+                .range(offset, offset + page_size - 1).execute()
+            paths.update(row['file_path'] for row in result.data)
+            if len(result.data) < page_size:
+                return paths
+            offset += page_size
+    
     def get_document_by_id(self, document_id: str, user_id: str) -> Optional[Document]:
         """Get a specific document by ID for a user"""
         result = self.client.table('documents').select('*').eq('id', document_id).eq('user_id', user_id).execute()
@@ -1115,15 +1115,9 @@ class HighPerformancePDFProcessor:
         
         return "Untitled Document"
     
-    def process_single_pdf(self, pdf_path: Path, output_dir: Path) -> bool:
-        """Process a single PDF file"""
-        try:
-            start_time = time.time()
-            logger.info(f"Processing {pdf_path.name}")
-            
-            # Open PDF
-            doc = fitz.open(pdf_path)
-
+    def extract_document(self, pdf_path: Path) -> Dict:
+        """Extract {"title", "outline"} from a PDF without writing any output"""
+        with fitz.open(pdf_path) as doc:
             # Detect document language for multilingual support
             detected_language = self.detect_document_language(doc)
 
@@ -1152,19 +1146,25 @@ class HighPerformancePDFProcessor:
                     "page": 1
                 }]
             
-            # Create output JSON
-            output_data = {
+            return {
                 "title": title,
                 "outline": outline
             }
-            
+
+    def process_single_pdf(self, pdf_path: Path, output_dir: Path) -> bool:
+        """Process a single PDF file"""
+        try:
+            start_time = time.time()
+            logger.info(f"Processing {pdf_path.name}")
+
+            # Create output JSON
+            output_data = self.extract_document(pdf_path)
+
             # Save output (always overwrite)
             output_file = output_dir / f"{pdf_path.stem}.json"
             with open(output_file, 'w', encoding='utf-8') as f:
                 json.dump(output_data, f, indent=2, ensure_ascii=False)
-            
-            doc.close()
-            
+
             processing_time = time.time() - start_time
             logger.info(f"Processed {pdf_path.name} in {processing_time:.2f}s")
             return True
@@ -0,0 +1,6 @@
+"""Make the backend's `app` package importable when pytest runs from the repo or backend/"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
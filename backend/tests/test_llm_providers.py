@@ -0,0 +1,56 @@
+"""
+OpenAI/Azure generate_text against a mocked HTTP transport (no network, no API keys).
+The SDK clients are built on the module's shared httpx client, so the mock replaces that.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("openai")
+
+from app import llm_cache, llm_providers
+
+
+def _completion(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    return httpx.Response(200, headers={"x-ratelimit-limit-requests": "100",
+                                        "x-ratelimit-remaining-requests": "99"}, json={
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": "mocked reply"}}],
+        "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+    })
+
+
+@pytest.fixture
+def mock_transport(monkeypatch):
+    """Route the providers' HTTP traffic to _completion and keep the response caches out of the way"""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_completion))
+    monkeypatch.setattr(llm_providers, "_get_http_client", lambda: client)
+    cache = llm_cache.SemanticLLMCache()
+    cache._semantic_enabled = False
+    monkeypatch.setattr(llm_cache, "_get_caches", lambda: (cache, None))
+    return client
+
+
+@pytest.mark.parametrize("provider_cls, env", [
+    (llm_providers.OpenAIProvider, {"OPENAI_API_KEY": "test-key", "OPENAI_MODEL": "gpt-4o"}),
+    (llm_providers.AzureOpenAIProvider, {"AZURE_OPENAI_KEY": "test-key",
+                                         "AZURE_OPENAI_BASE": "https://example.openai.azure.com",
+                                         "AZURE_DEPLOYMENT_NAME": "gpt-4o"}),
+])
+def test_generate_text_parses_completion(mock_transport, monkeypatch, provider_cls, env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    provider = provider_cls()
+
+    response = asyncio.run(provider.generate_text("Say something", 16))
+
+    assert response.content == "mocked reply"
+    assert response.usage["total_tokens"] == 5
@@ -22,9 +22,18 @@ os.environ["PYTHONPATH"] = f"{project_root}{os.pathsep}{backend_path}"
 # Now import and run uvicorn
 try:
     import uvicorn
+
+    # uvloop (installed with uvicorn[standard]) makes the concurrent LLM/HTTP fan-out cheaper to schedule
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+
     print("🚀 Starting Adobe PDF Intelligence Application...")
     print(f"📁 Project root: {project_root}")
     print(f"🐍 Python path: {sys.path[:3]}...")
+    print(f"🔁 Event loop: {loop}")
     print("🌐 Server will be available at: http://localhost:8080")
     print("=" * 60)
     
@@ -34,6 +43,7 @@ try:
         host="0.0.0.0",
         port=8080,
         reload=False,
+        loop=loop,
         log_level="info"
     )
 except ImportError as e: